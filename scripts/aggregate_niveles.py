@@ -0,0 +1,111 @@
+"""Agregación jerárquica UPZ → localidad → Bogotá en una sola pasada.
+
+Las hojas son UPZ–año (consumo VESPA por UPZ) más una hoja "(sin UPZ)" por
+localidad–año con lo que no tiene detalle por UPZ: violencia, población y el
+consumo de registros sin UPZ. Sin la tabla por UPZ (se arma desde el crudo
+VESPA) no hay hojas UPZ y todo va a la hoja "(sin UPZ)": los niveles localidad
+y Bogotá son los mismos. Los niveles localidad y Bogotá se derivan con
+matrices de pertenencia (utils_jerarquia) y se guardan juntos; las figuras,
+tablas y modelos leen de aquí los totales de Bogotá en lugar de reagrupar.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from compute_rates import MULTIPLIER, RATE_MEASURES, compute_rate_columns
+from schema import read_csv
+from utils_jerarquia import NIVELES_EXPORT, SIN_UPZ, rollup_niveles
+from utils_perfil import etapa, filas, paso
+
+RATES_PATH = os.path.join("data", "working", "localidad_ano_master_rates.csv")
+UPZ_PATH = os.path.join("data", "working", "psicoactivas_upz_anio.csv")
+REPORT_PATH = os.path.join("docs", "aggregate_niveles_report.md")
+
+CONTEOS = ["casos_consumo", "casos_violencia"]
+MEDIDAS = CONTEOS + ["poblacion"]
+CLAVES = ["nombre_localidad", "anio"]
+
+
+def ensure_dirs():
+    os.makedirs(os.path.dirname(NIVELES_EXPORT), exist_ok=True)
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+
+
+def build_hojas(master: pd.DataFrame, upz: pd.DataFrame) -> pd.DataFrame:
+    """Hojas UPZ–año; la hoja "(sin UPZ)" completa cada localidad–año hasta el total del master."""
+    master = master[CLAVES + MEDIDAS].copy()
+    upz = upz[CLAVES + ["nombre_upz", "casos_consumo"]].copy()
+    upz["casos_violencia"] = 0
+    upz["poblacion"] = np.nan
+
+    con_detalle = upz.groupby(CLAVES, observed=True)["casos_consumo"].sum()
+    detalle = con_detalle.reindex(pd.MultiIndex.from_frame(master[CLAVES])).fillna(0).to_numpy()
+    resto = master.assign(nombre_upz=SIN_UPZ, casos_consumo=master["casos_consumo"].astype(float) - detalle)
+
+    hojas = pd.concat([upz, resto[upz.columns]], ignore_index=True) if len(upz) else resto[upz.columns]
+    # Una hoja "(sin UPZ)" sin casos ni población no aporta nada
+    vacia = (hojas["nombre_upz"] == SIN_UPZ) & (hojas[CONTEOS].fillna(0) == 0).all(axis=1) & hojas["poblacion"].isna()
+    return hojas[~vacia].reset_index(drop=True)
+
+
+def verificar(niveles: pd.DataFrame, master: pd.DataFrame) -> pd.Series:
+    """Diferencia absoluta máxima entre el nivel localidad y el master, por medida."""
+    loc = niveles[niveles["nivel"] == "localidad"].merge(master[CLAVES + MEDIDAS], on=CLAVES, how="outer", suffixes=("", "_master"))
+    return pd.Series({m: float((loc[m] - loc[f"{m}_master"]).abs().max()) for m in MEDIDAS})
+
+
+@etapa("aggregate_niveles")
+def main():
+    ensure_dirs()
+    if not os.path.exists(RATES_PATH):
+        raise FileNotFoundError(f"No existe {RATES_PATH}. Corre compute_rates.py")
+
+    master = read_csv(RATES_PATH, "agregado")
+    master["nombre_localidad"] = master["nombre_localidad"].astype(str)
+    if os.path.exists(UPZ_PATH):
+        upz = read_csv(UPZ_PATH, "agregado")
+        upz["nombre_localidad"] = upz["nombre_localidad"].astype(str)
+    else:
+        print(f"Advertencia: no existe {UPZ_PATH} (clean_psicoactivas.py); niveles sin detalle por UPZ")
+        upz = pd.DataFrame({
+            "nombre_localidad": pd.Series(dtype=object), "anio": pd.Series(dtype=master["anio"].dtype),
+            "nombre_upz": pd.Series(dtype=object), "casos_consumo": pd.Series(dtype=float),
+        })
+
+    with paso("hojas"):
+        hojas = build_hojas(master, upz)
+    with paso("rollup"):
+        niveles = rollup_niveles(hojas, MEDIDAS)
+
+    # Tasas solo donde hay denominador propio (localidad y Bogotá; no por UPZ)
+    rates = compute_rate_columns(niveles, RATE_MEASURES, "poblacion", MULTIPLIER)
+    niveles[rates.columns] = rates.where(niveles["nivel"] != "upz")
+    niveles[CONTEOS] = niveles[CONTEOS].round().astype("Int64")
+
+    with paso("escribir"):
+        niveles.to_csv(NIVELES_EXPORT, index=False, encoding="utf-8")
+    filas(entrada=len(master) + len(upz), salida=len(niveles))
+
+    diferencias = verificar(niveles, master)
+    conteo = niveles["nivel"].value_counts().reindex(["upz", "localidad", "bogota"], fill_value=0)
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        f.write("# Agregación jerárquica UPZ → localidad → Bogotá\n\n")
+        f.write(f"Archivo: {NIVELES_EXPORT}\n\n")
+        if len(upz) == 0:
+            f.write(f"Sin detalle por UPZ ({UPZ_PATH} no existe o está vacío): hojas solo \"{SIN_UPZ}\".\n\n")
+        f.write("## Filas por nivel\n\n")
+        f.write(conteo.to_markdown(headers=["nivel", "filas"]))
+        f.write(f"\n\nHojas \"{SIN_UPZ}\": violencia, población y consumo de registros sin UPZ de cada localidad–año.\n\n")
+        f.write("## Verificación contra el master localidad–año (diferencia absoluta máxima)\n\n")
+        f.write(diferencias.to_markdown(headers=["medida", "diferencia"]))
+        f.write("\n\n## Bogotá por año\n\n")
+        f.write(niveles[niveles["nivel"] == "bogota"].drop(columns=["nivel", "nombre_localidad", "nombre_upz"]).to_markdown(index=False))
+        f.write("\n")
+
+    print(f"Niveles UPZ/localidad/Bogotá: {NIVELES_EXPORT}")
+    print(f"Reporte: {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
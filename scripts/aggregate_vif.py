@@ -1,11 +1,21 @@
+import argparse
 import os
+from typing import Optional
+
 import pandas as pd
 import numpy as np
 
-from utils_localidad import normalize_localidad
+import prep_vif
+from prep_vif import RAW_PATH
+from utils_encoding import detectar_encoding
+from utils_localidad import normalize_localidad_series, resoluciones_aproximadas, unmapped_localidades
+from utils_cube import build_cube, rollup, time_dims
+from schema import read_csv
+from utils_perfil import etapa, filas, paso
 
 CLEAN_INPUT = os.path.join("data", "working", "vintrafamiliar_clean.csv")
 AGG_EXPORT = os.path.join("data", "working", "vif_localidad_anio.csv")
+CUBE_EXPORT = os.path.join("data", "working", "vif_cubo_localidad_anio_periodo.csv")
 REPORT_PATH = os.path.join("docs", "aggregate_vif_report.md")
 
 
@@ -14,34 +24,60 @@ def ensure_dirs():
     os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
 
 
-def main():
-    ensure_dirs()
+def cubo_parcial(df: pd.DataFrame):
+    """Normaliza localidad, filtra 2015–2024 y cuenta registros al grano más fino disponible.
 
-    print(f"Leyendo limpio: {CLEAN_INPUT}")
-    df = pd.read_csv(CLEAN_INPUT, dtype={"anio": "Int64"})
+    Devuelve (cubo con columna `casos`, dimensiones sub-anuales, grafías no mapeadas,
+    grafías resueltas por coincidencia aproximada).
+    Los cubos de varios bloques se combinan sumando con `rollup`.
+    """
+    if not {"nombre_localidad", "anio"}.issubset(df.columns):
+        raise ValueError("Faltan columnas requeridas 'nombre_localidad' y/o 'anio' en el input limpio.")
 
     # Normalizar localidades por seguridad
-    if "nombre_localidad" in df.columns:
-        df["nombre_localidad"] = df["nombre_localidad"].apply(normalize_localidad)
-
-    # Asegurar tipo año
-    if "anio" in df.columns:
-        df["anio"] = pd.to_numeric(df["anio"], errors="coerce").astype("Int64")
+    with paso("normalize_localidad"):
+        unmapped = unmapped_localidades(df["nombre_localidad"])
+        aproximadas = resoluciones_aproximadas(df["nombre_localidad"])
+        df = df.assign(nombre_localidad=normalize_localidad_series(df["nombre_localidad"]))
 
     # Filtrar rango de estudio (2015–2024)
     df = df[(df["anio"] >= 2015) & (df["anio"] <= 2024)]
 
-    # Agregación: conteo de registros como casos de víctimas
-    if {"nombre_localidad", "anio"}.issubset(df.columns):
-        agg = (
-            df.groupby(["nombre_localidad", "anio"], dropna=False)
-            .size()
-            .reset_index(name="casos_violencia")
-        )
-        print(f"Exportando agregación VIF localidad–año: {AGG_EXPORT}")
-        agg.to_csv(AGG_EXPORT, index=False, encoding="utf-8")
+    # Conteo de registros como casos de víctimas. Si el limpio trae periodo
+    # sub-anual (semestre/trimestre/mes) el cubo va a ese grano y el total
+    # anual se deriva de él.
+    sub_anual = time_dims(df)
+    with paso("build_cube"):
+        cube = build_cube(df, ["nombre_localidad", "anio"] + sub_anual)
+    return cube, sub_anual, unmapped, aproximadas
+
+
+def combinar(partes):
+    """Suma los cubos parciales y las grafías no mapeadas/aproximadas de varios bloques."""
+    cubes, subs, unmapped, aproximadas = zip(*partes)
+    sub_anual = subs[0]
+    cube = cubes[0] if len(cubes) == 1 else rollup(pd.concat(cubes, ignore_index=True), ["nombre_localidad", "anio"] + sub_anual)
+    if len(unmapped) == 1:
+        unmapped = unmapped[0]
     else:
-        raise ValueError("Faltan columnas requeridas 'nombre_localidad' y/o 'anio' en el input limpio.")
+        unmapped = pd.concat(unmapped).groupby(level=0).sum().sort_values(ascending=False, kind="stable")
+    if len(aproximadas) == 1:
+        aproximadas = aproximadas[0]
+    else:
+        aproximadas = pd.concat(aproximadas, ignore_index=True)
+        claves = [c for c in aproximadas.columns if c != "registros"]
+        aproximadas = (aproximadas.groupby(claves, as_index=False, sort=False)["registros"].sum()
+                       .sort_values("registros", ascending=False, kind="stable").reset_index(drop=True))
+    return cube, sub_anual, unmapped, aproximadas
+
+
+def escribir(cube: pd.DataFrame, sub_anual, unmapped: pd.Series, aproximadas: Optional[pd.DataFrame] = None) -> pd.DataFrame:
+    if sub_anual:
+        print(f"Exportando cubo VIF localidad–año–{'–'.join(sub_anual)}: {CUBE_EXPORT}")
+        cube.to_csv(CUBE_EXPORT, index=False, encoding="utf-8")
+    agg = rollup(cube, ["nombre_localidad", "anio"]).rename(columns={"casos": "casos_violencia"})
+    print(f"Exportando agregación VIF localidad–año: {AGG_EXPORT}")
+    agg.to_csv(AGG_EXPORT, index=False, encoding="utf-8")
 
     # Reporte
     with open(REPORT_PATH, "w", encoding="utf-8") as f:
@@ -49,9 +85,60 @@ def main():
         f.write(f"Filas agregadas: {len(agg)}\n\n")
         f.write("## Primeras filas\n\n")
         f.write(agg.head(10).to_markdown(index=False))
+        if unmapped is not None and not unmapped.empty:
+            f.write("\n\n## Localidades no mapeadas (grafía cruda → registros)\n\n")
+            f.write(unmapped.to_markdown())
+        if aproximadas is not None and not aproximadas.empty:
+            f.write("\n\n## Localidades resueltas por coincidencia aproximada (grafía cruda → candidato del catálogo)\n\n")
+            f.write(aproximadas.to_markdown(index=False))
+    return agg
+
+
+def run_fused(chunksize: Optional[int] = None, write_records: bool = False):
+    """Una sola pasada raw → limpio → agregado, sin releer el CSV limpio.
+
+    Los CSV por registro (UTF-8 y limpio) y el reporte de prep_vif solo se
+    escriben con `write_records`.
+    """
+    with paso("detectar_encoding"):
+        codificacion = detectar_encoding(RAW_PATH)
+    print(f"Modo fusionado: {RAW_PATH} ({codificacion.encoding}) → {AGG_EXPORT}")
+    resumen = prep_vif.Resumen()
+    partes = []
+    for clean in prep_vif.iter_clean(codificacion, chunksize, write_records=write_records):
+        resumen.add(clean)
+        partes.append(cubo_parcial(clean))
+    filas(entrada=resumen.n_rows)
+    if write_records:
+        prep_vif.write_report(resumen.n_rows, resumen.columns, resumen.samples, codificacion)
+    print(f"Codificación: {codificacion.resumen()}; registros: {resumen.n_rows}")
+    return combinar(partes)
+
+
+@etapa("aggregate_vif")
+def main(fused: bool = False, chunksize: Optional[int] = None, write_records: bool = False):
+    ensure_dirs()
+
+    if fused:
+        cube, sub_anual, unmapped, aproximadas = run_fused(chunksize, write_records)
+    else:
+        print(f"Leyendo limpio: {CLEAN_INPUT}")
+        # Tipos del esquema (categóricas, Int8/Int16) sin inferencia
+        with paso("leer_limpio"):
+            df = read_csv(CLEAN_INPUT, "vif")
+        filas(entrada=len(df))
+        cube, sub_anual, unmapped, aproximadas = cubo_parcial(df)
 
+    with paso("escribir"):
+        agg = escribir(cube, sub_anual, unmapped, aproximadas)
+    filas(salida=len(agg))
     print("Listo. Revisa data/working/vif_localidad_anio.csv y docs/aggregate_vif_report.md")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Agregación VIF localidad–año")
+    parser.add_argument("--fused", action="store_true", help="Leer el raw directamente (sin vintrafamiliar_clean.csv)")
+    parser.add_argument("--chunksize", type=int, default=None, help="Filas por bloque en modo fusionado (por defecto: carga completa)")
+    parser.add_argument("--write-records", action="store_true", help="En modo fusionado, escribir también los CSV por registro")
+    args = parser.parse_args()
+    main(fused=args.fused, chunksize=args.chunksize, write_records=args.write_records)
@@ -0,0 +1,198 @@
+"""Benchmark de etapas del pipeline sobre insumos sintéticos de tamaño creciente.
+
+Cada etapa corre en un subproceso dentro de un directorio de trabajo aislado
+(con `data/raw/` sintético), de modo que el pico de RSS es el de la etapa sola.
+Los resultados se anexan a un historial con el commit, para comparar entre
+versiones del código.
+"""
+import argparse
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+import synth_data
+from utils_perfil import etapa
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(SCRIPTS_DIR)
+BENCH_DIR = os.path.join("data", "cache", "bench")
+HISTORY_PATH = os.path.join(BENCH_DIR, "bench_history.csv")
+REPORT_PATH = os.path.join("docs", "benchmark_report.md")
+
+# Etapas en orden de dependencia; aggregate_vif y prep_poblacion alimentan a join_master,
+# y aggregate_niveles (tasas + UPZ de clean_psicoactivas) a las figuras, IC y regresión
+STAGES = [
+    "prep_vif", "aggregate_vif", "clean_psicoactivas", "prep_poblacion", "join_master",
+    "compute_rates", "aggregate_niveles", "make_ci", "make_regression", "make_plots",
+]
+SIZES = [10_000, 100_000]
+# Registros VESPA por registro SIVIM (acotado al máximo de una hoja Excel)
+VESPA_RATIO = 0.25
+SEED = 20240101
+
+# Archivo cuyo número de filas se usa como "registros procesados" de cada etapa
+ROWS_FROM = {
+    "prep_vif": "vif",
+    "aggregate_vif": "vif",
+    "clean_psicoactivas": "vespa",
+}
+
+
+def git_commit() -> str:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_DIR, capture_output=True, text=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "scripts"], cwd=REPO_DIR, capture_output=True, text=True)
+    except OSError:
+        return "desconocido"
+    if out.returncode != 0:
+        return "desconocido"
+    # "+cambios": scripts/ con modificaciones sin commit
+    return out.stdout.strip() + ("+cambios" if dirty.stdout.strip() else "")
+
+
+def vespa_rows(n_vif: int) -> int:
+    return min(int(n_vif * VESPA_RATIO), synth_data.EXCEL_MAX_ROWS)
+
+
+def prepare_inputs(size: int, seed: int) -> str:
+    """Genera (o reutiliza) los crudos sintéticos de un tamaño; devuelve su carpeta."""
+    raw = os.path.join(BENCH_DIR, "inputs", f"n{size}_s{seed}")
+    vif = os.path.join(raw, "vintrafamiliar.csv")
+    vespa = os.path.join(raw, "psicoactivas.xlsx")
+    if not os.path.exists(vif):
+        print(f"Generando SIVIM sintético: {size} registros")
+        synth_data.write_vif_csv(vif + ".tmp", size, seed)
+        os.replace(vif + ".tmp", vif)
+    if not os.path.exists(vespa):
+        print(f"Generando VESPA sintético: {vespa_rows(size)} registros")
+        synth_data.write_vespa_xlsx(vespa + ".tmp.xlsx", vespa_rows(size), seed)
+        os.replace(vespa + ".tmp.xlsx", vespa)
+    return raw
+
+
+def make_workdir(raw: str, size: int) -> str:
+    """Directorio aislado con data/raw (enlaces a los sintéticos + población real)."""
+    work = os.path.abspath(os.path.join(BENCH_DIR, "work", f"n{size}"))
+    shutil.rmtree(work, ignore_errors=True)
+    os.makedirs(os.path.join(work, "data", "raw"))
+    os.makedirs(os.path.join(work, "docs"))
+    for name in ("vintrafamiliar.csv", "psicoactivas.xlsx"):
+        src = os.path.abspath(os.path.join(raw, name))
+        dst = os.path.join(work, "data", "raw", name)
+        try:
+            os.link(src, dst)
+        except OSError:
+            shutil.copy2(src, dst)
+    shutil.copy2(os.path.join(REPO_DIR, "data", "raw", "poblacion.xlsx"), os.path.join(work, "data", "raw", "poblacion.xlsx"))
+    return work
+
+
+def _run_measured(cmd: List[str], cwd: str, log_path: str) -> Dict[str, float]:
+    """Ejecuta `cmd` y mide pared, CPU y pico de RSS del hijo (RSS/CPU solo en POSIX)."""
+    env = {**os.environ, "MPLBACKEND": "Agg", "PYTHONWARNINGS": "ignore"}
+    with open(log_path, "w", encoding="utf-8") as log:
+        t0 = time.perf_counter()
+        proc = subprocess.Popen(cmd, cwd=cwd, stdout=log, stderr=subprocess.STDOUT, env=env)
+        if hasattr(os, "wait4"):
+            _, status, ru = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            cpu = ru.ru_utime + ru.ru_stime
+            # ru_maxrss en KiB en Linux, en bytes en macOS
+            rss_mb = ru.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+        else:
+            proc.wait()
+            cpu = rss_mb = float("nan")
+        wall = time.perf_counter() - t0
+    return {"ok": proc.returncode == 0, "wall_s": wall, "cpu_s": cpu, "peak_rss_mb": rss_mb}
+
+
+def bench_size(size: int, stages: List[str], seed: int) -> pd.DataFrame:
+    raw = prepare_inputs(size, seed)
+    work = make_workdir(raw, size)
+    rows_by_source = {"vif": size, "vespa": vespa_rows(size)}
+    records = []
+    for stage in stages:
+        script = os.path.join(SCRIPTS_DIR, f"{stage}.py")
+        m = _run_measured([sys.executable, script], work, os.path.join(work, f"{stage}.log"))
+        rows = rows_by_source.get(ROWS_FROM.get(stage), None)
+        records.append({
+            "stage": stage, "size": size, **m,
+            "rows": rows,
+            "rows_per_s": rows / m["wall_s"] if rows else float("nan"),
+        })
+        estado = "ok" if m["ok"] else f"FALLÓ (ver {os.path.join(work, stage + '.log')})"
+        print(f"  n={size:>10} {stage:<20} {m['wall_s']:8.2f}s  RSS {m['peak_rss_mb']:8.1f} MB  {estado}")
+    return pd.DataFrame(records)
+
+
+def append_history(results: pd.DataFrame) -> pd.DataFrame:
+    os.makedirs(os.path.dirname(HISTORY_PATH), exist_ok=True)
+    exists = os.path.exists(HISTORY_PATH)
+    results.to_csv(HISTORY_PATH, mode="a", header=not exists, index=False, encoding="utf-8")
+    return pd.read_csv(HISTORY_PATH, dtype={"commit": str})
+
+
+def compare_previous(results: pd.DataFrame, history: pd.DataFrame) -> pd.DataFrame:
+    """Cociente de tiempo contra la corrida más reciente de otro commit (mismo tamaño y etapa)."""
+    commit, stamp = results["commit"].iloc[0], results["timestamp"].iloc[0]
+    prev = history[(history["commit"] != commit) & (history["timestamp"] != stamp) & history["ok"]]
+    if prev.empty:
+        return results.assign(commit_previo=None, wall_previo_s=float("nan"), cociente_wall=float("nan"))
+    last = prev.sort_values("timestamp").groupby(["stage", "size"]).tail(1)
+    last = last[["stage", "size", "commit", "wall_s"]].rename(columns={"commit": "commit_previo", "wall_s": "wall_previo_s"})
+    out = results.merge(last, on=["stage", "size"], how="left")
+    out["cociente_wall"] = out["wall_s"] / out["wall_previo_s"]
+    return out
+
+
+def write_report(table: pd.DataFrame):
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+    cols = ["size", "stage", "ok", "wall_s", "cpu_s", "peak_rss_mb", "rows", "rows_per_s", "commit_previo", "cociente_wall"]
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        f.write("# Benchmark del pipeline (insumos sintéticos)\n\n")
+        f.write(f"- Commit: {table['commit'].iloc[0]}\n")
+        f.write(f"- Fecha: {table['timestamp'].iloc[0]}\n")
+        f.write(f"- Python {platform.python_version()}, pandas {pd.__version__}, {platform.platform()}\n")
+        f.write(f"- Historial: {HISTORY_PATH}\n\n")
+        f.write("`rows_per_s` usa los registros crudos de la etapa (SIVIM o VESPA); las etapas sobre agregados localidad–año no lo reportan. ")
+        f.write("`cociente_wall` > 1 indica que la etapa es más lenta que en la corrida anterior de otro commit.\n\n")
+        out = table[cols].round({"wall_s": 3, "cpu_s": 3, "peak_rss_mb": 1, "cociente_wall": 3})
+        out = out.astype({"rows": "Int64"}).assign(rows_per_s=out["rows_per_s"].round().astype("Int64"))
+        f.write(out.to_markdown(index=False, floatfmt="g"))
+        f.write("\n")
+
+
+@etapa("bench_pipeline")
+def main(sizes: Optional[List[int]] = None, stages: Optional[List[str]] = None, seed: int = SEED):
+    sizes = sizes or SIZES
+    stages = stages or STAGES
+    commit = git_commit()
+    stamp = pd.Timestamp.now().isoformat(timespec="seconds")
+    print(f"Benchmark commit {commit}: tamaños {sizes}, etapas {stages}")
+
+    results = pd.concat([bench_size(n, stages, seed) for n in sizes], ignore_index=True)
+    results.insert(0, "timestamp", stamp)
+    results.insert(1, "commit", commit)
+    results["seed"] = seed
+    results["python"] = platform.python_version()
+    results["pandas"] = pd.__version__
+
+    history = append_history(results)
+    table = compare_previous(results, history)
+    write_report(table)
+    print(f"Listo. Reporte en {REPORT_PATH}; historial en {HISTORY_PATH}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark de etapas del pipeline")
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES, help="Registros SIVIM sintéticos (p. ej. 10000 1000000 10000000)")
+    parser.add_argument("--stages", nargs="+", default=STAGES, choices=STAGES, help="Etapas a medir (en orden)")
+    parser.add_argument("--seed", type=int, default=SEED)
+    args = parser.parse_args()
+    main(sizes=args.sizes, stages=args.stages, seed=args.seed)
@@ -2,14 +2,24 @@ import os
 import pandas as pd
 import numpy as np
 
-from utils_text import to_snake, clean_whitespace, strip_accents
-from utils_localidad import normalize_localidad
+from utils_text import to_snake, clean_whitespace, strip_accents, normalize_na_tokens
+from utils_localidad import normalize_localidad_series, resoluciones_aproximadas, unmapped_localidades
+from utils_geo import COL_UPZ, completar_localidad, nombre_upz_series
+from utils_excel_cache import read_sheet
+from utils_encoding import reparar_mojibake
+from utils_cube import build_cube, rollup, time_dims
+from schema import apply_schema
+from utils_reglas import FLAG_COL, evaluar
+from utils_perfil import etapa, filas, paso
 
 RAW_XLSX = os.path.join("data", "raw", "psicoactivas.xlsx")
 WORKING_DIR = os.path.join("data", "working")
 UTF8_EXPORT = os.path.join(WORKING_DIR, "psicoactivas_utf8.csv")
 CLEAN_EXPORT = os.path.join(WORKING_DIR, "psicoactivas_clean.csv")
 AGG_EXPORT = os.path.join(WORKING_DIR, "psicoactivas_localidad_anio.csv")
+CUBE_EXPORT = os.path.join(WORKING_DIR, "psicoactivas_cubo_localidad_anio_trimestre_mes.csv")
+TRIM_EXPORT = os.path.join(WORKING_DIR, "psicoactivas_localidad_anio_trimestre.csv")
+UPZ_EXPORT = os.path.join(WORKING_DIR, "psicoactivas_upz_anio.csv")
 REPORT_PATH = os.path.join("docs", "prep_psicoactivas_report.md")
 
 
@@ -39,49 +49,76 @@ def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
 
 def normalize_tokens(df: pd.DataFrame) -> pd.DataFrame:
     # Unificar 'Sin dato' y similares a NA en variables categóricas
-    cat_cols = df.select_dtypes(include=["object"]).columns
-    for col in cat_cols:
-        s = df[col].astype(str).str.strip()
-        mask = s.str.lower().isin(["sin dato", "sin  dato", "sindato", "n.a.", "n.a", "na", "n.a"]) | (s == "")
-        df.loc[mask, col] = np.nan
-    return df
+    return normalize_na_tokens(df)
 
 
 def load_psicoactivas() -> pd.DataFrame:
-    xls = pd.ExcelFile(RAW_XLSX, engine="openpyxl")
     # Usar la primera hoja por defecto (según inspección: 'Descargable_Vespa_Gral_050525')
-    df = pd.read_excel(xls, sheet_name=xls.sheet_names[0])
+    # Se lee desde la caché columnar; openpyxl solo se usa si el libro cambió
+    df = read_sheet(RAW_XLSX, sheet_name=0)
     return df
 
 
+@etapa("clean_psicoactivas")
 def main():
     ensure_dirs()
 
     print(f"Leyendo Excel: {RAW_XLSX}")
-    df_raw = load_psicoactivas()
+    with paso("leer_excel"):
+        df_raw = load_psicoactivas()
 
     # Exportación UTF-8 simple (CSV) para inspecciones rápidas
     print(f"Exportando UTF-8 sin transformar: {UTF8_EXPORT}")
-    df_raw.to_csv(UTF8_EXPORT, index=False, encoding="utf-8")
+    with paso("escribir_registros"):
+        df_raw.to_csv(UTF8_EXPORT, index=False, encoding="utf-8")
 
     # Estandarizar columnas
-    df = standardize_columns(df_raw)
+    with paso("standardize_columns"):
+        df = standardize_columns(df_raw)
+
+    # Reparar mojibake UTF-8 en las celdas (p. ej. "MÃ¡rtires") antes de normalizar
+    with paso("reparar_mojibake"):
+        reparadas = reparar_mojibake(df)
 
     # Normalizar tokens 'sin dato'
-    df = normalize_tokens(df)
+    with paso("normalize_tokens"):
+        df = normalize_tokens(df)
 
     # Normalizar localidades
+    unmapped = None
+    aproximadas = None
+    completadas = {}
     if "nombre_localidad" in df.columns:
-        df["nombre_localidad"] = df["nombre_localidad"].apply(normalize_localidad)
+        with paso("normalize_localidad"):
+            unmapped = unmapped_localidades(df["nombre_localidad"])
+            aproximadas = resoluciones_aproximadas(df["nombre_localidad"])
+            df["nombre_localidad"] = normalize_localidad_series(df["nombre_localidad"])
+        # Respaldo para nombres no mapeables: coordenadas (polígonos) y nombre de UPZ
+        with paso("completar_localidad"):
+            completadas = completar_localidad(df)
 
     # Tipos
     for col in ["anio", "mes", "trimestre", "casos"]:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
 
+    # Completar trimestre desde el mes cuando falte
+    if {"mes", "trimestre"}.issubset(df.columns):
+        fill = df["trimestre"].isna() & df["mes"].between(1, 12)
+        df.loc[fill, "trimestre"] = (df.loc[fill, "mes"] - 1) // 3 + 1
+
+    # Tipos compactos del diccionario de datos
+    with paso("apply_schema"):
+        df = apply_schema(df, "psicoactivas", text_as_category=True)
+
+    # Reglas de coherencia (paso 7): bit i de flag_inconsistencia = regla i
+    with paso("reglas_coherencia"):
+        df[FLAG_COL] = evaluar(df)
+
     # Guardar versión limpia
     print(f"Exportando versión limpia: {CLEAN_EXPORT}")
-    df.to_csv(CLEAN_EXPORT, index=False, encoding="utf-8")
+    with paso("escribir_registros"):
+        df.to_csv(CLEAN_EXPORT, index=False, encoding="utf-8")
 
     # Filtrar rango de estudio (2015–2024) para agregación principal
     df_agg = df.copy()
@@ -95,24 +132,47 @@ def main():
         df_agg = df_agg.dropna(subset=["nombre_localidad", "anio"]).copy()
         excluded = before - len(df_agg)
 
-    # Agregación por localidad–año (sumar CASOS)
+    # Cubo localidad × año × trimestre × mes en una sola pasada; los granos
+    # más gruesos se derivan del cubo (sumar CASOS)
     if {"nombre_localidad", "anio", "casos"}.issubset(df_agg.columns):
-        agg = (
-            df_agg.groupby(["nombre_localidad", "anio"], dropna=False)["casos"]
-            .sum(min_count=1)
-            .reset_index()
-            .rename(columns={"casos": "casos_consumo"})
-        )
+        sub_anual = time_dims(df_agg)
+        with paso("build_cube"):
+            cube = build_cube(df_agg, ["nombre_localidad", "anio"] + sub_anual, measure="casos")
+        print(f"Exportando cubo localidad–año–{'–'.join(sub_anual) or '(anual)'}: {CUBE_EXPORT}")
+        cube.to_csv(CUBE_EXPORT, index=False, encoding="utf-8")
+
+        if "trimestre" in sub_anual:
+            trim = rollup(cube, ["nombre_localidad", "anio", "trimestre"]).rename(columns={"casos": "casos_consumo"})
+            print(f"Exportando agregación localidad–año–trimestre: {TRIM_EXPORT}")
+            trim.to_csv(TRIM_EXPORT, index=False, encoding="utf-8")
+
+        agg = rollup(cube, ["nombre_localidad", "anio"]).rename(columns={"casos": "casos_consumo"})
         print(f"Exportando agregación localidad–año: {AGG_EXPORT}")
         agg.to_csv(AGG_EXPORT, index=False, encoding="utf-8")
+
+        # Grano más fino de la jerarquía UPZ → localidad → Bogotá (aggregate_niveles);
+        # solo registros con UPZ: el resto queda en la hoja "(sin UPZ)" de su localidad
+        upz = pd.DataFrame(columns=["nombre_localidad", "nombre_upz", "anio", "casos_consumo"])
+        if COL_UPZ in df_agg.columns:
+            con_upz = df_agg.assign(nombre_upz=nombre_upz_series(df_agg[COL_UPZ])).dropna(subset=["nombre_upz"])
+            with paso("build_cube"):
+                upz = build_cube(con_upz, ["nombre_localidad", "nombre_upz", "anio"], measure="casos")
+            upz = upz.rename(columns={"casos": "casos_consumo"})
+        print(f"Exportando agregación UPZ–año: {UPZ_EXPORT}")
+        upz.to_csv(UPZ_EXPORT, index=False, encoding="utf-8")
     else:
         print("Advertencia: columnas para agregación no encontradas. No se creó el archivo agregado.")
         agg = None
+        cube = None
+
+    filas(entrada=len(df_raw), salida=len(agg) if agg is not None else None)
 
     # Reporte
     with open(REPORT_PATH, "w", encoding="utf-8") as f:
         f.write("# Reporte preparación Psicoactivas (VESPA)\n\n")
         f.write(f"Filas raw: {len(df_raw)}, Filas clean: {len(df)}\n\n")
+        if reparadas:
+            f.write(f"Celdas con mojibake UTF-8 reparado (por columna): {reparadas}\n\n")
         f.write("## Columnas (clean)\n\n")
         for c in df.columns:
             f.write(f"- {c}\n")
@@ -120,6 +180,19 @@ def main():
             f.write("\n## Agregación\n\n")
             f.write(f"Filas agregadas: {len(agg)}\n")
             f.write(f"Filas excluidas por localidad/año faltantes: {excluded}\n")
+            f.write(f"Celdas del cubo sub-anual: {len(cube)}\n")
+        if unmapped is not None and not unmapped.empty:
+            f.write("\n## Localidades no mapeadas (grafía cruda → registros)\n\n")
+            f.write(unmapped.to_markdown())
+            f.write("\n")
+        if aproximadas is not None and not aproximadas.empty:
+            f.write("\n## Localidades resueltas por coincidencia aproximada (grafía cruda → candidato del catálogo)\n\n")
+            f.write(aproximadas.to_markdown(index=False))
+            f.write("\n")
+        if any(completadas.values()):
+            f.write("\nRegistros con localidad completada por respaldo espacial/UPZ: ")
+            f.write(", ".join(f"{k}: {v}" for k, v in completadas.items()))
+            f.write("\n")
 
     print("Listo. Revisa data/working/ y docs/prep_psicoactivas_report.md")
 
@@ -0,0 +1,187 @@
+"""Tasas ajustadas por edad y sexo y razones de morbilidad estandarizadas por localidad–año.
+
+Cuenta los registros limpios de SIVIM (violencia) y VESPA (consumo, sumando
+`casos`) por localidad × año × sexo × grupo de edad sobre los ejes del tensor
+de población, y calcula en una sola llamada (utils_estandarizacion), para ambas
+medidas a la vez:
+
+- la tasa ajustada por el método directo (estándar: población de Bogotá en
+  `ANIO_ESTANDAR`) con IC gamma de Fay–Feuer, y
+- la RME (observados / esperados con tasas de Bogotá por estrato) con IC de Byar.
+
+Los casos sin sexo o edad reconocibles se reparten dentro de su localidad–año
+según la distribución de los casos con estrato conocido.
+"""
+import os
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from compute_rates import MULTIPLIER
+from schema import read_dtypes
+from utils_estandarizacion import (colapsar_edades, cortes_comunes, estandarizar, etiquetas_grupos, grupo_de,
+                                   limite_edad, repartir_sin_estrato)
+from utils_localidad import normalize_localidad_series
+from utils_perfil import etapa, filas, paso
+from utils_poblacion import TENSOR_PATH, TOTAL, TensorPoblacion, cargar_tensor, etiqueta_edad
+
+VIF_CLEAN = os.path.join("data", "working", "vintrafamiliar_clean.csv")
+PSICO_CLEAN = os.path.join("data", "working", "psicoactivas_clean.csv")
+OUT_CSV = os.path.join("data", "working", "tasas_estandarizadas_localidad_anio.csv")
+REPORT_PATH = os.path.join("docs", "estandarizadas_report.md")
+
+# Medida -> (archivo limpio, esquema, columna de edad, columna de casos o None para contar registros)
+FUENTES = {
+    "consumo": (PSICO_CLEAN, "psicoactivas", "curso_de_vida", "casos"),
+    "violencia": (VIF_CLEAN, "vif", "grupo_edad", None),
+}
+# Salida de `estandarizar` -> columna por medida
+COLUMNAS = {
+    "casos": "casos_{m}",
+    "tasa_cruda": "tasa_{m}_100k",
+    "tasa_ajustada": "tasa_ajustada_{m}_100k",
+    "tasa_ajustada_lo": "tasa_ajustada_{m}_100k_lo",
+    "tasa_ajustada_hi": "tasa_ajustada_{m}_100k_hi",
+    "esperados": "esperados_{m}",
+    "rme": "rme_{m}",
+    "rme_lo": "rme_{m}_lo",
+    "rme_hi": "rme_{m}_hi",
+}
+ANIO_ESTANDAR = 2018  # censo base de las proyecciones
+CONF = 0.975  # mismo nivel que make_ci
+
+
+def ensure_dirs():
+    os.makedirs(os.path.dirname(OUT_CSV), exist_ok=True)
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+
+
+def leer_fuente(path: str, schema: str, col_edad: str, col_casos: Optional[str]) -> pd.DataFrame:
+    usecols = ["nombre_localidad", "anio", "sexo", col_edad] + ([col_casos] if col_casos else [])
+    header = pd.read_csv(path, nrows=0).columns
+    faltan = [c for c in usecols if c not in header]
+    if faltan:
+        raise ValueError(f"Faltan columnas {faltan} en {path}")
+    dtypes = {c: t for c, t in read_dtypes(schema).items() if c in usecols}
+    df = pd.read_csv(path, usecols=usecols, dtype=dtypes)
+    return df.rename(columns={col_edad: "grupo_edad"})
+
+
+def _por_valor(s: pd.Series, fn) -> np.ndarray:
+    """Aplica `fn` (lista de etiquetas -> códigos) a cada valor distinto de la serie; NA -> fn([None])."""
+    cod, uniq = pd.factorize(s.astype(object))
+    lut = np.asarray(fn(list(uniq) + [None]), dtype=np.int64)
+    return lut[cod]
+
+
+def conteos(df: pd.DataFrame, tensor: TensorPoblacion, cortes: List[int],
+            col_casos: Optional[str]) -> Tuple[np.ndarray, np.ndarray, int]:
+    """Casos por (localidad, año, sexo, grupo común de edad) y casos sin estrato por (localidad, año).
+
+    También devuelve cuántos casos quedan fuera de las localidades/años del tensor.
+    """
+    L, A, G = len(tensor.localidades), len(tensor.anios), len(cortes)
+    sexos = tensor.sexos
+    loc = _por_valor(normalize_localidad_series(df["nombre_localidad"]), lambda u: tensor.codigos("localidad", u))
+    anio = _por_valor(df["anio"], lambda u: tensor.codigos("anio", u))
+    if sexos == [TOTAL]:
+        sexo = np.zeros(len(df), dtype=np.int64)
+    else:
+        sexo = _por_valor(df["sexo"], lambda u: tensor.codigos("sexo", u))
+    edad = _por_valor(df["grupo_edad"], lambda u: grupo_de(u, cortes))
+    peso = np.ones(len(df)) if col_casos is None else pd.to_numeric(df[col_casos], errors="coerce").fillna(0).to_numpy(dtype=float)
+
+    dentro = (loc >= 0) & (anio >= 0)
+    conocido = dentro & (sexo >= 0) & (edad >= 0)
+    plano = np.ravel_multi_index((loc[conocido], anio[conocido], sexo[conocido], edad[conocido]), (L, A, len(sexos), G))
+    conocidos = np.bincount(plano, weights=peso[conocido], minlength=L * A * len(sexos) * G).reshape(L, A, len(sexos), G)
+    sin = dentro & ~conocido
+    sin_estrato = np.bincount(loc[sin] * A + anio[sin], weights=peso[sin], minlength=L * A).reshape(L, A)
+    return conocidos, sin_estrato, int(peso[~dentro].sum())
+
+
+def a_tabla(res: Dict[str, np.ndarray], medidas: List[str], tensor: TensorPoblacion) -> pd.DataFrame:
+    """Resultados (medida, L, A) a una fila por localidad–año con columnas por medida."""
+    idx = pd.MultiIndex.from_product([tensor.localidades, tensor.anios.tolist()], names=["nombre_localidad", "anio"])
+    out = idx.to_frame(index=False)
+    out["poblacion"] = res["poblacion"][0].ravel()
+    for i, m in enumerate(medidas):
+        for k, col in COLUMNAS.items():
+            out[col.format(m=m)] = res[k][i].ravel()
+    return out
+
+
+@etapa("compute_estandarizadas")
+def main():
+    ensure_dirs()
+    tensor = cargar_tensor(TENSOR_PATH)
+    if ANIO_ESTANDAR not in set(tensor.anios.tolist()):
+        raise ValueError(f"El año estándar {ANIO_ESTANDAR} no está en el tensor de población ({tensor.resumen()['anios']})")
+
+    fuentes = {m: f for m, f in FUENTES.items() if os.path.exists(f[0])}
+    if not fuentes:
+        raise FileNotFoundError(f"No existen {VIF_CLEAN} ni {PSICO_CLEAN}. Corre prep_vif.py / clean_psicoactivas.py")
+    datos = {}
+    with paso("leer"):
+        for m, (path, schema, col_edad, col_casos) in fuentes.items():
+            datos[m] = leer_fuente(path, schema, col_edad, col_casos)
+    filas(entrada=sum(len(d) for d in datos.values()))
+
+    # Partición de edad común a la población y a los grupos de cada fuente
+    grupos_fuente = {
+        m: sorted({e for e in map(etiqueta_edad, d["grupo_edad"].dropna().unique()) if e}, key=limite_edad)
+        for m, d in datos.items()
+    }
+    cortes = cortes_comunes(tensor.edades, *grupos_fuente.values())
+    grupos = etiquetas_grupos(cortes)
+    poblacion = colapsar_edades(tensor.valores, grupo_de(tensor.edades, cortes))
+
+    medidas = list(datos)
+    casos, resumen = [], []
+    with paso("conteos"):
+        for m in medidas:
+            conocidos, sin_estrato, fuera = conteos(datos[m], tensor, cortes, fuentes[m][3])
+            repartidos, sin_repartir = repartir_sin_estrato(conocidos, sin_estrato)
+            casos.append(repartidos)
+            resumen.append({"medida": m, "con_estrato": conocidos.sum(), "repartidos": sin_estrato.sum() - sin_repartir.sum(),
+                            "sin_repartir": sin_repartir.sum(), "fuera_de_rango": fuera})
+
+    with paso("estandarizar"):
+        anio_idx = int(ANIO_ESTANDAR - tensor.anios[0])
+        res = estandarizar(np.stack(casos), poblacion, anio_idx, CONF, MULTIPLIER)
+    tabla = a_tabla(res, medidas, tensor)
+    tabla.to_csv(OUT_CSV, index=False, encoding="utf-8")
+    filas(salida=len(tabla))
+
+    estandar = pd.DataFrame(
+        np.nansum(poblacion[:, anio_idx], axis=0), index=pd.Index(tensor.sexos, name="sexo"), columns=grupos,
+    )
+    ultimo = int(tabla.dropna(subset=["poblacion"])["anio"].max())
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        f.write("# Tasas ajustadas por edad y sexo y RME por localidad–año\n\n")
+        f.write(f"Archivo: {OUT_CSV}\n\n")
+        f.write(f"- Estratos: sexo ({', '.join(tensor.sexos)}) × grupo de edad ({', '.join(grupos)})\n")
+        f.write(f"- Método directo: población estándar de Bogotá {ANIO_ESTANDAR}; IC {CONF:.1%} gamma (Fay–Feuer)\n")
+        f.write(f"- Método indirecto: tasas de Bogotá por estrato del mismo año; RME con IC {CONF:.1%} (Byar)\n")
+        for m, g in grupos_fuente.items():
+            f.write(f"- Grupos de edad en {m}: {', '.join(g) or '(ninguno reconocible)'}\n")
+        f.write("\n## Población estándar\n\n")
+        f.write(estandar.to_markdown(floatfmt=".0f"))
+        f.write("\n\n## Casos por estrato\n\n")
+        f.write(pd.DataFrame(resumen).to_markdown(index=False, floatfmt=".0f"))
+        f.write("\n\nrepartidos: casos sin sexo/edad asignados según la distribución de su localidad–año; ")
+        f.write("sin_repartir: casos de localidades–año sin ningún caso con estrato conocido (excluidos).\n")
+        for m in medidas:
+            cols = ["nombre_localidad"] + [c.format(m=m) for k, c in COLUMNAS.items() if k not in ("casos", "esperados")]
+            sub = tabla[tabla["anio"] == ultimo][cols].sort_values(f"tasa_ajustada_{m}_100k", ascending=False)
+            f.write(f"\n## {m.capitalize()} {ultimo}: tasa cruda vs ajustada (por 100.000) y RME\n\n")
+            f.write(sub.to_markdown(index=False, floatfmt=".2f"))
+            f.write("\n")
+
+    print(f"Tasas estandarizadas: {OUT_CSV}")
+    print(f"Reporte: {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    main()
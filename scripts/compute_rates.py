@@ -1,20 +1,66 @@
 import os
+from typing import Dict, Optional, Sequence, Union
+
+import numpy as np
 import pandas as pd
 
-from utils_localidad import normalize_localidad
+from utils_localidad import normalize_localidad_series
+from schema import read_csv
+from utils_perfil import etapa, filas
 
 MASTER_IN = os.path.join("data", "working", "localidad_ano_master.csv")
 POB_PATH = os.path.join("data", "working", "poblacion_localidad_anio.csv")
 MASTER_OUT = os.path.join("data", "working", "localidad_ano_master_rates.csv")
 REPORT_PATH = os.path.join("docs", "rates_report.md")
 
+# Medidas: nombre de la tasa -> columna de conteo (numerador)
+RATE_MEASURES: Dict[str, str] = {
+    "tasa_consumo_100k": "casos_consumo",
+    "tasa_violencia_100k": "casos_violencia",
+}
+MULTIPLIER = 100000
+POBLACION_BAJA_UMBRAL = 1000
+
 
 def ensure_dirs():
     os.makedirs(os.path.dirname(MASTER_OUT), exist_ok=True)
     os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
 
 
-def main():
+def compute_rate_columns(
+    df: pd.DataFrame,
+    measures: Dict[str, str],
+    denominators: Union[str, Sequence[str]] = "poblacion",
+    multiplier: float = MULTIPLIER,
+) -> pd.DataFrame:
+    """Calcula todas las tasas en una sola operación matricial enmascarada.
+
+    `measures` mapea nombre de tasa -> columna de conteo. `denominators` es una
+    columna común o una lista (una por medida). La tasa es NA cuando el
+    denominador falta o es <= 0, igual que la regla fila a fila anterior.
+    """
+    names = list(measures)
+    if isinstance(denominators, str):
+        denominators = [denominators]
+    if len(denominators) not in (1, len(names)):
+        raise ValueError("Se requiere un denominador común o uno por medida")
+
+    num = np.column_stack([pd.to_numeric(df[measures[n]], errors="coerce").to_numpy(dtype=float, na_value=np.nan) for n in names])
+    den = np.column_stack([pd.to_numeric(df[d], errors="coerce").to_numpy(dtype=float, na_value=np.nan) for d in denominators])
+
+    valid = ~np.isnan(den) & (den > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates = np.where(valid, (num / den) * multiplier, np.nan)
+    return pd.DataFrame(rates, columns=names, index=df.index)
+
+
+def flag_low_denominator(den: pd.Series, threshold: float = POBLACION_BAJA_UMBRAL) -> pd.Series:
+    """Flag `poblacion_baja`: denominador ausente o menor que el umbral."""
+    return den.fillna(0) < threshold
+
+
+@etapa("compute_rates")
+def main(measures: Optional[Dict[str, str]] = None):
     ensure_dirs()
 
     if not os.path.exists(MASTER_IN):
@@ -36,12 +82,12 @@ def main():
             f"No existe {POB_PATH}. He creado una plantilla. Llénala con columnas: nombre_localidad, anio, poblacion"
         )
 
-    df = pd.read_csv(MASTER_IN, dtype={"anio": "Int64"})
-    pob = pd.read_csv(POB_PATH, dtype={"anio": "Int64"})
+    df = read_csv(MASTER_IN, "agregado")
+    pob = read_csv(POB_PATH, "agregado")
 
     # Normalizar localidades en población y master por seguridad
-    pob["nombre_localidad"] = pob["nombre_localidad"].apply(normalize_localidad)
-    df["nombre_localidad"] = df["nombre_localidad"].apply(normalize_localidad)
+    pob["nombre_localidad"] = normalize_localidad_series(pob["nombre_localidad"])
+    df["nombre_localidad"] = normalize_localidad_series(df["nombre_localidad"])
 
     # Merge left para mantener todas las claves del master
     merged = df.merge(
@@ -50,21 +96,13 @@ def main():
 
     # Calcular tasas por 100.000 si hay población
     merged["poblacion"] = pd.to_numeric(merged["poblacion"], errors="coerce")
-    merged["poblacion_baja"] = merged["poblacion"].fillna(0) < 1000
-
-    def safe_rate(num, den):
-        if pd.isna(den) or den <= 0:
-            return pd.NA
-        return (num / den) * 100000
+    merged["poblacion_baja"] = flag_low_denominator(merged["poblacion"])
 
-    merged["tasa_consumo_100k"] = [
-        safe_rate(n, d) for n, d in zip(merged["casos_consumo"], merged["poblacion"])
-    ]
-    merged["tasa_violencia_100k"] = [
-        safe_rate(n, d) for n, d in zip(merged["casos_violencia"], merged["poblacion"])
-    ]
+    rates = compute_rate_columns(merged, measures or RATE_MEASURES, "poblacion", MULTIPLIER)
+    merged[rates.columns] = rates
 
     # Exportar
+    filas(entrada=len(df), salida=len(merged))
     merged.to_csv(MASTER_OUT, index=False, encoding="utf-8")
 
     # Reporte
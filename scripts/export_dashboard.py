@@ -0,0 +1,124 @@
+"""Exporta el tablero estático: un paquete de datos precomputados y un HTML autocontenido.
+
+El paquete (JSON columnar) trae la grilla localidad×año de casos, población,
+tasas por 100.000 e IC de Byar para cada medida, y los totales de Bogotá por
+año con su IC. El HTML incrusta el mismo paquete y dibuja las vistas en el
+navegador (SVG), sin dependencias externas: agregar una vista es agregar una
+función JS en la plantilla, no otra pasada de matplotlib.
+"""
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from compute_rates import MULTIPLIER
+from schema import read_csv
+from utils_ci import rate_ci
+from utils_jerarquia import leer_nivel
+from utils_perfil import etapa, filas, paso
+
+RATES_PATH = os.path.join("data", "working", "localidad_ano_master_rates.csv")
+TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "dashboard_template.html")
+OUT_DIR = os.path.join("docs", "dashboard")
+DATA_PATH = os.path.join(OUT_DIR, "dashboard_data.json")
+HTML_PATH = os.path.join(OUT_DIR, "index.html")
+
+CONF = 0.975  # mismo nivel que make_ci
+# Medida del tablero -> (columna de conteo, etiqueta)
+MEDIDAS = {
+    "consumo": ("casos_consumo", "Consumo de psicoactivos"),
+    "violencia": ("casos_violencia", "Violencia intrafamiliar"),
+}
+DECIMALES = 2
+MARCA_DATOS = "__DATOS_TABLERO__"
+
+
+def ensure_dirs():
+    os.makedirs(OUT_DIR, exist_ok=True)
+
+
+def _lista(a: np.ndarray, decimales: int = DECIMALES):
+    """Matriz/vector a listas anidadas JSON (NaN -> null)."""
+    a = np.round(np.asarray(a, dtype=float), decimales)
+    obj = a.astype(object)
+    obj[np.isnan(a)] = None
+    if decimales == 0:
+        obj[~np.isnan(a)] = a[~np.isnan(a)].astype(np.int64)
+    return obj.tolist()
+
+
+def _medida(k: np.ndarray, e: np.ndarray) -> dict:
+    tasa, lo, hi = rate_ci(k, e, CONF, method="byar", per=MULTIPLIER)
+    return {"casos": _lista(k, 0), "tasa": _lista(tasa), "lo": _lista(lo), "hi": _lista(hi)}
+
+
+def build_bundle(df: pd.DataFrame, bogota: pd.DataFrame) -> dict:
+    """Grilla completa localidad×año (celdas ausentes = null) y totales de Bogotá con IC.
+
+    `bogota` son los totales por año precomputados por aggregate_niveles.
+    """
+    locs = sorted(df["nombre_localidad"].dropna().astype(str).unique())
+    anios = sorted(int(a) for a in df["anio"].dropna().unique())
+    df = df.assign(nombre_localidad=df["nombre_localidad"].astype(str), anio=df["anio"].astype(int))
+    idx = pd.MultiIndex.from_product([locs, anios], names=["nombre_localidad", "anio"])
+    cols = ["poblacion"] + [c for c, _ in MEDIDAS.values()]
+    grid = df.set_index(["nombre_localidad", "anio"])[cols].apply(pd.to_numeric, errors="coerce").reindex(idx)
+    shape = (len(locs), len(anios))
+    e = grid["poblacion"].to_numpy(dtype=float).reshape(shape)
+
+    bog = bogota.assign(anio=bogota["anio"].astype(int)).set_index("anio").reindex(anios)
+    e_bog = bog["poblacion"].to_numpy(dtype=float)
+    bogota = {"poblacion": _lista(e_bog, 0)}
+    medidas = {}
+    for nombre, (col, etiqueta) in MEDIDAS.items():
+        k = grid[col].to_numpy(dtype=float).reshape(shape)
+        medidas[nombre] = {"etiqueta": etiqueta, **_medida(k, e)}
+        bogota[nombre] = _medida(pd.to_numeric(bog[col]).to_numpy(dtype=float, na_value=np.nan), e_bog)
+
+    return {
+        "generado": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "fuente": RATES_PATH,
+        "conf": CONF,
+        "por": MULTIPLIER,
+        "metodo_ic": "Byar (Poisson)",
+        "localidades": locs,
+        "anios": anios,
+        "poblacion": _lista(e, 0),
+        "medidas": medidas,
+        "bogota": bogota,
+    }
+
+
+def render_html(bundle: dict) -> str:
+    with open(TEMPLATE_PATH, "r", encoding="utf-8") as fh:
+        template = fh.read()
+    # JSON dentro de <script>: se escapa "</" para que no cierre la etiqueta
+    datos = json.dumps(bundle, ensure_ascii=False, separators=(",", ":"), allow_nan=False).replace("</", "<\\/")
+    return template.replace(MARCA_DATOS, datos)
+
+
+@etapa("export_dashboard")
+def main():
+    ensure_dirs()
+    if not os.path.exists(RATES_PATH):
+        raise FileNotFoundError(f"No existe {RATES_PATH}. Corre compute_rates.py")
+
+    df = read_csv(RATES_PATH, "agregado")
+    with paso("paquete"):
+        bundle = build_bundle(df, leer_nivel("bogota"))
+    filas(entrada=len(df), salida=len(bundle["localidades"]) * len(bundle["anios"]))
+
+    with paso("escribir"):
+        with open(DATA_PATH, "w", encoding="utf-8") as fh:
+            json.dump(bundle, fh, ensure_ascii=False, separators=(",", ":"), allow_nan=False)
+        with open(HTML_PATH, "w", encoding="utf-8") as fh:
+            fh.write(render_html(bundle))
+
+    print(f"Paquete de datos: {DATA_PATH}")
+    print(f"Tablero: {HTML_PATH}")
+
+
+if __name__ == "__main__":
+    main()
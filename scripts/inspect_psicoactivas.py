@@ -1,16 +1,20 @@
 import os
 import pandas as pd
 
+from utils_excel_cache import read_sheet, sheet_names
+from utils_perfil import etapa
+
 RAW_XLSX = os.path.join("data", "raw", "psicoactivas.xlsx")
 REPORT = os.path.join("docs", "psicoactivas_inspect.md")
 
 
+@etapa("inspect_psicoactivas")
 def main():
     os.makedirs(os.path.dirname(REPORT), exist_ok=True)
 
     # Listar hojas
     try:
-        xls = pd.ExcelFile(RAW_XLSX, engine="openpyxl")
+        names = sheet_names(RAW_XLSX)
     except Exception as e:
         print(f"Error abriendo {RAW_XLSX}: {e}")
         return
@@ -19,14 +23,14 @@ def main():
         f.write("# Inspección inicial psicoactivas.xlsx\n\n")
         f.write(f"Archivo: {RAW_XLSX}\n\n")
         f.write("## Hojas disponibles\n\n")
-        for name in xls.sheet_names:
+        for name in names:
             f.write(f"- {name}\n")
         f.write("\n## Columnas por hoja (primeras 5 filas de ejemplo)\n\n")
 
-        for name in xls.sheet_names:
+        for name in names:
             f.write(f"### Hoja: {name}\n\n")
             try:
-                df = pd.read_excel(xls, sheet_name=name, nrows=5)
+                df = read_sheet(RAW_XLSX, sheet_name=name, nrows=5)
             except Exception as e:
                 f.write(f"No se pudo leer la hoja: {e}\n\n")
                 continue
@@ -1,7 +1,9 @@
 import os
 import pandas as pd
 
-from utils_localidad import normalize_localidad
+from utils_localidad import normalize_localidad_series
+from schema import read_csv
+from utils_perfil import etapa, filas
 
 PSICO_PATH = os.path.join("data", "working", "psicoactivas_localidad_anio.csv")
 VIF_PATH = os.path.join("data", "working", "vif_localidad_anio.csv")
@@ -14,21 +16,24 @@ def ensure_dirs():
     os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
 
 
+@etapa("join_master")
 def main():
     ensure_dirs()
 
-    psico = pd.read_csv(PSICO_PATH, dtype={"anio": "Int64"}) if os.path.exists(PSICO_PATH) else None
-    vif = pd.read_csv(VIF_PATH, dtype={"anio": "Int64"}) if os.path.exists(VIF_PATH) else None
+    psico = read_csv(PSICO_PATH, "agregado") if os.path.exists(PSICO_PATH) else None
+    vif = read_csv(VIF_PATH, "agregado") if os.path.exists(VIF_PATH) else None
 
     if psico is None or vif is None:
         missing = [p for p, ok in [(PSICO_PATH, psico is not None), (VIF_PATH, vif is not None)] if not ok]
         raise FileNotFoundError(f"Faltan insumos para el join: {missing}")
 
+    filas(entrada=len(psico) + len(vif))
+
     # Normalizar localidades y depurar claves nulas como salvaguarda final
     if "nombre_localidad" in psico.columns:
-        psico["nombre_localidad"] = psico["nombre_localidad"].apply(normalize_localidad)
+        psico["nombre_localidad"] = normalize_localidad_series(psico["nombre_localidad"])
     if "nombre_localidad" in vif.columns:
-        vif["nombre_localidad"] = vif["nombre_localidad"].apply(normalize_localidad)
+        vif["nombre_localidad"] = normalize_localidad_series(vif["nombre_localidad"])
 
     # Tipos año
     for df in (psico, vif):
@@ -66,6 +71,7 @@ def main():
     master = master[cols + other_cols]
 
     # Exportar
+    filas(salida=len(master))
     master.to_csv(OUT_PATH, index=False, encoding="utf-8")
 
     # Reporte
@@ -1,16 +1,31 @@
+import argparse
 import os
-import math
+from typing import Optional
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from utils_bootstrap import bootstrap, rate_ratio
+from utils_ci import byar_ci, rate_ratio_ci, wilson_ci
+from utils_render import render_figures
+from schema import read_csv
+from utils_perfil import etapa, filas
+from utils_jerarquia import leer_nivel
+
 RATES_PATH = os.path.join("data", "working", "localidad_ano_master_rates.csv")
 FIG_DIR = os.path.join("docs", "figs")
+# Figures written by this stage (run_pipeline outputs)
+FIGURAS = [os.path.join(FIG_DIR, f) for f in (
+    "bogota_tasas_ic_consumo.png", "bogota_tasas_ic_violencia.png",
+    "prop_vif_mayor_consumo_wilson.png", "rr_violencia_alto_vs_bajo_consumo.png",
+)]
 REPORT = os.path.join("docs", "ci_report.md")
 
 CONF = 0.975  # >96% as requested
-Z = 2.24      # approx z for 97.5% two-sided
+N_BOOT = 10000
+SEED = 20240101
 
 sns.set(style="whitegrid", context="talk")
 
@@ -20,55 +35,13 @@ def ensure_dirs():
     os.makedirs(os.path.dirname(REPORT), exist_ok=True)
 
 
-# Byar CI for Poisson count k
-# lo ≈ k*(1 - 1/(9k) - z/(3*sqrt(k)))^3; hi ≈ (k+1)*(1 - 1/(9(k+1)) + z/(3*sqrt(k+1)))^3
-# For k=0, use 0 for lower and -ln(alpha)/E for upper in rate space; here handle with small-k guard
-
-def byar_ci_counts(k: np.ndarray, z: float) -> tuple[np.ndarray, np.ndarray]:
-    k = np.asarray(k, dtype=float)
-    lo = np.empty_like(k)
-    hi = np.empty_like(k)
-    for i, ki in enumerate(k):
-        if ki <= 0:
-            lo[i] = 0.0
-            hi[i] = (1 - 1/(9*(ki+1)) + z/(3*math.sqrt(ki+1)))**3 * (ki+1)
-        else:
-            lo[i] = (1 - 1/(9*ki) - z/(3*math.sqrt(ki)))**3 * ki
-            hi[i] = (1 - 1/(9*(ki+1)) + z/(3*math.sqrt(ki+1)))**3 * (ki+1)
-    return lo, hi
-
-
-def wilson_ci(k: int, n: int, z: float) -> tuple[float, float, float]:
-    if n == 0:
-        return (np.nan, np.nan, np.nan)
-    p = k / n
-    denom = 1 + z**2 / n
-    center = (p + z**2/(2*n)) / denom
-    half = z * math.sqrt((p*(1-p)/n) + (z**2/(4*n**2))) / denom
-    return p, max(0.0, center - half), min(1.0, center + half)
-
-
-def rate_ratio_ci(k_high: int, e_high: float, k_low: int, e_low: float, z: float) -> tuple[float, float, float]:
-    # Poisson counts, exposures e; RR = (k_high/e_high)/(k_low/e_low)
-    if k_high <= 0 or k_low <= 0 or e_high <= 0 or e_low <= 0:
-        return (np.nan, np.nan, np.nan)
-    rr = (k_high / e_high) / (k_low / e_low)
-    se_log = math.sqrt(1/k_high + 1/k_low)
-    lo = math.exp(math.log(rr) - z*se_log)
-    hi = math.exp(math.log(rr) + z*se_log)
-    return rr, lo, hi
-
-
 def plot_bogota_rates_with_ci(df: pd.DataFrame):
-    # aggregate by year for Bogotá totals
+    # df: Bogotá totals by year, precomputed by aggregate_niveles
     out_rows = []
     for var_cases in ["casos_consumo", "casos_violencia"]:
         label = "Consumo" if var_cases=="casos_consumo" else "Violencia"
-        g = df.groupby("anio", dropna=True).agg(
-            k=(var_cases, "sum"),
-            E=("poblacion", "sum")
-        ).reset_index().dropna()
-        lo_k, hi_k = byar_ci_counts(g["k"].to_numpy(), Z)
+        g = df[["anio", var_cases, "poblacion"]].rename(columns={var_cases: "k", "poblacion": "E"}).dropna().sort_values("anio")
+        lo_k, hi_k = byar_ci(g["k"].to_numpy(dtype=float), CONF)
         rate = (g["k"] / g["E"]) * 100000
         lo = (lo_k / g["E"]) * 100000
         hi = (hi_k / g["E"]) * 100000
@@ -100,8 +73,8 @@ def plot_wilson_two_periods(df: pd.DataFrame):
     for periodo, sub in df.groupby("periodo"):
         n = len(sub)
         k = int((sub["tasa_violencia_100k"] > sub["tasa_consumo_100k"]).sum())
-        p, lo, hi = wilson_ci(k, n, Z)
-        tbl.append({"periodo": periodo, "k": k, "n": n, "p": p, "lo": lo, "hi": hi})
+        p, lo, hi = wilson_ci(k, n, CONF)
+        tbl.append({"periodo": periodo, "k": k, "n": n, "p": float(p), "lo": float(lo), "hi": float(hi)})
     res = pd.DataFrame(tbl)
 
     # plot
@@ -130,11 +103,23 @@ def plot_rate_ratio_forest(df: pd.DataFrame):
     e_high = float(high["poblacion"].sum())
     k_low = int(low["casos_violencia"].sum())
     e_low = float(low["poblacion"].sum())
-    rr, lo, hi = rate_ratio_ci(k_high, e_high, k_low, e_low, Z)
+    rr, lo, hi = (float(v) for v in rate_ratio_ci(k_high, e_high, k_low, e_low, CONF))
+
+    # Bootstrap (BCa) resampling Q1/Q4 cells within year, to keep the per-year quartile design
+    sub = df[df["q_consumo"].astype(int).isin([1, 4])]
+    q = sub["q_consumo"].astype(int)
+    boot = bootstrap(
+        rate_ratio,
+        {"k": sub["casos_violencia"], "e": sub["poblacion"], "high": q == 4, "low": q == 1},
+        n_boot=N_BOOT, conf=CONF, method="bca", strata=sub["anio"].astype(int), seed=SEED,
+    )
 
     # forest-like single point
     fig, ax = plt.subplots(figsize=(7, 2.5))
-    ax.errorbar(rr, 0, xerr=[[rr-lo], [hi-rr]], fmt="o", color="#2ca02c")
+    ax.errorbar(rr, 0, xerr=[[rr-lo], [hi-rr]], fmt="o", color="#2ca02c", label="Log-normal")
+    ax.errorbar(rr, -0.3, xerr=[[rr-boot.lo], [boot.hi-rr]], fmt="s", color="#9467bd", label="Bootstrap BCa")
+    ax.set_ylim(-0.8, 0.5)
+    ax.legend(loc="lower right", fontsize=9)
     ax.axvline(1.0, color="k", lw=1)
     ax.set_yticks([])
     ax.set_xlabel("Razón de tasas de violencia (alto vs bajo consumo)")
@@ -148,24 +133,33 @@ def plot_rate_ratio_forest(df: pd.DataFrame):
         "k_low": k_low, "e_low": e_low,
         "k_high": k_high, "e_high": e_high,
         "rr": rr, "lo": lo, "hi": hi,
+        "boot_lo": boot.lo, "boot_hi": boot.hi,
     }
 
 
-def main():
+@etapa("make_ci")
+def main(workers: Optional[int] = None):
     ensure_dirs()
     if not os.path.exists(RATES_PATH):
         raise FileNotFoundError(f"No existe {RATES_PATH}. Corre compute_rates.py")
 
-    df = pd.read_csv(RATES_PATH, dtype={"anio": "Int64"})
+    df = read_csv(RATES_PATH, "agregado")
+    filas(entrada=len(df))
 
     # 1) Bogotá rates with Byar CI
-    bog = plot_bogota_rates_with_ci(df)
-
     # 2) Wilson for proportion VIF>Consumo by two periods
-    wil = plot_wilson_two_periods(df)
-
     # 3) Rate ratio high vs low consumption
-    rr = plot_rate_ratio_forest(df)
+    # Independent figures: rendered in a process pool (Agg), results returned to build the report
+    tasks = [
+        ("make_ci", "plot_bogota_rates_with_ci", "bogota"),
+        ("make_ci", "plot_wilson_two_periods", "rates"),
+        ("make_ci", "plot_rate_ratio_forest", "rates"),
+    ]
+    results, timings = render_figures(tasks, {"rates": df, "bogota": leer_nivel("bogota")}, workers=workers)
+    bog = results["plot_bogota_rates_with_ci"]
+    wil = results["plot_wilson_two_periods"]
+    rr = results["plot_rate_ratio_forest"]
+    print(timings.to_string(index=False))
 
     # Write report with tables
     with open(REPORT, "w", encoding="utf-8") as f:
@@ -173,7 +167,8 @@ def main():
         f.write("Este reporte utiliza métodos apropiados para conteos de eventos poco frecuentes y proporciones:\n\n")
         f.write("- Tasas por 100.000: IC de Byar (aprox. Poisson) para agregados de Bogotá por año.\n")
         f.write("- Proporciones: IC de Wilson para la fracción de celdas localidad–año con VIF > Consumo, comparando 2015–2019 vs 2020–2024.\n")
-        f.write("- Razón de tasas (RR): IC log-normal para comparar violencia entre celdas con consumo alto (Q4) vs bajo (Q1).\n\n")
+        f.write("- Razón de tasas (RR): IC log-normal para comparar violencia entre celdas con consumo alto (Q4) vs bajo (Q1), ")
+        f.write(f"contrastado con un IC bootstrap BCa ({N_BOOT} réplicas, remuestreo de celdas dentro de cada año, semilla {SEED}).\n\n")
 
         f.write("## 1) Bogotá: tasas con IC (Byar)\n\n")
         f.write("Se muestran dos figuras: consumo y violencia, cada una con su banda de IC.\n\n")
@@ -195,4 +190,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="IC para indicadores clave")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para render (1 = secuencial)")
+    args = parser.parse_args()
+    main(workers=args.workers)
@@ -1,12 +1,35 @@
+import argparse
 import os
+from typing import Optional
+
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from utils_bootstrap import bootstrap, pearson_r
+from utils_render import render_figures
+from schema import read_csv
+from utils_perfil import etapa, filas, paso
+from utils_jerarquia import NIVELES_EXPORT, leer_nivel
+
 MASTER_PATH = os.path.join("data", "working", "localidad_ano_master.csv")
 MASTER_RATES_PATH = os.path.join("data", "working", "localidad_ano_master_rates.csv")
 FIG_DIR = os.path.join("docs", "figs")
+# Figuras que escribe la etapa (salidas para run_pipeline)
+FIGURAS = [os.path.join(FIG_DIR, f) for f in (
+    "lineas_bogota_casos.png", "top10_casos_consumo.png", "top10_casos_violencia.png",
+    "heatmap_casos_consumo.png", "heatmap_casos_violencia.png", "scatter_consumo_vs_violencia.png",
+    "lineas_bogota_tasas.png", "heatmap_tasa_consumo_100k.png", "heatmap_tasa_violencia_100k.png",
+    "facets_tasa_consumo.png", "facets_tasa_violencia.png", "scatter_tasas_consumo_vs_violencia.png",
+    "reg_panel_scatter_tasas.png", "reg_city_scatter_tasas.png", "hexbin_tasas.png",
+    "correlacion_por_localidad_tasas.png", "lag1_scatter_tasas.png",
+)]
+
+# Bootstrap de r por localidad (IC BCa)
+N_BOOT = 10000
+CONF_BOOT = 0.95
+SEED = 20240101
 
 sns.set(style="whitegrid", context="talk")
 
@@ -23,7 +46,8 @@ def savefig(path: str):
 
 
 def plot_series_bogota(df: pd.DataFrame):
-    anio_sum = df.groupby("anio")[ ["casos_consumo", "casos_violencia" ] ].sum().reset_index()
+    # df: nivel Bogotá precomputado (aggregate_niveles)
+    anio_sum = df.sort_values("anio")
     fig, ax = plt.subplots(figsize=(10, 6))
     ax.plot(anio_sum["anio"], anio_sum["casos_consumo"], marker="o", label="Consumo (casos)")
     ax.plot(anio_sum["anio"], anio_sum["casos_violencia"], marker="o", label="Violencia (casos)")
@@ -50,7 +74,7 @@ def plot_top_bars(df: pd.DataFrame):
 
 def plot_heatmaps(df: pd.DataFrame):
     for var in ["casos_consumo", "casos_violencia"]:
-        pivot = df.pivot_table(index="anio", columns="nombre_localidad", values=var, aggfunc="sum")
+        pivot = df.pivot_table(index="anio", columns="nombre_localidad", values=var, aggfunc="sum").astype(float)
         # ordenar columnas por suma total descendente para legibilidad
         order = pivot.sum(axis=0).sort_values(ascending=False).index
         pivot = pivot[order]
@@ -210,9 +234,26 @@ def plot_corr_by_localidad(df: pd.DataFrame):
     rloc = rloc[["nombre_localidad", "tasa_consumo_100k"]].rename(columns={"tasa_consumo_100k": "r"})
     rloc = rloc.sort_values("r", ascending=False)
 
+    # IC bootstrap de r remuestreando años dentro de cada localidad
+    sub = df.dropna(subset=["tasa_consumo_100k", "tasa_violencia_100k"])
+    lims = {}
+    for i, (loc, g) in enumerate(sub.groupby("nombre_localidad")):
+        res = bootstrap(
+            pearson_r, {"x": g["tasa_consumo_100k"], "y": g["tasa_violencia_100k"]},
+            n_boot=N_BOOT, conf=CONF_BOOT, method="bca", seed=SEED + i,
+        )
+        lims[loc] = (res.lo, res.hi)
+    rloc["lo"] = rloc["nombre_localidad"].map(lambda l: lims.get(l, (np.nan, np.nan))[0])
+    rloc["hi"] = rloc["nombre_localidad"].map(lambda l: lims.get(l, (np.nan, np.nan))[1])
+
     fig, ax = plt.subplots(figsize=(10, 7))
     sns.barplot(data=rloc, y="nombre_localidad", x="r", ax=ax, palette="coolwarm", hue=None)
-    ax.set_title("Correlación (r de Pearson) entre tasas por localidad")
+    ax.errorbar(
+        rloc["r"], np.arange(len(rloc)),
+        xerr=[(rloc["r"] - rloc["lo"]).clip(lower=0), (rloc["hi"] - rloc["r"]).clip(lower=0)],
+        fmt="none", ecolor="k", capsize=3,
+    )
+    ax.set_title(f"Correlación (r de Pearson) entre tasas por localidad — IC {int(CONF_BOOT*100)}% bootstrap BCa")
     ax.set_xlabel("r (consumo vs violencia)")
     ax.set_ylabel("")
     ax.axvline(0, color="k", linewidth=1)
@@ -239,43 +280,58 @@ def plot_lagged_relationship(df: pd.DataFrame):
     savefig(os.path.join(FIG_DIR, "lag1_scatter_tasas.png"))
 
 
-def main():
+PLOTS_CASOS = ["plot_top_bars", "plot_heatmaps", "plot_scatter"]
+PLOTS_TASAS = [
+    "plot_series_bogota_rates", "plot_heatmaps_rates", "plot_facets_rates", "plot_scatter_rates",
+    "plot_hexbin_rates", "plot_corr_by_localidad", "plot_lagged_relationship",
+    "plot_panel_scatter_rates_colored", "plot_city_scatter_rates",
+]
+
+
+@etapa("make_plots")
+def main(workers: Optional[int] = None):
     ensure_dirs()
     if not os.path.exists(MASTER_PATH):
         raise FileNotFoundError(f"No existe {MASTER_PATH}. Corre primero join_master.py")
 
     # Cargar master y, si existe, archivo con tasas
-    df_master = pd.read_csv(MASTER_PATH, dtype={"anio": "Int64"})
+    with paso("leer_master"):
+        df_master = read_csv(MASTER_PATH, "agregado")
+    filas(entrada=len(df_master))
 
     # Intentar cargar archivo de tasas (compute_rates.py)
     if os.path.exists(MASTER_RATES_PATH):
-        df_rates = pd.read_csv(MASTER_RATES_PATH, dtype={"anio": "Int64"})
+        df_rates = read_csv(MASTER_RATES_PATH, "agregado")
     else:
         df_rates = None
 
     # Gráficas en conteos (para referencia)
-    plot_series_bogota(df_master)
-    plot_top_bars(df_master)
-    plot_heatmaps(df_master)
-    plot_scatter(df_master)
+    tasks = [("make_plots", f, "master") for f in PLOTS_CASOS]
+    frames = {"master": df_master}
+
+    # Serie de Bogotá desde los totales precomputados por nivel
+    if os.path.exists(NIVELES_EXPORT):
+        tasks.insert(0, ("make_plots", "plot_series_bogota", "bogota"))
+        frames["bogota"] = leer_nivel("bogota")
+    else:
+        print(f"Advertencia: no existe {NIVELES_EXPORT}. Ejecuta aggregate_niveles.py para la serie de Bogotá")
 
     # Gráficas ajustadas por población si hay tasas
     if df_rates is not None and has_rates(df_rates):
-        plot_series_bogota_rates(df_rates)
-        plot_heatmaps_rates(df_rates)
-        plot_facets_rates(df_rates)
-        plot_scatter_rates(df_rates)
-        plot_hexbin_rates(df_rates)
-        plot_corr_by_localidad(df_rates)
-        plot_lagged_relationship(df_rates)
-        # Nuevas figuras solicitadas
-        plot_panel_scatter_rates_colored(df_rates)
-        plot_city_scatter_rates(df_rates)
+        tasks += [("make_plots", f, "rates") for f in PLOTS_TASAS]
+        frames["rates"] = df_rates
     else:
         print("Advertencia: no se encontró archivo de tasas. Ejecuta scripts: prep_poblacion.py y compute_rates.py")
 
+    # Figuras independientes entre sí: se renderizan en un pool de procesos (Agg)
+    _, timings = render_figures(tasks, frames, workers=workers)
+    print(timings.sort_values("segundos", ascending=False).to_string(index=False))
+
     print("Figuras generadas en docs/figs/")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Figuras descriptivas localidad–año")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para render (1 = secuencial)")
+    args = parser.parse_args()
+    main(workers=args.workers)
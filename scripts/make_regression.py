@@ -5,9 +5,19 @@ import matplotlib.pyplot as plt
 import seaborn as sns
 import statsmodels.api as sm
 
+from utils_panel import fit_within
+from schema import read_csv
+from utils_perfil import etapa
+from utils_jerarquia import leer_nivel
+
 RATES_PATH = os.path.join("data", "working", "localidad_ano_master_rates.csv")
 FIG_DIR = os.path.join("docs", "figs")
 REPORT = os.path.join("docs", "regression_report.md")
+# Figuras que escribe la etapa (salidas para run_pipeline); la dispersión coloreada
+# por año de make_plots es reg_panel_scatter_tasas.png
+FIG_PANEL = os.path.join(FIG_DIR, "reg_panel_scatter_tasas_modelo.png")
+FIG_PRONOSTICO = os.path.join(FIG_DIR, "reg_bogota_series_forecast.png")
+FIGURAS = [FIG_PANEL, FIG_PRONOSTICO]
 
 sns.set(style="whitegrid", context="talk")
 
@@ -20,46 +30,40 @@ def ensure_dirs():
 def load_data() -> pd.DataFrame:
     if not os.path.exists(RATES_PATH):
         raise FileNotFoundError(f"No existe {RATES_PATH}. Corre primero compute_rates.py")
-    df = pd.read_csv(RATES_PATH, dtype={"anio": "Int64"})
+    df = read_csv(RATES_PATH, "agregado")
     # Mantener filas con información básica completa
     df = df.dropna(subset=["tasa_consumo_100k", "tasa_violencia_100k", "poblacion", "anio", "nombre_localidad"]).copy()
     df["anio"] = df["anio"].astype(int)
     return df
 
 
-def fit_panel_ols(df: pd.DataFrame):
+def fit_panel_ols(df: pd.DataFrame, cov_type: str = "HC3", time_effects: bool = False, unit: str = "nombre_localidad"):
     """Modelo de regresión múltiple a nivel localidad–año.
 
     Dependiente: tasa_violencia_100k
     Predictores: tasa_consumo_100k (exposición principal), año centrado, efecto fijo por localidad.
+
+    Se estima con la transformación within (sin columnas dummy); coeficientes y
+    errores HC3 coinciden con OLS + dummies. Con time_effects=True se absorben
+    también efectos fijos de año (y se omite el año centrado, colineal con ellos).
+    cov_type="cluster" agrupa por `unit`.
     """
     df = df.copy()
     df["anio_c"] = df["anio"] - df["anio"].mean()
 
-    X_base = df[["tasa_consumo_100k", "anio_c"]]
-    dummies = pd.get_dummies(df["nombre_localidad"], drop_first=True)
-    X = pd.concat([X_base, dummies], axis=1)
-    X = sm.add_constant(X)
-    y = df["tasa_violencia_100k"]
-
-    model = sm.OLS(y, X).fit(cov_type="HC3")  # errores robustos heterocedasticidad
+    x = ["tasa_consumo_100k"] if time_effects else ["tasa_consumo_100k", "anio_c"]
+    model = fit_within(
+        df, "tasa_violencia_100k", x, entity=unit,
+        time="anio" if time_effects else None, cov_type=cov_type,
+    )  # errores robustos heterocedasticidad
     return model
 
 
-def aggregate_city(df: pd.DataFrame) -> pd.DataFrame:
-    """Serie de tiempo de Bogotá (tasas agregadas por año)."""
-    city = (
-        df.groupby("anio", dropna=True)
-        .agg(
-            casos_consumo=("casos_consumo", "sum"),
-            casos_violencia=("casos_violencia", "sum"),
-            poblacion=("poblacion", "sum"),
-        )
-        .reset_index()
-    )
-    city["tasa_consumo_100k"] = city["casos_consumo"] / city["poblacion"] * 100000
-    city["tasa_violencia_100k"] = city["casos_violencia"] / city["poblacion"] * 100000
-    return city
+def aggregate_city() -> pd.DataFrame:
+    """Serie de tiempo de Bogotá (totales y tasas por año precomputados en aggregate_niveles)."""
+    city = leer_nivel("bogota").dropna(subset=["tasa_consumo_100k", "tasa_violencia_100k"])
+    city["anio"] = city["anio"].astype(int)
+    return city.sort_values("anio").reset_index(drop=True)
 
 
 def fit_city_ols(city: pd.DataFrame):
@@ -85,17 +89,10 @@ def plot_panel_scatter(df: pd.DataFrame, model):
         alpha=0.7,
         ax=ax,
     )
-    # Recta ajustada manteniendo año centrado en 0 y localidad de referencia
+    # Recta ajustada manteniendo año centrado en 0 y el efecto fijo promedio de las localidades
     cons_vals = np.linspace(df["tasa_consumo_100k"].min(), df["tasa_consumo_100k"].max(), 100)
     anio_c0 = 0.0
-    # construir X con localidad de referencia (todas dummies=0)
     X_line = pd.DataFrame({"tasa_consumo_100k": cons_vals, "anio_c": anio_c0})
-    X_line = sm.add_constant(X_line, has_constant="add")
-    # asegurar mismas columnas que el modelo
-    for col in model.model.exog_names:
-        if col not in X_line.columns and col != "const":
-            X_line[col] = 0.0
-    X_line = X_line[model.model.exog_names]
     y_pred = model.predict(X_line)
     ax.plot(cons_vals, y_pred, color="red", linewidth=2, label="Recta ajustada (año medio)")
 
@@ -104,7 +101,7 @@ def plot_panel_scatter(df: pd.DataFrame, model):
     ax.set_ylabel("Tasa de violencia por 100.000 hab.")
     ax.legend()
 
-    path = os.path.join(FIG_DIR, "reg_panel_scatter_tasas.png")
+    path = FIG_PANEL
     plt.tight_layout()
     plt.savefig(path, dpi=200)
     plt.close()
@@ -117,7 +114,7 @@ def plot_city_series_with_fit(city: pd.DataFrame, model):
     city["anio_c"] = city["anio"] - city["anio"].mean()
 
     # Predicción in-sample
-    X_in = sm.add_constant(city[["tasa_consumo_100k", "anio_c"]])
+    X_in = sm.add_constant(city[["tasa_consumo_100k", "anio_c"]], has_constant="add")
     city["pred"] = model.predict(X_in)
 
     # Escenario de pronóstico: mantener la tasa de consumo igual al nivel de 2024 y extrapolar años 2025–2026
@@ -128,7 +125,7 @@ def plot_city_series_with_fit(city: pd.DataFrame, model):
     future = pd.DataFrame({"anio": future_years})
     future["tasa_consumo_100k"] = tasa_cons_2024
     future["anio_c"] = future["anio"] - city["anio"].mean()
-    X_future = sm.add_constant(future[["tasa_consumo_100k", "anio_c"]])
+    X_future = sm.add_constant(future[["tasa_consumo_100k", "anio_c"]], has_constant="add")
     future["pred"] = model.predict(X_future)
 
     fig, ax = plt.subplots(figsize=(10, 6))
@@ -141,7 +138,7 @@ def plot_city_series_with_fit(city: pd.DataFrame, model):
     ax.set_ylabel("Tasa de violencia por 100.000 hab.")
     ax.legend()
 
-    path = os.path.join(FIG_DIR, "reg_bogota_series_forecast.png")
+    path = FIG_PRONOSTICO
     plt.tight_layout()
     plt.savefig(path, dpi=200)
     plt.close()
@@ -150,6 +147,7 @@ def plot_city_series_with_fit(city: pd.DataFrame, model):
     return future
 
 
+@etapa("make_regression")
 def main():
     ensure_dirs()
     df = load_data()
@@ -158,7 +156,7 @@ def main():
     panel_model = fit_panel_ols(df)
 
     # Modelo de ciudad y pronóstico
-    city = aggregate_city(df)
+    city = aggregate_city()
     city_model = fit_city_ols(city)
     future = plot_city_series_with_fit(city, city_model)
 
@@ -168,9 +166,9 @@ def main():
     # Guardar resumen en markdown
     with open(REPORT, "w", encoding="utf-8") as f:
         f.write("# Modelos de regresión y pronósticos\n\n")
-        f.write("## 1) Modelo de regresión múltiple localidad–año (OLS)\n\n")
+        f.write("## 1) Modelo de regresión múltiple localidad–año (OLS, efectos fijos within)\n\n")
         f.write("Dependiente: tasa_violencia_100k. Predictores: tasa_consumo_100k, año centrado y efectos fijos por localidad.\n\n")
-        f.write(panel_model.summary().as_text())
+        f.write(panel_model.as_text())
         f.write("\n\n")
 
         f.write("## 2) Modelo de regresión para Bogotá por año y pronósticos\n\n")
@@ -1,5 +1,7 @@
 import os
-import pandas as pd
+from schema import read_csv
+from utils_perfil import etapa
+from utils_jerarquia import leer_nivel
 
 MASTER_PATH = os.path.join("data", "working", "localidad_ano_master.csv")
 OUT_DIR_DATA = os.path.join("data", "working")
@@ -18,12 +20,13 @@ def ensure_dirs():
     os.makedirs(OUT_DIR_DOCS, exist_ok=True)
 
 
+@etapa("make_tables")
 def main():
     ensure_dirs()
     if not os.path.exists(MASTER_PATH):
         raise FileNotFoundError(f"No existe {MASTER_PATH}. Corre primero join_master.py")
 
-    df = pd.read_csv(MASTER_PATH, dtype={"anio": "Int64"})
+    df = read_csv(MASTER_PATH, "agregado")
 
     # --- Resumen global 2015–2024 ---
     total_consumo = int(df["casos_consumo"].sum())
@@ -57,11 +60,7 @@ def main():
         f.write("\n")
 
     # --- Resumen por año (Bogotá total) ---
-    anio_sum = (
-        df.groupby("anio")[["casos_consumo", "casos_violencia"]]
-          .sum()
-          .sort_index()
-    )
+    anio_sum = leer_nivel("bogota").set_index("anio")[["casos_consumo", "casos_violencia"]].sort_index()
 
     with open(ANIO_MD, "w", encoding="utf-8") as f:
         f.write("# Totales por año (Bogotá)\n\n")
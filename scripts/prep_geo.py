@@ -0,0 +1,86 @@
+"""Construye los índices espaciales de localidades/UPZ y reporta su cobertura.
+
+Lee los GeoJSON de `data/raw/geo/` (exportados de los shapefiles oficiales),
+construye y guarda el índice de grilla de cada uno (utils_geo) y verifica que
+los nombres de los polígonos correspondan a localidades oficiales o a UPZ del
+catálogo. Las etapas de limpieza cargan el índice guardado.
+"""
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from utils_geo import LOCALIDADES_GEOJSON, UPZ_GEOJSON, UPZ_A_LOCALIDAD, clave_upz, localidad_de_poligono, cargar_indice, index_path
+from utils_perfil import etapa, filas, paso
+
+REPORT = os.path.join("docs", "prep_geo_report.md")
+# Puntos de prueba para medir el rendimiento de la asignación
+N_PRUEBA = 1_000_000
+SEED = 20240101
+
+
+def ensure_dirs():
+    os.makedirs(os.path.dirname(REPORT), exist_ok=True)
+
+
+def medir_asignacion(idx, n: int = N_PRUEBA, seed: int = SEED) -> dict:
+    """Asigna `n` puntos uniformes en la extensión del índice y mide el tiempo."""
+    rng = np.random.default_rng(seed)
+    x0, y0 = idx.bbox[:, 0].min(), idx.bbox[:, 1].min()
+    x1, y1 = idx.bbox[:, 2].max(), idx.bbox[:, 3].max()
+    x, y = rng.uniform(x0, x1, n), rng.uniform(y0, y1, n)
+    t0 = time.perf_counter()
+    ids = idx.asignar(x, y)
+    sec = time.perf_counter() - t0
+    return {"puntos": n, "segundos": round(sec, 3), "puntos_por_s": int(n / sec) if sec > 0 else None,
+            "asignados": int((ids >= 0).sum())}
+
+
+@etapa("prep_geo")
+def main():
+    ensure_dirs()
+    capas = [("Localidades", LOCALIDADES_GEOJSON), ("UPZ", UPZ_GEOJSON)]
+    if not any(os.path.exists(p) for _, p in capas):
+        raise FileNotFoundError(f"No existen {LOCALIDADES_GEOJSON} ni {UPZ_GEOJSON}")
+
+    with open(REPORT, "w", encoding="utf-8") as f:
+        f.write("# Índices espaciales de localidades y UPZ\n\n")
+        for titulo, path in capas:
+            f.write(f"## {titulo}: {path}\n\n")
+            with paso(f"indice_{titulo.lower()}"):
+                idx = cargar_indice(path)
+            if idx is None:
+                f.write("No disponible.\n\n")
+                continue
+            filas(entrada=len(idx.nombres))
+            f.write(f"Índice: {index_path(path)}\n\n")
+            for k, v in idx.resumen().items():
+                f.write(f"- {k}: {v}\n")
+            f.write("\n")
+
+            nombres = pd.DataFrame({"poligono": idx.nombres})
+            nombres["localidad"] = [localidad_de_poligono(n) for n in idx.nombres]
+            sin_mapa = nombres[nombres["localidad"].isna()]
+            if not sin_mapa.empty:
+                f.write("Polígonos cuyo nombre no corresponde a una localidad oficial ni a una UPZ del catálogo:\n\n")
+                f.write(sin_mapa.to_markdown(index=False))
+                f.write("\n\n")
+            if titulo == "UPZ":
+                en_capa = {clave_upz(n) for n in idx.nombres}
+                faltan = sorted(k for k in UPZ_A_LOCALIDAD if k not in en_capa)
+                if faltan:
+                    f.write(f"UPZ del catálogo sin polígono ({len(faltan)}): {', '.join(faltan)}\n\n")
+
+            with paso(f"asignacion_{titulo.lower()}"):
+                prueba = medir_asignacion(idx)
+            f.write("Asignación de puntos uniformes en la extensión de la capa:\n\n")
+            for k, v in prueba.items():
+                f.write(f"- {k}: {v}\n")
+            f.write("\n")
+
+    print(f"Reporte: {REPORT}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,51 @@
 import os
+from typing import Optional, Tuple
+
 import pandas as pd
-import numpy as np
 
-from utils_localidad import normalize_localidad
+from utils_localidad import resoluciones_aproximadas, unmapped_localidades
+from utils_excel_cache import read_sheet, sheet_names
+from utils_perfil import etapa, filas, paso
+from utils_poblacion import SEXOS, TENSOR_PATH, TOTAL, TensorPoblacion, etiqueta_edad, normalizar_sexo
+from utils_text import strip_accents
 
 RAW_POB = os.path.join("data", "raw", "poblacion.xlsx")
 OUT_CSV = os.path.join("data", "working", "poblacion_localidad_anio.csv")
 REPORT = os.path.join("docs", "prep_poblacion_report.md")
 
+# Rango de estudio; los años sin dato se interpolan o extrapolan (utils_poblacion)
+TARGET_YEARS = list(range(2015, 2025))
+METODO = "geometrico"
+
 
 def ensure_dirs():
     os.makedirs(os.path.dirname(OUT_CSV), exist_ok=True)
     os.makedirs(os.path.dirname(REPORT), exist_ok=True)
 
 
-def _standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
-    # Intentar mapear columnas típicas observadas: COD_LOC, NOM_LOC, AREA, AÑO, Total Hombre, Total Mujeres, TOTAL
+def _estrato_columna(col: str) -> Optional[Tuple[str, str]]:
+    """(sexo, grupo de edad) que cuenta una columna del libro, o None si no es de población.
+
+    'Total Hombres' -> ('hombres', 'total'), 'Mujeres 15-19' -> ('mujeres', '15-19'),
+    'TOTAL' -> ('total', 'total'), '80 y más' -> ('total', '80+').
+    """
+    k = strip_accents(str(col)).lower().strip()
+    sexo = normalizar_sexo(k)
+    edad = etiqueta_edad(k)
+    if sexo is None and edad is None and not any(key in k for key in ["total", "poblacion"]):
+        return None
+    return (sexo if sexo in SEXOS else TOTAL, edad or TOTAL)
+
+
+def _standardize_columns(df: pd.DataFrame) -> Tuple[pd.DataFrame, Optional[pd.Series]]:
+    """Tabla larga nombre_localidad, anio, sexo, grupo_edad, poblacion al estrato más fino del libro.
+
+    Columnas típicas observadas: COD_LOC, NOM_LOC, AREA, AÑO, Total Hombres,
+    Total Mujeres, TOTAL (y, si las trae, columnas por grupo de edad). Se usan
+    las columnas del estrato más fino disponible (sexo × edad, sexo, edad o
+    total); la columna de total, si existe, queda como control y se devuelve
+    por fila junto con la tabla.
+    """
     cols = {c.lower().strip(): c for c in df.columns}
     # Buscar candidatos por inclusión de palabras clave
     def find(col_keys):
@@ -26,25 +56,53 @@ def _standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
 
     col_nom = find(["nom_loc", "localidad", "nomloc", "nombre"])
     col_anio = find(["año", "ano", "anio", "year"])
-    col_total = find(["total", "poblacion", "población"])
+    col_area = find(["area", "área"])
+    estratos = {}
+    for c in df.columns:
+        if c in (col_nom, col_anio, col_area) or not pd.api.types.is_numeric_dtype(df[c]):
+            continue
+        e = _estrato_columna(c)
+        if e is not None:
+            estratos[c] = e
 
-    if col_nom is None or col_anio is None or col_total is None:
+    if col_nom is None or col_anio is None or not estratos:
         raise ValueError(
             f"No se pudieron identificar columnas clave en poblacion.xlsx. Encontradas: {list(df.columns)}"
         )
 
-    out = df[[col_nom, col_anio, col_total]].copy()
-    out.columns = ["nombre_localidad", "anio", "poblacion"]
-    return out
+    # AREA (Total/Urbana/Rural): si hay filas "Total", solo esas, para no contar dos veces
+    if col_area is not None:
+        es_total = df[col_area].astype(str).str.strip().str.lower().eq("total")
+        if es_total.any():
+            df = df[es_total]
+
+    # Estrato más fino: cuántos ejes (sexo, edad) vienen desagregados en cada columna
+    finura = {c: (sexo != TOTAL) + (edad != TOTAL) for c, (sexo, edad) in estratos.items()}
+    nivel = max(finura.values())
+    usadas = [c for c in estratos if finura[c] == nivel]
+    if nivel == 1:
+        # Solo sexo o solo edad: preferir el eje con más categorías
+        por_sexo = [c for c in usadas if estratos[c][0] != TOTAL]
+        por_edad = [c for c in usadas if estratos[c][1] != TOTAL]
+        usadas = por_edad if len({estratos[c][1] for c in por_edad}) > len(por_sexo) else por_sexo
+    control = None
+    totales = [c for c in estratos if finura[c] == 0]
+    if nivel > 0 and totales:
+        control = pd.to_numeric(df[totales[0]], errors="coerce") - df[usadas].apply(pd.to_numeric, errors="coerce").sum(axis=1)
+
+    out = df[[col_nom, col_anio] + usadas].melt(id_vars=[col_nom, col_anio], var_name="columna", value_name="poblacion")
+    out["sexo"] = out["columna"].map(lambda c: estratos[c][0])
+    out["grupo_edad"] = out["columna"].map(lambda c: estratos[c][1])
+    out = out.rename(columns={col_nom: "nombre_localidad", col_anio: "anio"})
+    return out[["nombre_localidad", "anio", "sexo", "grupo_edad", "poblacion"]], control
 
 
 def load_poblacion() -> pd.DataFrame:
     # Leer todas las hojas si existen y concatenar
-    xls = pd.ExcelFile(RAW_POB, engine="openpyxl")
     frames = []
-    for sh in xls.sheet_names:
+    for sh in sheet_names(RAW_POB):
         try:
-            df = pd.read_excel(xls, sheet_name=sh)
+            df = read_sheet(RAW_POB, sheet_name=sh)
         except Exception:
             continue
         frames.append(df)
@@ -54,43 +112,7 @@ def load_poblacion() -> pd.DataFrame:
     return df
 
 
-def expand_years(pob: pd.DataFrame) -> pd.DataFrame:
-    # Normalizar localidad y tipos
-    pob["nombre_localidad"] = pob["nombre_localidad"].apply(normalize_localidad)
-    pob = pob.dropna(subset=["nombre_localidad"]).copy()
-
-    pob["anio"] = pd.to_numeric(pob["anio"], errors="coerce").astype("Int64")
-    pob["poblacion"] = pd.to_numeric(pob["poblacion"], errors="coerce")
-
-    # Mantener solo años válidos y colapsar por suma si vienen duplicados
-    pob = (
-        pob.dropna(subset=["anio"]) \
-           .groupby(["nombre_localidad", "anio"], as_index=False)["poblacion"].sum()
-    )
-
-    # Rango objetivo 2015–2024. Para años < 2018 asumir población de 2018.
-    target_years = list(range(2015, 2025))
-
-    # Obtener valor 2018 por localidad
-    base2018 = pob[pob["anio"] == 2018][["nombre_localidad", "poblacion"]].rename(columns={"poblacion": "pob2018"})
-
-    # Expandir grilla completa
-    localidades = sorted(pob["nombre_localidad"].unique().tolist())
-    grid = pd.MultiIndex.from_product([localidades, target_years], names=["nombre_localidad", "anio"]).to_frame(index=False)
-
-    merged = grid.merge(pob, on=["nombre_localidad", "anio"], how="left")
-    merged = merged.merge(base2018, on="nombre_localidad", how="left")
-
-    # Relleno: si año < 2018 y falta población, usar pob2018. Sino dejar NA si tampoco hay base.
-    cond_fill = (merged["anio"] < 2018) & merged["poblacion"].isna()
-    merged.loc[cond_fill, "poblacion"] = merged.loc[cond_fill, "pob2018"]
-
-    merged = merged.drop(columns=["pob2018"]) \
-                   .sort_values(["nombre_localidad", "anio"]) \
-                   .reset_index(drop=True)
-    return merged
-
-
+@etapa("prep_poblacion")
 def main():
     ensure_dirs()
 
@@ -98,22 +120,47 @@ def main():
         raise FileNotFoundError(f"No existe {RAW_POB}")
 
     raw = load_poblacion()
-    std = _standardize_columns(raw)
-    expanded = expand_years(std)
+    std, control = _standardize_columns(raw)
+    unmapped = unmapped_localidades(std["nombre_localidad"])
+    aproximadas = resoluciones_aproximadas(std["nombre_localidad"])
+    with paso("tensor"):
+        tensor = TensorPoblacion.construir(std, TARGET_YEARS, METODO)
+        tensor.guardar(TENSOR_PATH)
+    expanded = tensor.to_frame(["localidad", "anio"], anios=TARGET_YEARS)
+    expanded["poblacion"] = expanded["poblacion"].round().astype("Int64")
 
     expanded.to_csv(OUT_CSV, index=False, encoding="utf-8")
+    filas(entrada=len(raw), salida=len(expanded))
 
     # Reporte
+    origen = tensor.origen_por_anio()
     with open(REPORT, "w", encoding="utf-8") as f:
         f.write("# Preparación de población por localidad–año\n\n")
         f.write(f"Filas originales: {len(raw)}\n\n")
-        f.write(f"Filas estandarizadas: {len(std)}\n\n")
-        f.write(f"Filas en grilla 2015–2024: {len(expanded)}\n\n")
-        f.write("## Ejemplo (primeras 20 filas)\n\n")
+        f.write(f"Filas estandarizadas (formato largo por estrato): {len(std)}\n\n")
+        f.write(f"Filas en grilla {TARGET_YEARS[0]}–{TARGET_YEARS[-1]}: {len(expanded)}\n\n")
+        f.write(f"## Tensor localidad × año × sexo × edad: {TENSOR_PATH}\n\n")
+        for k, v in tensor.resumen().items():
+            f.write(f"- {k}: {v}\n")
+        if control is not None:
+            f.write(f"- diferencia máxima entre la columna total y la suma de estratos: {float(control.abs().max()):g}\n")
+        f.write("\nCeldas por año según origen (interpolación lineal entre años observados; ")
+        f.write(f"extrapolación {METODO} fuera del rango observado):\n\n")
+        f.write(origen.to_markdown())
+        f.write("\n\n## Ejemplo (primeras 20 filas)\n\n")
         f.write(expanded.head(20).to_markdown(index=False))
         f.write("\n")
+        if not unmapped.empty:
+            f.write("\n## Localidades no mapeadas (grafía cruda → filas)\n\n")
+            f.write(unmapped.to_markdown())
+            f.write("\n")
+        if not aproximadas.empty:
+            f.write("\n## Localidades resueltas por coincidencia aproximada (grafía cruda → candidato del catálogo)\n\n")
+            f.write(aproximadas.to_markdown(index=False))
+            f.write("\n")
 
     print(f"Población preparada: {OUT_CSV}")
+    print(f"Tensor de población: {TENSOR_PATH}")
     print(f"Reporte: {REPORT}")
 
 
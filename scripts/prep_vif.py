@@ -1,11 +1,18 @@
+import argparse
 import os
 import re
 import unicodedata
-from typing import List
+from typing import Iterator, List, Optional
 
 import numpy as np
 import pandas as pd
 
+from schema import apply_schema
+from utils_encoding import Codificacion, abrir_utf8, detectar_encoding
+from utils_reglas import FLAG_COL, evaluar
+from utils_text import normalize_na_tokens
+from utils_perfil import etapa, filas, paso
+
 
 RAW_PATH = os.path.join("data", "raw", "vintrafamiliar.csv")
 WORKING_DIR = os.path.join("data", "working")
@@ -13,6 +20,9 @@ UTF8_EXPORT = os.path.join(WORKING_DIR, "vintrafamiliar_utf8.csv")
 CLEAN_EXPORT = os.path.join(WORKING_DIR, "vintrafamiliar_clean.csv")
 REPORT_PATH = os.path.join("docs", "prep_vif_report.md")
 
+# Filas por bloque en modo streaming (None = carga completa en memoria)
+CHUNK_SIZE: Optional[int] = None
+
 
 def ensure_dirs(paths: List[str]):
     for p in paths:
@@ -63,21 +73,8 @@ def standardize_columns(df: pd.DataFrame) -> pd.DataFrame:
 
 def normalize_tokens(df: pd.DataFrame) -> pd.DataFrame:
     """Unifica tokens de no respuesta y tipifica algunas columnas clave."""
-    # Detectar variantes de "Sin dato" y espacios
-    def is_sin_dato(x):
-        if pd.isna(x):
-            return True
-        if not isinstance(x, str):
-            return False
-        s = x.strip().lower()
-        return s in {"sin dato", "sindato", "sin  dato", "sin_dato"}
-
-    cat_cols = df.select_dtypes(include=["object"]).columns.tolist()
-
-    for col in cat_cols:
-        mask = df[col].apply(is_sin_dato)
-        if mask.any():
-            df.loc[mask, col] = np.nan
+    # Detectar variantes de "Sin dato" y espacios (motor compartido, por valor distinto)
+    df = normalize_na_tokens(df)
 
     # Variables binarias conocidas: 0/1 (no recodificar 0 a NA)
     for col in [
@@ -109,46 +106,138 @@ def normalize_tokens(df: pd.DataFrame) -> pd.DataFrame:
     return df
 
 
-def main():
-    ensure_dirs([WORKING_DIR, os.path.dirname(REPORT_PATH)])
-
-    print(f"Leyendo: {RAW_PATH} (latin1, sep=';')")
-    df = pd.read_csv(RAW_PATH, encoding="latin1", sep=";", dtype=str, low_memory=False)
-
-    # Exportar copia UTF-8 sin transformar (solo re-encoding)
-    print(f"Exportando UTF-8: {UTF8_EXPORT}")
-    df.to_csv(UTF8_EXPORT, index=False, encoding="utf-8")
-
+def clean_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Aplica las reglas de limpieza a un DataFrame (completo o bloque)."""
     # Estandarizar columnas
-    df = standardize_columns(df)
+    with paso("standardize_columns"):
+        df = standardize_columns(df)
 
     # Tipificar y normalizar tokens
-    df = normalize_tokens(df)
+    with paso("normalize_tokens"):
+        df = normalize_tokens(df)
 
     # Tipos deseados adicionales
     for col in ["anio"]:
         if col in df.columns:
             df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int64")
 
-    # Guardar versión limpia
-    print(f"Exportando versión limpia: {CLEAN_EXPORT}")
-    df.to_csv(CLEAN_EXPORT, index=False, encoding="utf-8")
+    # Tipos compactos del diccionario de datos (Int8/Int16, categóricas)
+    with paso("apply_schema"):
+        df = apply_schema(df, "vif")
 
-    # Reporte breve
-    n_rows, n_cols = df.shape
+    # Reglas de coherencia (paso 7): bit i de flag_inconsistencia = regla i
+    with paso("reglas_coherencia"):
+        df[FLAG_COL] = evaluar(df)
+    return df
+
+
+def _collect_samples(samples: dict, df: pd.DataFrame, n: int = 5):
+    """Acumula hasta n valores no nulos por columna (para el reporte)."""
+    for c in df.columns[: min(10, df.shape[1])]:
+        have = samples.setdefault(c, [])
+        if len(have) < n:
+            have.extend(df[c].dropna().astype(str).head(n - len(have)).tolist())
+
+
+def write_report(n_rows: int, columns: List[str], samples: dict, codificacion: Codificacion):
+    n_cols = len(columns)
     with open(REPORT_PATH, "w", encoding="utf-8") as f:
         f.write("# Reporte preparación VIF\n\n")
         f.write(f"Filas: {n_rows}, Columnas: {n_cols}\n\n")
+        f.write("## Codificación del crudo\n\n")
+        f.write(f"- Elegida: {codificacion.encoding}{' (con BOM)' if codificacion.bom else ''}\n")
+        f.write(f"- Bytes leídos: {codificacion.bytes_leidos}; no ASCII: {codificacion.no_ascii}\n")
+        f.write(f"- Bytes ambiguos (no ASCII que no decodifican a una letra esperada): {codificacion.ambiguos}\n")
+        if codificacion.puntajes:
+            f.write(f"- Puntaje por página de códigos (bytes plausibles): {codificacion.puntajes}\n")
+        f.write("\n")
         f.write("## Columnas\n\n")
-        for c in df.columns:
+        for c in columns:
             f.write(f"- {c}\n")
         f.write("\n## Muestras de valores\n\n")
-        for c in df.columns[: min(10, n_cols)]:
-            vals = df[c].dropna().astype(str).head(5).tolist()
-            f.write(f"- {c}: {vals}\n")
+        for c in columns[: min(10, n_cols)]:
+            f.write(f"- {c}: {samples.get(c, [])}\n")
+
+
+def iter_clean(codificacion: Codificacion, chunksize: Optional[int] = None, write_records: bool = True) -> Iterator[pd.DataFrame]:
+    """Genera el raw limpio por bloques de `chunksize` filas (None = un solo bloque).
+
+    Cada bloque pasa por las mismas reglas de `clean_frame`. Con `write_records`
+    anexa el bloque crudo a UTF8_EXPORT y el limpio a CLEAN_EXPORT; las salidas
+    son idénticas byte a byte con o sin bloques, con memoria acotada por bloque.
+    """
+    with abrir_utf8(RAW_PATH, codificacion) as fh:
+        if chunksize:
+            print(f"Modo streaming: bloques de {chunksize} filas")
+            blocks = pd.read_csv(fh, sep=";", dtype=str, chunksize=chunksize)
+        else:
+            with paso("leer_crudo"):
+                blocks = [pd.read_csv(fh, sep=";", dtype=str, low_memory=False)]
+        blocks = iter(blocks)
+        first = True
+        while True:
+            # Los pasos se cierran antes de `yield` para no medir el trabajo del consumidor
+            with paso("leer_crudo"):
+                raw = next(blocks, None)
+            if raw is None:
+                break
+            mode = "w" if first else "a"
+            if write_records:
+                # Copia UTF-8 sin transformar (solo re-encoding)
+                with paso("escribir_registros"):
+                    raw.to_csv(UTF8_EXPORT, index=False, encoding="utf-8", mode=mode, header=first)
+            clean = clean_frame(raw)
+            if write_records:
+                with paso("escribir_registros"):
+                    clean.to_csv(CLEAN_EXPORT, index=False, encoding="utf-8", mode=mode, header=first)
+            first = False
+            yield clean
+    if write_records:
+        print(f"Exportado UTF-8: {UTF8_EXPORT}")
+        print(f"Exportada versión limpia: {CLEAN_EXPORT}")
+
+
+class Resumen:
+    """Acumula filas, columnas y muestras de los bloques limpios para el reporte."""
+
+    def __init__(self):
+        self.n_rows = 0
+        self.columns: List[str] = []
+        self.samples: dict = {}
+
+    def add(self, clean: pd.DataFrame):
+        if not self.columns:
+            self.columns = clean.columns.tolist()
+        self.n_rows += len(clean)
+        _collect_samples(self.samples, clean)
+
+
+@etapa("prep_vif")
+def main(chunksize: Optional[int] = CHUNK_SIZE):
+    ensure_dirs([WORKING_DIR, os.path.dirname(REPORT_PATH)])
+
+    # Codificación real del crudo (una vez por archivo); la lectura transcodifica a UTF-8
+    with paso("detectar_encoding"):
+        codificacion = detectar_encoding(RAW_PATH)
+    print(f"Leyendo: {RAW_PATH} ({codificacion.encoding}, sep=';')")
+    resumen = Resumen()
+    for clean in iter_clean(codificacion, chunksize):
+        resumen.add(clean)
+    # clean_frame no descarta filas
+    filas(entrada=resumen.n_rows, salida=resumen.n_rows)
+    print(f"Codificación: {codificacion.resumen()}")
+
+    # Reporte breve
+    write_report(resumen.n_rows, resumen.columns, resumen.samples, codificacion)
 
     print("Listo. Ver archivos en data/working/ y reporte en docs/prep_vif_report.md")
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="Preparación de vintrafamiliar.csv")
+    parser.add_argument(
+        "--chunksize", type=int, default=CHUNK_SIZE,
+        help="Filas por bloque para lectura streaming (por defecto: carga completa)",
+    )
+    args = parser.parse_args()
+    main(chunksize=args.chunksize)
@@ -0,0 +1,84 @@
+import argparse
+import os
+from typing import Optional
+
+import pandas as pd
+
+from schema import read_dtypes
+from utils_localidad import normalize_localidad_series
+from utils_reglas import FLAG_COL, REGLAS, desempaquetar
+from utils_perfil import etapa
+
+VIF_CLEAN = os.path.join("data", "working", "vintrafamiliar_clean.csv")
+PSICO_CLEAN = os.path.join("data", "working", "psicoactivas_clean.csv")
+OUT_CSV = os.path.join("data", "working", "inconsistencias_localidad_anio.csv")
+REPORT_PATH = os.path.join("docs", "qa_coherencia_report.md")
+
+CHUNK_SIZE = 200000
+
+
+def ensure_dirs():
+    os.makedirs(os.path.dirname(OUT_CSV), exist_ok=True)
+    os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
+
+
+def conteos_por_localidad_anio(path: str, schema: str, fuente: str, chunksize: int) -> Optional[pd.DataFrame]:
+    """Decodifica por bloques el `flag_inconsistencia` escrito en la limpieza y acumula conteos por regla y localidad–año."""
+    if not os.path.exists(path):
+        print(f"Advertencia: no existe {path}; se omite {fuente}")
+        return None
+    header = pd.read_csv(path, nrows=0).columns
+    if FLAG_COL not in header:
+        print(f"Advertencia: {path} no tiene {FLAG_COL}; vuelve a correr la limpieza de {fuente}")
+        return None
+    usecols = ["nombre_localidad", "anio", FLAG_COL]
+    dtypes = {c: t for c, t in read_dtypes(schema).items() if c in usecols}
+
+    partes = []
+    for chunk in pd.read_csv(path, usecols=usecols, dtype=dtypes, chunksize=chunksize):
+        bits = desempaquetar(chunk[FLAG_COL].fillna(0).to_numpy())
+        bits["registros"] = True
+        bits["con_inconsistencia"] = bits.drop(columns="registros").any(axis=1)
+        bits["nombre_localidad"] = normalize_localidad_series(chunk["nombre_localidad"]).astype(object).to_numpy()
+        bits["anio"] = chunk["anio"].to_numpy()
+        partes.append(bits.groupby(["nombre_localidad", "anio"], dropna=False).sum())
+
+    out = pd.concat(partes).groupby(level=[0, 1], dropna=False).sum().reset_index()
+    out.insert(0, "fuente", fuente)
+    return out
+
+
+@etapa("qa_coherencia")
+def main(chunksize: int = CHUNK_SIZE):
+    ensure_dirs()
+    frames = [
+        conteos_por_localidad_anio(VIF_CLEAN, "vif", "vif", chunksize),
+        conteos_por_localidad_anio(PSICO_CLEAN, "psicoactivas", "psicoactivas", chunksize),
+    ]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        raise FileNotFoundError(f"No existen {VIF_CLEAN} ni {PSICO_CLEAN}. Corre prep_vif.py / clean_psicoactivas.py")
+    res = pd.concat(frames, ignore_index=True)
+    res.to_csv(OUT_CSV, index=False, encoding="utf-8")
+
+    reglas = [r.nombre for r in REGLAS]
+    totales = res.groupby("fuente")[["registros", "con_inconsistencia"] + reglas].sum()
+
+    with open(REPORT_PATH, "w", encoding="utf-8") as f:
+        f.write("# QA coherencia lógica (flag_inconsistencia)\n\n")
+        f.write("Cada regla ocupa un bit de `flag_inconsistencia`, tal como lo escribieron prep_vif.py y clean_psicoactivas.py en los archivos limpios (bit i = regla i):\n\n")
+        for i, r in enumerate(REGLAS):
+            f.write(f"- bit {i} `{r.nombre}`: {r.descripcion}\n")
+        f.write("\n## Totales por fuente\n\n")
+        f.write(totales.T.to_markdown())
+        f.write(f"\n\nDetalle por localidad–año: {OUT_CSV}\n")
+
+    print(f"Conteos de inconsistencias: {OUT_CSV}")
+    print(f"Reporte: {REPORT_PATH}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conteos de flag_inconsistencia sobre registros limpios")
+    parser.add_argument("--chunksize", type=int, default=CHUNK_SIZE, help="Filas por bloque")
+    args = parser.parse_args()
+    main(chunksize=args.chunksize)
@@ -1,5 +1,6 @@
 import os
-import pandas as pd
+from schema import read_csv
+from utils_perfil import etapa
 
 MASTER_PATH = os.path.join("data", "working", "localidad_ano_master.csv")
 REPORT_PATH = os.path.join("docs", "qa_master_report.md")
@@ -9,12 +10,13 @@ def ensure_dirs():
     os.makedirs(os.path.dirname(REPORT_PATH), exist_ok=True)
 
 
+@etapa("qa_master")
 def main():
     ensure_dirs()
     if not os.path.exists(MASTER_PATH):
         raise FileNotFoundError(f"No existe {MASTER_PATH}. Corre primero join_master.py")
 
-    df = pd.read_csv(MASTER_PATH, dtype={"anio": "Int64"})
+    df = read_csv(MASTER_PATH, "agregado")
 
     # Resumen general
     n_rows, n_cols = df.shape
@@ -0,0 +1,180 @@
+import argparse
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from utils_localidad import normalize_localidad_series
+from utils_perfil import etapa
+
+CLEAN_INPUT = os.path.join("data", "working", "vintrafamiliar_clean.csv")
+INDEX_PATH = os.path.join("data", "cache", "vif_bitmap_index.npz")
+
+# Dimensiones indexadas (las que existan en el limpio)
+DIMENSIONES = [
+    "nombre_localidad", "anio", "sexo", "grupo_edad", "estrato", "tipo_aseguramiento",
+    "agresor_consumo_spa", "victima_consumo_spa", "ciclo_vital", "gestante",
+    "relacion_agresor", "nivel_educativo",
+    "lugar_ocurrencia_emocional", "lugar_ocurrencia_fisica", "lugar_ocurrencia_sexual",
+    "lugar_ocurrencia_economica", "lugar_ocurrencia_negligencia", "lugar_ocurrencia_abandono",
+]
+NA_LABEL = "<NA>"
+
+# Número de bits en 1 por byte (popcount de bitmaps empaquetados)
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+FilterValue = Union[str, int, Sequence[Union[str, int]]]
+
+
+class VifIndex:
+    """Registros VIF codificados por diccionario, con un bitmap empaquetado por valor.
+
+    Los filtros se resuelven con OR (valores de una misma dimensión) y AND
+    (entre dimensiones) sobre bitmaps; la agregación final es un bincount sobre
+    los códigos de las dimensiones de agrupación.
+    """
+
+    def __init__(self, n_rows: int, codes: Dict[str, np.ndarray], levels: Dict[str, List[str]]):
+        self.n_rows = n_rows
+        self.codes = codes
+        self.levels = levels
+        self._bitmaps: Dict[str, np.ndarray] = {}
+
+    # ---- construcción ----
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame, dims: Optional[Iterable[str]] = None) -> "VifIndex":
+        dims = [d for d in (dims or DIMENSIONES) if d in df.columns]
+        codes, levels = {}, {}
+        for d in dims:
+            s = df[d]
+            if d == "nombre_localidad":
+                s = normalize_localidad_series(s)
+            c, u = pd.factorize(s.astype("string").fillna(NA_LABEL), sort=True)
+            codes[d] = c.astype(np.int32)
+            levels[d] = [str(v) for v in u]
+        return cls(len(df), codes, levels)
+
+    @classmethod
+    def from_csv(cls, path: str = CLEAN_INPUT, dims: Optional[Iterable[str]] = None) -> "VifIndex":
+        dims = list(dims or DIMENSIONES)
+        header = pd.read_csv(path, nrows=0).columns
+        df = pd.read_csv(path, usecols=[d for d in dims if d in header], dtype=str)
+        return cls.from_frame(df, dims)
+
+    def save(self, path: str = INDEX_PATH):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        arrays = {f"codes__{d}": c for d, c in self.codes.items()}
+        arrays.update({f"levels__{d}": np.array(v, dtype=object) for d, v in self.levels.items()})
+        np.savez(path, n_rows=self.n_rows, **arrays)
+
+    @classmethod
+    def load(cls, path: str = INDEX_PATH) -> "VifIndex":
+        z = np.load(path, allow_pickle=True)
+        codes = {k[len("codes__"):]: z[k] for k in z.files if k.startswith("codes__")}
+        levels = {k[len("levels__"):]: list(z[k]) for k in z.files if k.startswith("levels__")}
+        return cls(int(z["n_rows"]), codes, levels)
+
+    # ---- bitmaps ----
+
+    def bitmap(self, dim: str, value: str) -> np.ndarray:
+        """Bitmap empaquetado (uint8, n_rows/8 bytes) de las filas con dim == value."""
+        key = f"{dim}\x00{value}"
+        bm = self._bitmaps.get(key)
+        if bm is None:
+            try:
+                code = self.levels[dim].index(value)
+            except ValueError:
+                bm = np.zeros((self.n_rows + 7) // 8, dtype=np.uint8)
+            else:
+                bm = np.packbits(self.codes[dim] == code)
+            self._bitmaps[key] = bm
+        return bm
+
+    def build_all_bitmaps(self):
+        """Materializa todos los bitmaps (útil antes de una sesión de consultas)."""
+        for d, lv in self.levels.items():
+            for v in lv:
+                self.bitmap(d, v)
+
+    def mask(self, filters: Optional[Dict[str, FilterValue]] = None) -> np.ndarray:
+        acc = np.full((self.n_rows + 7) // 8, 0xFF, dtype=np.uint8)
+        for dim, vals in (filters or {}).items():
+            if dim not in self.codes:
+                raise KeyError(f"Dimensión no indexada: {dim}")
+            if isinstance(vals, (str, int)):
+                vals = [vals]
+            union = np.zeros_like(acc)
+            for v in vals:
+                np.bitwise_or(union, self.bitmap(dim, str(v)), out=union)
+            np.bitwise_and(acc, union, out=acc)
+        return acc
+
+    # ---- consultas ----
+
+    def count(self, filters: Optional[Dict[str, FilterValue]] = None, by: Optional[List[str]] = None) -> Union[int, pd.DataFrame]:
+        """Conteo de registros que cumplen `filters`; con `by`, tabla de conteos por grupo."""
+        bm = self.mask(filters)
+        if not by:
+            total = int(_POPCOUNT[bm].sum(dtype=np.int64))
+            # Bits de relleno del último byte
+            pad = bm.size * 8 - self.n_rows
+            if pad:
+                total -= bin(int(bm[-1]) & ((1 << pad) - 1)).count("1")
+            return total
+
+        sel = np.unpackbits(bm, count=self.n_rows).astype(bool)
+        sizes = [len(self.levels[d]) for d in by]
+        flat = np.ravel_multi_index([self.codes[d][sel] for d in by], sizes)
+        counts = np.bincount(flat, minlength=int(np.prod(sizes)))
+        nz = np.flatnonzero(counts)
+        idx = np.unravel_index(nz, sizes)
+        out = pd.DataFrame({d: np.asarray(self.levels[d], dtype=object)[i] for d, i in zip(by, idx)})
+        out["casos"] = counts[nz]
+        return out
+
+
+def load_index(path: str = CLEAN_INPUT, index_path: Optional[str] = INDEX_PATH) -> VifIndex:
+    """Carga el índice persistido si es más reciente que el limpio; si no, lo reconstruye."""
+    if index_path and os.path.exists(index_path) and os.path.getmtime(index_path) >= os.path.getmtime(path):
+        return VifIndex.load(index_path)
+    idx = VifIndex.from_csv(path)
+    if index_path:
+        idx.save(index_path)
+    return idx
+
+
+def _parse_where(items: List[str]) -> Dict[str, List[str]]:
+    filters = {}
+    for it in items or []:
+        dim, _, vals = it.partition("=")
+        filters[dim.strip()] = [v.strip() for v in vals.split(",")]
+    return filters
+
+
+@etapa("query_vif")
+def main():
+    parser = argparse.ArgumentParser(description="Conteos filtrados sobre registros VIF limpios (índices bitmap)")
+    parser.add_argument("--where", nargs="*", default=[], metavar="DIM=V1,V2", help="Filtros, p. ej. sexo=Mujeres estrato=1,2")
+    parser.add_argument("--by", nargs="*", default=["nombre_localidad", "anio"], help="Dimensiones de agrupación")
+    parser.add_argument("--out", default=None, help="CSV de salida (opcional)")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    idx = load_index()
+    t1 = time.perf_counter()
+    res = idx.count(_parse_where(args.where), by=args.by or None)
+    t2 = time.perf_counter()
+    print(f"Índice: {idx.n_rows} registros, {len(idx.codes)} dimensiones ({t1 - t0:.2f}s); consulta {1000 * (t2 - t1):.1f} ms")
+    if isinstance(res, pd.DataFrame):
+        print(res.to_string(index=False))
+        if args.out:
+            res.to_csv(args.out, index=False, encoding="utf-8")
+    else:
+        print(f"Registros: {res}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+import argparse
+import hashlib
+import importlib
+import json
+import os
+import re
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import utils_perfil
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+STATE_PATH = os.path.join("data", "cache", "pipeline_state.json")
+
+
+@dataclass
+class Stage:
+    """Etapa del pipeline: módulo en scripts/ y nombres de sus constantes de rutas (o listas de rutas).
+
+    Una constante de otro módulo se nombra como "modulo.CONSTANTE" (p. ej. la
+    tabla de niveles, que las etapas leen con `leer_nivel`).
+
+    `optional` son insumos que la etapa usa si existen: cuentan para la huella
+    pero su ausencia no impide correrla.
+    """
+    name: str
+    inputs: List[str] = field(default_factory=list)
+    outputs: List[str] = field(default_factory=list)
+    kwargs: Dict[str, object] = field(default_factory=dict)
+    optional: List[str] = field(default_factory=list)
+
+    def paths(self, attrs: List[str]) -> List[str]:
+        out = []
+        for a in attrs:
+            modulo, _, nombre = a.rpartition(".")
+            v = getattr(importlib.import_module(modulo or self.name), nombre)
+            out.extend(v if isinstance(v, (list, tuple)) else [v])
+        return out
+
+
+# Orden topológico: cada etapa solo depende de etapas anteriores
+STAGES = [
+    Stage("prep_vif", ["RAW_PATH"], ["UTF8_EXPORT", "CLEAN_EXPORT", "REPORT_PATH"]),
+    Stage("aggregate_vif", ["CLEAN_INPUT"], ["AGG_EXPORT", "REPORT_PATH"]),
+    Stage("prep_geo", ["LOCALIDADES_GEOJSON"], ["REPORT"]),
+    Stage("inspect_psicoactivas", ["RAW_XLSX"], ["REPORT"]),
+    Stage("clean_psicoactivas", ["RAW_XLSX"], ["UTF8_EXPORT", "CLEAN_EXPORT", "AGG_EXPORT", "CUBE_EXPORT", "UPZ_EXPORT", "REPORT_PATH"]),
+    Stage("prep_poblacion", ["RAW_POB"], ["OUT_CSV", "TENSOR_PATH", "REPORT"]),
+    Stage("join_master", ["PSICO_PATH", "VIF_PATH"], ["OUT_PATH", "REPORT_PATH"]),
+    Stage("compute_rates", ["MASTER_IN", "POB_PATH"], ["MASTER_OUT", "REPORT_PATH"]),
+    Stage("compute_estandarizadas", ["VIF_CLEAN", "PSICO_CLEAN", "TENSOR_PATH"], ["OUT_CSV", "REPORT_PATH"]),
+    Stage("aggregate_niveles", ["RATES_PATH"], ["NIVELES_EXPORT", "REPORT_PATH"], optional=["UPZ_PATH"]),
+    Stage("qa_master", ["MASTER_PATH"], ["REPORT_PATH"]),
+    Stage("qa_coherencia", ["VIF_CLEAN", "PSICO_CLEAN"], ["OUT_CSV", "REPORT_PATH"]),
+    Stage("make_tables", ["MASTER_PATH", "utils_jerarquia.NIVELES_EXPORT"], ["GLOBAL_MD", "LOC_MD", "ANIO_MD", "MATRIZ_CONSUMO", "MATRIZ_VIOLENCIA"]),
+    Stage("make_plots", ["MASTER_PATH", "MASTER_RATES_PATH", "utils_jerarquia.NIVELES_EXPORT"], ["FIGURAS"]),
+    Stage("make_ci", ["RATES_PATH", "utils_jerarquia.NIVELES_EXPORT"], ["FIGURAS", "REPORT"]),
+    Stage("export_dashboard", ["RATES_PATH", "utils_jerarquia.NIVELES_EXPORT", "TEMPLATE_PATH"], ["DATA_PATH", "HTML_PATH"]),
+    Stage("make_regression", ["RATES_PATH", "utils_jerarquia.NIVELES_EXPORT"], ["FIGURAS", "REPORT"]),
+]
+
+# Modo fusionado: raw VIF → agregado en una pasada (sin CSV por registro)
+FUSED_VIF = Stage("aggregate_vif", ["RAW_PATH"], ["AGG_EXPORT", "REPORT_PATH"], {"fused": True})
+
+
+def stages_for(fused_vif: bool = False) -> List[Stage]:
+    if not fused_vif:
+        return STAGES
+    return [FUSED_VIF if s.name == "aggregate_vif" else s for s in STAGES if s.name != "prep_vif"]
+
+
+def _sha256(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def file_fingerprint(path: str, previous: Optional[dict] = None) -> Optional[dict]:
+    """Huella de un archivo; reutiliza el hash previo si tamaño y mtime no cambiaron."""
+    if not os.path.isfile(path):
+        return None
+    st = os.stat(path)
+    if previous and previous.get("size") == st.st_size and previous.get("mtime_ns") == st.st_mtime_ns:
+        return previous
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns, "sha256": _sha256(path)}
+
+
+def local_modules(name: str, seen: Optional[set] = None) -> List[str]:
+    """Módulo de la etapa y los módulos locales de scripts/ que importa (recursivo)."""
+    seen = set() if seen is None else seen
+    if name in seen:
+        return []
+    seen.add(name)
+    path = os.path.join(SCRIPTS_DIR, f"{name}.py")
+    with open(path, "r", encoding="utf-8") as fh:
+        src = fh.read()
+    for dep in re.findall(r"^\s*(?:from|import)\s+(\w+)", src, flags=re.M):
+        if os.path.exists(os.path.join(SCRIPTS_DIR, f"{dep}.py")):
+            local_modules(dep, seen)
+    return sorted(seen)
+
+
+def code_fingerprint(name: str) -> str:
+    h = hashlib.sha256()
+    for mod in local_modules(name):
+        h.update(mod.encode())
+        with open(os.path.join(SCRIPTS_DIR, f"{mod}.py"), "rb") as fh:
+            h.update(fh.read())
+    return h.hexdigest()
+
+
+def load_state() -> Dict[str, dict]:
+    if not os.path.exists(STATE_PATH):
+        return {}
+    try:
+        with open(STATE_PATH, "r", encoding="utf-8") as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_state(state: Dict[str, dict]):
+    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
+    tmp = STATE_PATH + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(state, fh, indent=2, sort_keys=True)
+    os.replace(tmp, STATE_PATH)
+
+
+MISSING_INPUTS = "faltan insumos"
+
+
+def stage_status(stage: Stage, prev: dict):
+    """Devuelve (motivo | None, huellas actuales, insumos faltantes). None significa etapa al día."""
+    inputs = stage.paths(stage.inputs)
+    outputs = stage.paths(stage.outputs)
+    prev_inputs = prev.get("inputs", {})
+    fps = {p: file_fingerprint(p, prev_inputs.get(p)) for p in inputs + stage.paths(stage.optional)}
+    current = {"code": code_fingerprint(stage.name), "inputs": fps}
+
+    missing_in = [p for p in inputs if fps[p] is None]
+    missing_out = [p for p in outputs if not os.path.isfile(p)]
+    if missing_in:
+        # Sin insumos la etapa no puede correr; se conservan las salidas existentes
+        return MISSING_INPUTS, current, missing_in
+    if missing_out:
+        return f"faltan salidas {missing_out}", current, []
+    if prev.get("code") != current["code"]:
+        return "cambió el código", current, []
+    # Un insumo opcional que aparece o desaparece también cuenta como cambio
+    changed = [p for p, fp in fps.items() if (prev_inputs.get(p) or {}).get("sha256") != (fp or {}).get("sha256")]
+    if changed:
+        return f"cambiaron insumos {changed}", current, []
+    # Salidas editadas o corruptas desde la última ejecución (estados previos sin huellas de salida no se comparan)
+    prev_outputs = prev.get("outputs")
+    if prev_outputs is not None:
+        altered = [p for p in outputs if (prev_outputs.get(p) or {}).get("sha256") != file_fingerprint(p, prev_outputs.get(p))["sha256"]]
+        if altered:
+            return f"cambiaron salidas {altered}", current, []
+    return None, current, []
+
+
+def output_fingerprints(stage: Stage, prev: Optional[dict] = None) -> Dict[str, Optional[dict]]:
+    prev = prev or {}
+    return {p: file_fingerprint(p, prev.get(p)) for p in stage.paths(stage.outputs)}
+
+
+def run(only: Optional[List[str]] = None, force: bool = False, dry_run: bool = False, fused_vif: bool = False):
+    state = load_state()
+    manifiestos = []
+    selected = [s for s in stages_for(fused_vif) if not only or s.name in only]
+    t_total = time.perf_counter()
+    try:
+        for stage in selected:
+            reason, current, missing_in = stage_status(stage, state.get(stage.name, {}))
+            if reason == MISSING_INPUTS:
+                print(f"[omitida]  {stage.name}: {MISSING_INPUTS} {missing_in}")
+                continue
+            if force:
+                reason = reason or "forzado"
+            if reason is None:
+                print(f"[al día]   {stage.name}")
+                continue
+            print(f"[ejecutar] {stage.name}: {reason}")
+            if dry_run:
+                continue
+            t0 = time.perf_counter()
+            utils_perfil.ULTIMO = None
+            try:
+                importlib.import_module(stage.name).main(**stage.kwargs)
+            finally:
+                # El manifiesto de la etapa se conserva también si falló
+                if utils_perfil.ULTIMO is not None:
+                    manifiestos.append(utils_perfil.ULTIMO)
+            # Huellas de insumos tomadas antes de ejecutar (lo que la etapa efectivamente leyó)
+            state[stage.name] = {**current, "outputs": output_fingerprints(stage), "seconds": round(time.perf_counter() - t0, 3)}
+            save_state(state)
+    finally:
+        total = time.perf_counter() - t_total
+        if manifiestos:
+            utils_perfil.escribir_manifest(
+                {
+                    "inicio": manifiestos[0]["inicio"],
+                    "wall_s": round(total, 4),
+                    "argumentos": {"only": only, "force": force, "fused_vif": fused_vif},
+                    "etapas": manifiestos,
+                },
+                utils_perfil.manifest_path("pipeline"),
+            )
+    print(f"Pipeline completado en {total:.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ejecuta solo las etapas desactualizadas del pipeline")
+    parser.add_argument("--only", nargs="+", metavar="ETAPA", help="Limitar a estas etapas")
+    parser.add_argument("--force", action="store_true", help="Re-ejecutar aunque estén al día")
+    parser.add_argument("--dry-run", action="store_true", help="Solo mostrar qué se ejecutaría")
+    parser.add_argument("--fused-vif", action="store_true", help="Agregar VIF directo del raw (omite prep_vif y los CSV por registro)")
+    args = parser.parse_args()
+    run(only=args.only, force=args.force, dry_run=args.dry_run, fused_vif=args.fused_vif)
+
+
+if __name__ == "__main__":
+    main()
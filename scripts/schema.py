@@ -0,0 +1,135 @@
+"""Esquema de tipos compactos para las salidas limpias (derivado de docs/data_dictionary.md).
+
+Cada columna tiene un tipo pandas: enteros pequeños con NA (`Int8`, `Int16`,
+`Int32`) o `category`. Las categóricas con dominio cerrado en el diccionario
+llevan sus niveles fijos; valores fuera del dominio se conservan (se agregan
+como nivel y se avisa) en lugar de perderse.
+"""
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from utils_localidad import LOCALIDADES_CATEGORIAS
+
+# Tipo: nombre de dtype pandas, o lista de niveles fijos para una categórica
+ColumnType = Union[str, List[str]]
+
+BINARIA = "Int8"          # 0/1 con NA (0 = ausencia, no faltante)
+CATEGORICA = "category"   # niveles inferidos
+
+LUGARES_OCURRENCIA = [
+    "lugar_ocurrencia_emocional", "lugar_ocurrencia_fisica", "lugar_ocurrencia_sexual",
+    "lugar_ocurrencia_economica", "lugar_ocurrencia_negligencia", "lugar_ocurrencia_abandono",
+]
+
+# 1) SIVIM (vintrafamiliar_clean.csv)
+VIF_SCHEMA: Dict[str, ColumnType] = {
+    "anio": "Int16",
+    "grupo_edad": CATEGORICA,
+    "sexo": ["Hombres", "Mujeres"],
+    "nombre_localidad": CATEGORICA,  # crudo; se normaliza en aggregate_vif
+    "tipo_aseguramiento": CATEGORICA,
+    "entidad_administradora": CATEGORICA,
+    "relacion_agresor": CATEGORICA,
+    "orientacion_sexual": CATEGORICA,
+    "gestante": BINARIA,
+    "estrato": "Int8",  # ordinal 1–6; fuera de rango/no reporta → NA
+    "pais_procedencia": CATEGORICA,
+    "ciclo_vital": CATEGORICA,
+    "estado_civil": CATEGORICA,
+    "nivel_educativo": CATEGORICA,
+    "agresor_consumo_spa": BINARIA,
+    "victima_consumo_spa": BINARIA,
+    **{c: CATEGORICA for c in LUGARES_OCURRENCIA},
+    "flag_inconsistencia": "UInt32",  # bits de reglas de coherencia (utils_reglas)
+}
+
+# 2) VESPA (psicoactivas_clean.csv); el resto de columnas de texto se infiere como categórica
+PSICO_SCHEMA: Dict[str, ColumnType] = {
+    "anio": "Int16",
+    "mes": "Int8",
+    "trimestre": "Int8",
+    "casos": "Int32",
+    "nombre_localidad": LOCALIDADES_CATEGORIAS,
+    "sexo": CATEGORICA,
+    "tipo_aseguramiento": CATEGORICA,
+    "nivel_educativo": CATEGORICA,
+    "orientacion_sexual": CATEGORICA,
+    "pais_nacionalidad": CATEGORICA,
+    "curso_de_vida": CATEGORICA,
+    "flag_inconsistencia": "UInt32",
+}
+
+# 3) Agregados localidad–año (pocas filas: nombre_localidad se deja como texto)
+AGG_SCHEMA: Dict[str, ColumnType] = {
+    "anio": "Int16",
+    "casos_consumo": "Int32",
+    "casos_violencia": "Int32",
+}
+
+SCHEMAS = {"vif": VIF_SCHEMA, "psicoactivas": PSICO_SCHEMA, "agregado": AGG_SCHEMA}
+
+
+def _get(schema: Union[str, Dict[str, ColumnType]]) -> Dict[str, ColumnType]:
+    return SCHEMAS[schema] if isinstance(schema, str) else schema
+
+
+def _to_categorical(s: pd.Series, levels: Optional[List[str]]) -> pd.Series:
+    if levels is None:
+        return s.astype("category")
+    extra = sorted(set(s.dropna().astype(str).unique()) - set(levels))
+    if extra:
+        print(f"Aviso esquema: {s.name} tiene valores fuera del dominio {extra[:10]}; se agregan como niveles")
+    return pd.Categorical(s, categories=list(levels) + extra)
+
+
+def _to_small_int(s: pd.Series, typ: str) -> pd.Series:
+    """Entero pequeño con NA; valores no representables en el tipo pasan a NA con aviso."""
+    num = pd.to_numeric(s, errors="coerce")
+    info = np.iinfo(typ.lower())
+    out = (num < info.min) | (num > info.max)
+    if out.any():
+        print(f"Aviso esquema: {s.name} tiene {int(out.sum())} valores fuera de rango para {typ}; se dejan NA")
+        num = num.mask(out)
+    return num.astype(typ)
+
+
+def apply_schema(df: pd.DataFrame, schema: Union[str, Dict[str, ColumnType]], text_as_category: bool = False) -> pd.DataFrame:
+    """Convierte las columnas presentes a su tipo compacto.
+
+    Con `text_as_category` las columnas de texto fuera del esquema también pasan a categóricas.
+    """
+    schema = _get(schema)
+    for col, typ in schema.items():
+        if col not in df.columns:
+            continue
+        if isinstance(typ, list):
+            df[col] = _to_categorical(df[col], typ)
+        elif typ == CATEGORICA:
+            df[col] = _to_categorical(df[col], None)
+        else:
+            df[col] = _to_small_int(df[col], typ)
+    if text_as_category:
+        for col in df.select_dtypes(include=["object", "string"]).columns:
+            if col not in schema:
+                df[col] = df[col].astype("category")
+    return df
+
+
+def read_dtypes(schema: Union[str, Dict[str, ColumnType]]) -> Dict[str, str]:
+    """dtypes para `pd.read_csv`: los niveles fijos se aplican después con `apply_schema`."""
+    return {c: (CATEGORICA if isinstance(t, list) else t) for c, t in _get(schema).items()}
+
+
+def read_csv(path: str, schema: Union[str, Dict[str, ColumnType]], **kwargs) -> pd.DataFrame:
+    """Lee un CSV limpio con los tipos del esquema (sin inferencia para esas columnas)."""
+    header = pd.read_csv(path, nrows=0, **{k: v for k, v in kwargs.items() if k in ("sep", "encoding")}).columns
+    usecols = kwargs.get("usecols")
+    dtypes = {c: t for c, t in read_dtypes(schema).items() if c in header and (usecols is None or c in usecols)}
+    df = pd.read_csv(path, dtype=dtypes, **kwargs)
+    return apply_schema(df, {c: t for c, t in _get(schema).items() if isinstance(t, list)})
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 1e6
@@ -0,0 +1,311 @@
+"""Generador de crudos sintéticos con el formato de SIVIM (CSV) y VESPA (XLSX).
+
+Sirve para pruebas y medición de carga sin los archivos reales. Replica el
+formato de `data/raw/`: mismas columnas, CSV `;` en bytes de un byte
+(Latin-1), hoja `Descargable_Vespa_Gral_050525`. Las categorías siguen
+distribuciones aproximadas a las observadas y se inyectan a propósito los
+problemas que las etapas de limpieza deben resolver: grafías con mojibake de
+`CORRECCIONES_ESPECIFICAS`, variantes de "Sin dato", años fuera de rango y
+algunas combinaciones incoherentes (reglas de utils_reglas). Todo se escribe
+por bloques, con memoria constante, y es reproducible dada la semilla.
+"""
+import argparse
+import os
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils_localidad import CORRECCIONES_ESPECIFICAS, LOCALIDADES_OFICIALES, UPZ_POR_LOCALIDAD
+from utils_perfil import etapa
+
+BLOCK_ROWS = 100_000
+EXCEL_MAX_ROWS = 1_048_575  # filas de datos por hoja (sin encabezado)
+VESPA_SHEET = "Descargable_Vespa_Gral_050525"
+CSV_ENCODING = "latin1"
+
+# Grafías de "no respuesta" vistas en los crudos
+TOKENS_SIN_DATO = ["Sin dato", "Sin Dato", "SIN DATO", "Sin dato ", "99. Sin dato", "N.A."]
+ANIOS_FUERA_RANGO = [0, 1900, 1999, 2099]
+
+
+@dataclass
+class Ruido:
+    """Tasas de problemas inyectados (fracción de celdas/registros)."""
+    mojibake: float = 0.05
+    sin_dato: float = 0.03
+    anio_fuera_rango: float = 0.002
+    incoherencia: float = 0.002
+
+
+def _titulo(s: str) -> str:
+    # str.title() capitaliza tras cualquier no letra ("usaqu‚N"); aquí solo tras espacios
+    return " ".join(w[:1].upper() + w[1:] for w in s.split(" "))
+
+
+LOCALIDADES = sorted(LOCALIDADES_OFICIALES)
+# Peso relativo aproximado (población) por localidad
+PESO_LOCALIDAD = {
+    "kennedy": 10.5, "suba": 14.0, "engativá": 10.0, "ciudad bolívar": 8.5, "bosa": 9.0,
+    "usaquén": 7.0, "fontibón": 5.0, "san cristóbal": 5.0, "rafael uribe uribe": 4.5, "usme": 4.6,
+    "puente aranda": 3.2, "barrios unidos": 1.8, "tunjuelito": 2.5, "teusaquillo": 1.8, "chapinero": 1.7,
+    "antonio nariño": 1.1, "santa fe": 1.3, "los mártires": 1.0, "la candelaria": 0.3, "sumapaz": 0.1,
+}
+
+
+def _variantes_mojibake(encoding: Optional[str] = None) -> Dict[str, List[str]]:
+    """Grafías alternativas por localidad oficial tomadas de CORRECCIONES_ESPECIFICAS.
+
+    Con `encoding` solo se conservan las representables en esa codificación.
+    """
+    out: Dict[str, List[str]] = {}
+    for crudo, destino in CORRECCIONES_ESPECIFICAS.items():
+        if encoding:
+            try:
+                crudo.encode(encoding)
+            except UnicodeEncodeError:
+                continue
+        for loc in LOCALIDADES:
+            if destino == loc or loc.endswith(" " + destino):
+                out.setdefault(loc, []).append(_titulo(crudo))
+    return out
+
+
+# El CSV lleva los bytes DOS tal cual (p. ej. 0x82 en "usaqu\x82n"); la hoja Excel, texto Unicode
+VARIANTES_CSV = _variantes_mojibake(CSV_ENCODING)
+VARIANTES_XLSX = _variantes_mojibake()
+
+# ---- SIVIM ----
+
+GRUPOS_EDAD = ["Menor de 1 año", "De 1 - 5 años", "De 6 - 11 años", "De 12 - 17 años",
+               "De 18 - 28 años", "De 29 - 59 años", "60 y más años"]
+PESO_EDAD = [4, 12, 16, 17, 20, 26, 5]
+CICLO_POR_EDAD = ["Primera infancia", "Primera infancia", "Infancia", "Adolescencia", "Juventud", "Adultez", "Vejez"]
+# Nivel educativo plausible por grupo de edad (índices en NIVELES)
+NIVELES = ["Ninguno", "Preescolar", "Primaria incompleta", "Primaria completa", "Secundaria incompleta",
+           "Secundaria completa", "Técnico", "Tecnológico", "Universitario", "Posgrado"]
+NIVEL_POR_EDAD = [(0, 1), (0, 2), (2, 4), (3, 5), (4, 9), (0, 10), (0, 9)]
+
+VIF_COLUMNAS = [
+    "ano", "grupoedad", "sexo", "NOMBRE_LOCALIDAD", "tipoaseguramiento", "entidadadministradora",
+    "relacion_agresor", "orientacion_sexual", "gestante", "estrato", "pais_procedencia", "ciclo_vital",
+    "estado_civil", "nivel_educativo", "agresor_consumospa", "victima_consumospa",
+    "lugocurrenciaemocional", "lugocurrenciafisica", "lugocurrenciasexual", "lugocurrenciaeconomica",
+    "lugocurrencianegligencia", "lugocurrenciaabandono",
+]
+ANIOS_VIF = list(range(2013, 2026))
+PESO_ANIO_VIF = [5, 6, 7, 8, 9, 9, 8, 10, 11, 12, 12, 12, 4]  # 2025 parcial (junio)
+
+# Columnas categóricas simples: (valores, pesos)
+VIF_CATEGORICAS: Dict[str, Tuple[List[str], List[float]]] = {
+    "tipoaseguramiento": (["Subsidiado", "Contributivo", "Especial", "No asegurado"], [48, 40, 3, 9]),
+    "entidadadministradora": ([f"EPS {i:02d}" for i in range(1, 21)], list(range(20, 0, -1))),
+    "relacion_agresor": (["Madre", "Padre", "Pareja", "Expareja", "Hermano(a)", "Hijo(a)", "Otro familiar"],
+                         [18, 14, 25, 15, 6, 7, 15]),
+    "orientacion_sexual": (["Heterosexual", "Homosexual", "Bisexual"], [95, 3, 2]),
+    "pais_procedencia": (["COLOMBIA", "VENEZUELA", "OTRO"], [90, 9, 1]),
+    "estado_civil": (["Soltero(a)", "Unión libre", "Casado(a)", "Separado(a)", "Viudo(a)"], [55, 25, 12, 6, 2]),
+}
+LUGARES = ["Vivienda", "Vía pública", "Institución educativa", "Lugar de trabajo"]
+PESO_LUGAR = [80, 12, 5, 3]
+TIPOS_LUGAR = ["emocional", "fisica", "sexual", "economica", "negligencia", "abandono"]
+PREVALENCIA_TIPO = [0.7, 0.4, 0.12, 0.08, 0.2, 0.06]
+
+
+def _choice(rng: np.random.Generator, values: Sequence, weights: Sequence[float], n: int) -> np.ndarray:
+    p = np.asarray(weights, dtype=float)
+    return np.asarray(values, dtype=object)[rng.choice(len(values), size=n, p=p / p.sum())]
+
+
+def _sin_dato(rng: np.random.Generator, col: np.ndarray, rate: float) -> np.ndarray:
+    hit = rng.random(col.size) < rate
+    col[hit] = np.asarray(TOKENS_SIN_DATO, dtype=object)[rng.integers(0, len(TOKENS_SIN_DATO), hit.sum())]
+    return col
+
+
+def _localidades(rng: np.random.Generator, n: int, ruido: Ruido, variantes: Dict[str, List[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    """Códigos de localidad (índice en LOCALIDADES) y grafía cruda (con mojibake inyectado)."""
+    codes = rng.choice(len(LOCALIDADES), size=n, p=_p([PESO_LOCALIDAD[l] for l in LOCALIDADES]))
+    names = np.asarray([_titulo(l) for l in LOCALIDADES], dtype=object)[codes]
+    hit = rng.random(n) < ruido.mojibake
+    for i, loc in enumerate(LOCALIDADES):
+        alts = variantes.get(loc)
+        sel = hit & (codes == i)
+        if alts and sel.any():
+            names[sel] = np.asarray(alts, dtype=object)[rng.integers(0, len(alts), sel.sum())]
+    return codes, names
+
+
+def _p(w: Sequence[float]) -> np.ndarray:
+    w = np.asarray(w, dtype=float)
+    return w / w.sum()
+
+
+def _anios(rng: np.random.Generator, values: List[int], weights: List[float], n: int, ruido: Ruido) -> np.ndarray:
+    anio = np.asarray(values)[rng.choice(len(values), size=n, p=_p(weights))]
+    bad = rng.random(n) < ruido.anio_fuera_rango
+    anio[bad] = np.asarray(ANIOS_FUERA_RANGO)[rng.integers(0, len(ANIOS_FUERA_RANGO), bad.sum())]
+    return anio
+
+
+def vif_block(rng: np.random.Generator, n: int, ruido: Ruido = Ruido()) -> Dict[str, np.ndarray]:
+    """Un bloque de registros SIVIM como columnas de texto (orden de VIF_COLUMNAS)."""
+    edad = rng.choice(len(GRUPOS_EDAD), size=n, p=_p(PESO_EDAD))
+    mujer = rng.random(n) < np.where(edad >= 4, 0.8, 0.55)
+    fertil = mujer & (edad >= 3) & (edad <= 5)
+    gestante = fertil & (rng.random(n) < 0.06)
+    # Incoherencias deliberadas (las detecta utils_reglas)
+    gestante |= ~mujer & (rng.random(n) < ruido.incoherencia)
+
+    lo = np.asarray([a for a, _ in NIVEL_POR_EDAD])[edad]
+    hi = np.asarray([b for _, b in NIVEL_POR_EDAD])[edad]
+    nivel = lo + (rng.random(n) * (hi - lo)).astype(int)
+    raro = (edad <= 2) & (rng.random(n) < ruido.incoherencia)
+    nivel[raro] = len(NIVELES) - 2  # universitario en primera infancia / infancia
+    ciclo = edad.copy()
+    desfase = rng.random(n) < ruido.incoherencia
+    ciclo[desfase] = (edad[desfase] + 3) % len(GRUPOS_EDAD)  # ciclo vital que no corresponde al grupo de edad
+
+    _, localidad = _localidades(rng, n, ruido, VARIANTES_CSV)
+    cols: Dict[str, np.ndarray] = {
+        "ano": _anios(rng, ANIOS_VIF, PESO_ANIO_VIF, n, ruido).astype(str).astype(object),
+        "grupoedad": np.asarray(GRUPOS_EDAD, dtype=object)[edad],
+        "sexo": np.where(mujer, "Mujeres", "Hombres").astype(object),
+        "NOMBRE_LOCALIDAD": localidad,
+        "gestante": gestante.astype(int).astype(str).astype(object),
+        "estrato": _sin_dato(rng, _choice(rng, ["1", "2", "3", "4", "5", "6"], [20, 42, 28, 6, 2, 2], n), ruido.sin_dato),
+        "ciclo_vital": np.asarray(CICLO_POR_EDAD, dtype=object)[ciclo],
+        "nivel_educativo": np.asarray(NIVELES, dtype=object)[nivel],
+        "agresor_consumospa": (rng.random(n) < 0.18).astype(int).astype(str).astype(object),
+        "victima_consumospa": (rng.random(n) < 0.05).astype(int).astype(str).astype(object),
+    }
+    for col, (values, weights) in VIF_CATEGORICAS.items():
+        cols[col] = _choice(rng, values, weights, n)
+    for col in ("grupoedad", "nivel_educativo", "tipoaseguramiento", "orientacion_sexual", "estado_civil"):
+        cols[col] = _sin_dato(rng, cols[col], ruido.sin_dato)
+    for tipo, prev in zip(TIPOS_LUGAR, PREVALENCIA_TIPO):
+        lugar = _choice(rng, LUGARES, PESO_LUGAR, n)
+        lugar[rng.random(n) >= prev] = ""
+        cols[f"lugocurrencia{tipo}"] = lugar
+    return {c: cols[c] for c in VIF_COLUMNAS}
+
+
+def _csv_text(cols: Dict[str, np.ndarray]) -> str:
+    # Los valores no llevan `;` ni comillas: se unen sin pasar por el escritor CSV
+    return "".join(";".join(row) + "\n" for row in zip(*cols.values()))
+
+
+def _blocks(n_rows: int, block_rows: int):
+    for start in range(0, n_rows, block_rows):
+        yield min(block_rows, n_rows - start)
+
+
+def write_vif_csv(path: str, n_rows: int, seed: int = 0, ruido: Ruido = Ruido(), block_rows: int = BLOCK_ROWS):
+    """CSV SIVIM: separador `;`, bytes Latin-1, escrito por bloques."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    rng = np.random.default_rng(seed)
+    with open(path, "wb") as fh:
+        fh.write((";".join(VIF_COLUMNAS) + "\n").encode(CSV_ENCODING))
+        for n in _blocks(n_rows, block_rows):
+            fh.write(_csv_text(vif_block(rng, n, ruido)).encode(CSV_ENCODING))
+
+
+# ---- VESPA ----
+
+VESPA_COLUMNAS = [
+    "ANO", "SEXO", "NOMBRELOCALIDADRESIDENCIA", "MESNOTIFICACION", "TRIMESTRE", "TIPOASEGURAMIENTO",
+    "SITIOHABITUALCONSUMO_VIVIENDA", "SITIOHABITUALCONSUMO_PARQUE", "SITIOHABITUALCONSUMO_EST_EDUCATIVO",
+    "SITIOHABITUALCONSUMO_BARES_TABERNAS", "SITIOHABITUALCONSUMO_VIA_PUBLICA", "SITIOHABITUALCONSUMO_CASA_AMIGOS",
+    "NIVELEDUCATIVO", "CURSO_DE_VIDA", "COMOACUDIOTRATAMIENTO", "PERTENENCIAETNICA", "ORIENTSEXUAL",
+    "PAISNACIONALIDAD", "NOMBREUPZ", "ESTADOCIVIL", "CASOS",
+]
+ANIOS_VESPA = list(range(2015, 2026))
+PESO_ANIO_VESPA = [8, 9, 9, 10, 10, 7, 9, 11, 11, 12, 3]  # 2025 preliminar (T1)
+SITIOS = {"VIVIENDA": 0.35, "PARQUE": 0.3, "EST_EDUCATIVO": 0.05, "BARES_TABERNAS": 0.1, "VIA_PUBLICA": 0.45, "CASA_AMIGOS": 0.3}
+VESPA_CATEGORICAS: Dict[str, Tuple[List[str], List[float]]] = {
+    "SEXO": (["Hombre", "Mujer"], [78, 22]),
+    "TIPOASEGURAMIENTO": (["Subsidiado", "Contributivo", "Especial", "No asegurado"], [55, 35, 2, 8]),
+    "NIVELEDUCATIVO": (["3. Primaria incompleta", "4. Primaria completa", "5. Secundaria incompleta",
+                        "6. Secundaria completa", "8. Técnico post-secundaria completa", "10. Universitaria completa"],
+                       [10, 8, 35, 30, 10, 7]),
+    "CURSO_DE_VIDA": (["Adolescencia", "Juventud", "Adultez", "Vejez"], [20, 45, 32, 3]),
+    "COMOACUDIOTRATAMIENTO": (["1. Voluntariamente", "2. Remitido", "3. Orden judicial"], [60, 30, 10]),
+    "PERTENENCIAETNICA": (["Otros", "Indígena", "Afrocolombiano", "Rrom"], [94, 2, 3.5, 0.5]),
+    "ORIENTSEXUAL": (["Heterosexual", "Homosexual", "Bisexual"], [92, 5, 3]),
+    "PAISNACIONALIDAD": (["Colombia", "Venezuela", "Otro"], [91, 8, 1]),
+    "ESTADOCIVIL": (["1. Soltero (a)", "2. Casado (a)", "3. Unión libre", "4. Separado (a)"], [70, 8, 18, 4]),
+}
+
+
+def vespa_block(rng: np.random.Generator, n: int, ruido: Ruido = Ruido()) -> pd.DataFrame:
+    """Un bloque de registros VESPA (tipos como en la hoja: enteros y texto)."""
+    codes, localidad = _localidades(rng, n, ruido, VARIANTES_XLSX)
+    mes = rng.integers(1, 13, n)
+    upz = np.empty(n, dtype=object)
+    for i, loc in enumerate(LOCALIDADES):
+        sel = codes == i
+        opts = UPZ_POR_LOCALIDAD[loc]
+        upz[sel] = np.asarray([u.upper() for u in opts], dtype=object)[rng.integers(0, len(opts), sel.sum())]
+    df = pd.DataFrame({
+        "ANO": _anios(rng, ANIOS_VESPA, PESO_ANIO_VESPA, n, ruido),
+        "NOMBRELOCALIDADRESIDENCIA": _sin_dato(rng, localidad, ruido.sin_dato / 3),
+        "MESNOTIFICACION": mes,
+        "TRIMESTRE": (mes - 1) // 3 + 1,
+        "NOMBREUPZ": _sin_dato(rng, upz, ruido.sin_dato),
+        # Casos por registro: mayoría 1, cola larga
+        "CASOS": np.minimum(rng.geometric(0.7, n), 40),
+    })
+    for sitio, p in SITIOS.items():
+        df[f"SITIOHABITUALCONSUMO_{sitio}"] = np.where(rng.random(n) < p, "SI", "NO")
+    for col, (values, weights) in VESPA_CATEGORICAS.items():
+        df[col] = _choice(rng, values, weights, n)
+    for col in ("NIVELEDUCATIVO", "ORIENTSEXUAL", "PAISNACIONALIDAD"):
+        df[col] = _sin_dato(rng, df[col].to_numpy(), ruido.sin_dato)
+    return df[VESPA_COLUMNAS]
+
+
+def write_vespa_xlsx(path: str, n_rows: int, seed: int = 0, ruido: Ruido = Ruido(), block_rows: int = BLOCK_ROWS):
+    """Libro VESPA con la hoja Descargable_Vespa_Gral (openpyxl write-only, por bloques)."""
+    from openpyxl import Workbook
+
+    if n_rows > EXCEL_MAX_ROWS:
+        raise ValueError(f"Una hoja Excel admite como máximo {EXCEL_MAX_ROWS} filas de datos")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    rng = np.random.default_rng(seed)
+    wb = Workbook(write_only=True)
+    ws = wb.create_sheet(VESPA_SHEET)
+    ws.append(VESPA_COLUMNAS)
+    for n in _blocks(n_rows, block_rows):
+        df = vespa_block(rng, n, ruido)
+        for row in zip(*(df[c].tolist() for c in VESPA_COLUMNAS)):
+            ws.append(row)
+    wb.save(path)
+
+
+@etapa("synth_data")
+def main():
+    parser = argparse.ArgumentParser(description="Genera crudos sintéticos SIVIM/VESPA")
+    parser.add_argument("--out-dir", default=os.path.join("data", "synthetic", "raw"))
+    parser.add_argument("--vif-rows", type=int, default=100_000)
+    parser.add_argument("--vespa-rows", type=int, default=25_000, help=f"Máximo {EXCEL_MAX_ROWS} (una hoja Excel); 0 = no generar")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--mojibake", type=float, default=Ruido.mojibake, help="Fracción de localidades con grafía corrupta")
+    parser.add_argument("--sin-dato", type=float, default=Ruido.sin_dato, help="Fracción de celdas con token de no respuesta")
+    parser.add_argument("--anio-fuera-rango", type=float, default=Ruido.anio_fuera_rango)
+    parser.add_argument("--incoherencia", type=float, default=Ruido.incoherencia)
+    args = parser.parse_args()
+
+    ruido = Ruido(args.mojibake, args.sin_dato, args.anio_fuera_rango, args.incoherencia)
+    vif = os.path.join(args.out_dir, "vintrafamiliar.csv")
+    write_vif_csv(vif, args.vif_rows, args.seed, ruido)
+    print(f"SIVIM: {args.vif_rows} registros → {vif}")
+    if args.vespa_rows:
+        vespa = os.path.join(args.out_dir, "psicoactivas.xlsx")
+        write_vespa_xlsx(vespa, args.vespa_rows, args.seed, ruido)
+        print(f"VESPA: {args.vespa_rows} registros → {vespa}")
+    print(f"Listo. Crudos sintéticos en {args.out_dir}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+"""Vectorized confidence-interval kernels for counts, rates, proportions and ratios.
+
+All functions accept scalars or NumPy arrays and broadcast their arguments,
+including `conf`: passing e.g. ``conf=np.array([[0.90], [0.95], [0.975]])`` with
+a 1-D array of counts returns one row of limits per confidence level.
+"""
+from typing import Tuple
+
+import numpy as np
+from scipy import stats
+
+Array = np.ndarray
+
+
+def z_value(conf) -> Array:
+    """Two-sided normal quantile for confidence level `conf` (e.g. 0.975 -> 2.2414)."""
+    conf = np.asarray(conf, dtype=float)
+    return stats.norm.ppf(0.5 + conf / 2)
+
+
+# ----------------------
+# Poisson counts
+# ----------------------
+
+def byar_ci(k, conf=0.95) -> Tuple[Array, Array]:
+    """Byar approximation to the Poisson interval for counts `k`.
+
+    lo = k (1 - 1/(9k) - z/(3 sqrt k))^3, hi = (k+1) (1 - 1/(9(k+1)) + z/(3 sqrt(k+1)))^3;
+    lo = 0 when k = 0; NaN counts give NaN limits.
+    """
+    k, z = np.broadcast_arrays(np.asarray(k, dtype=float), z_value(conf))
+    k1 = k + 1
+    hi = k1 * (1 - 1 / (9 * k1) + z / (3 * np.sqrt(k1))) ** 3
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lo = k * (1 - 1 / (9 * k) - z / (3 * np.sqrt(k))) ** 3
+    lo = np.where(np.isnan(k), np.nan, np.where(k > 0, lo, 0.0))
+    return lo, hi
+
+
+def garwood_ci(k, conf=0.95) -> Tuple[Array, Array]:
+    """Exact (Garwood) Poisson interval from chi-square quantiles."""
+    k = np.asarray(k, dtype=float)
+    alpha = 1 - np.asarray(conf, dtype=float)
+    lo = np.where(k > 0, stats.chi2.ppf(alpha / 2, 2 * np.maximum(k, 1e-300)) / 2, 0.0)
+    lo = np.where(np.isnan(k), np.nan, lo)
+    hi = stats.chi2.ppf(1 - alpha / 2, 2 * (k + 1)) / 2
+    return lo, hi
+
+
+def rate_ci(k, exposure, conf=0.95, method: str = "byar", per: float = 100000) -> Tuple[Array, Array, Array]:
+    """Rate k/exposure * per with Poisson limits; NaN where exposure <= 0 or missing."""
+    k = np.asarray(k, dtype=float)
+    e = np.asarray(exposure, dtype=float)
+    kernel = {"byar": byar_ci, "garwood": garwood_ci}[method]
+    lo_k, hi_k = kernel(k, conf)
+    valid = np.isfinite(e) & (e > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        scale = np.where(valid, per / e, np.nan)
+    return k * scale, lo_k * scale, hi_k * scale
+
+
+def gamma_dsr_ci(k, n, w, conf=0.95, per: float = 100000) -> Tuple[Array, Array, Array]:
+    """Directly standardized rate with the Fay–Feuer gamma interval.
+
+    `k` and `n` are stratum counts and populations with strata on the last axis;
+    `w` are standard-population weights for those strata (normalized here to sum
+    to 1) and broadcast against them. With wi = w_i / n_i, y = sum wi k_i,
+    v = sum wi^2 k_i and wm = max wi:
+    lo = Gamma^-1(alpha/2; y^2/v, v/y), hi = Gamma^-1(1 - alpha/2; (y+wm)^2/(v+wm^2), (v+wm^2)/(y+wm)).
+    NaN where a stratum with positive weight has no population.
+    """
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    w = np.asarray(w, dtype=float)
+    w = w / w.sum(axis=-1, keepdims=True)
+    alpha = 1 - np.asarray(conf, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        wi = np.where(n > 0, w / n, 0.0)
+        valid = ~np.any((w > 0) & ~(n > 0), axis=-1) & ~np.any(np.isnan(k), axis=-1)
+        y = (wi * k).sum(axis=-1)
+        v = (wi**2 * k).sum(axis=-1)
+        wm = wi.max(axis=-1)
+        lo = np.where(y > 0, stats.gamma.ppf(alpha / 2, y**2 / v, scale=v / y), 0.0)
+        hi = stats.gamma.ppf(1 - alpha / 2, (y + wm) ** 2 / (v + wm**2), scale=(v + wm**2) / (y + wm))
+    scale = np.where(valid, per, np.nan)
+    return y * scale, lo * scale, hi * scale
+
+
+# ----------------------
+# Binomial proportions
+# ----------------------
+
+def wilson_ci(k, n, conf=0.95) -> Tuple[Array, Array, Array]:
+    """Wilson score interval; returns (p, lo, hi), NaN where n == 0."""
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    z = z_value(conf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(n > 0, k / n, np.nan)
+        denom = 1 + z**2 / n
+        center = (p + z**2 / (2 * n)) / denom
+        half = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denom
+    return p, np.maximum(0.0, center - half), np.minimum(1.0, center + half)
+
+
+def clopper_pearson_ci(k, n, conf=0.95) -> Tuple[Array, Array, Array]:
+    """Exact Clopper–Pearson interval from beta quantiles; returns (p, lo, hi)."""
+    k = np.asarray(k, dtype=float)
+    n = np.asarray(n, dtype=float)
+    alpha = 1 - np.asarray(conf, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        p = np.where(n > 0, k / n, np.nan)
+        lo = np.where(k > 0, stats.beta.ppf(alpha / 2, k, n - k + 1), 0.0)
+        hi = np.where(k < n, stats.beta.ppf(1 - alpha / 2, k + 1, n - k), 1.0)
+    bad = ~(n > 0)
+    return p, np.where(bad, np.nan, lo), np.where(bad, np.nan, hi)
+
+
+# ----------------------
+# Ratios
+# ----------------------
+
+def rate_ratio_ci(k_high, e_high, k_low, e_low, conf=0.95) -> Tuple[Array, Array, Array]:
+    """Log-normal interval for RR = (k_high/e_high)/(k_low/e_low); NaN when any input <= 0."""
+    k1 = np.asarray(k_high, dtype=float)
+    e1 = np.asarray(e_high, dtype=float)
+    k0 = np.asarray(k_low, dtype=float)
+    e0 = np.asarray(e_low, dtype=float)
+    z = z_value(conf)
+    valid = (k1 > 0) & (k0 > 0) & (e1 > 0) & (e0 > 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rr = np.where(valid, (k1 / e1) / (k0 / e0), np.nan)
+        se_log = np.sqrt(1 / k1 + 1 / k0)
+        lo = rr * np.exp(-z * se_log)
+        hi = rr * np.exp(z * se_log)
+    return rr, lo, hi
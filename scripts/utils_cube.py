@@ -0,0 +1,39 @@
+from typing import List, Optional
+
+import pandas as pd
+
+# Jerarquía temporal de más fina a más gruesa (solo se usan las columnas presentes)
+TIME_GRAIN = ["mes", "trimestre", "semestre"]
+
+
+def time_dims(df: pd.DataFrame) -> List[str]:
+    """Columnas sub-anuales presentes, de más gruesa a más fina (para ordenar el cubo)."""
+    return [c for c in reversed(TIME_GRAIN) if c in df.columns]
+
+
+def build_cube(
+    df: pd.DataFrame,
+    dims: List[str],
+    measure: Optional[str] = None,
+    out_name: str = "casos",
+) -> pd.DataFrame:
+    """Cubo pre-agregado en una sola pasada groupby sobre todas las dimensiones.
+
+    Con `measure` suma la columna (NA si todas las filas de la celda son NA);
+    sin ella cuenta registros. Las claves NA se conservan como celda propia.
+    """
+    g = df.groupby(dims, dropna=False, observed=True, sort=True)
+    if measure is None:
+        cube = g.size().reset_index(name=out_name)
+    else:
+        cube = g[measure].sum(min_count=1).reset_index().rename(columns={measure: out_name})
+    return cube
+
+
+def rollup(cube: pd.DataFrame, dims: List[str], value: str = "casos") -> pd.DataFrame:
+    """Agrega el cubo a un grano más grueso (subconjunto de sus dimensiones)."""
+    return (
+        cube.groupby(dims, dropna=False, observed=True, sort=True)[value]
+        .sum(min_count=1)
+        .reset_index()
+    )
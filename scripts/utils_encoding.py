@@ -0,0 +1,218 @@
+"""Detección de la codificación real de un archivo crudo y lectura transcodificada a UTF-8.
+
+La codificación se decide una vez por archivo a partir de un histograma de
+bytes (no por valor): UTF-8 si los bytes no ASCII forman secuencias válidas;
+si no, la página de códigos de un byte cuyos bytes altos decodifican a más
+letras del español. La lectura decodifica el flujo con esa página mientras
+pandas lo consume, y cuenta los bytes ambiguos (no ASCII que no decodifican
+a una letra esperada). Para textos ya decodificados (hojas Excel) se repara
+el mojibake UTF-8 una vez por valor distinto marcado.
+"""
+import codecs
+import io
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+
+# Páginas de un byte candidatas, en orden de preferencia ante empates
+CANDIDATOS = ["cp1252", "cp850", "cp437", "latin1"]
+
+# Caracteres no ASCII esperables en texto en español
+PLAUSIBLES = set("áéíóúÁÉÍÓÚñÑüÜ¿¡°ºª")
+
+BLOCK_SIZE = 1 << 20
+# Bytes no ASCII de la muestra con que se puntúan las páginas candidatas
+MIN_EVIDENCIA = 4096
+
+
+@dataclass
+class Codificacion:
+    path: str
+    encoding: str
+    bom: bool = False
+    bytes_leidos: int = 0
+    no_ascii: int = 0
+    ambiguos: int = 0
+    puntajes: Dict[str, int] = field(default_factory=dict)
+
+    def resumen(self) -> str:
+        return (
+            f"{self.encoding}{' (BOM)' if self.bom else ''}; {self.bytes_leidos} bytes, "
+            f"{self.no_ascii} no ASCII, {self.ambiguos} ambiguos"
+        )
+
+
+def _tabla(encoding: str):
+    """Por byte: (definido en la página, decodifica a un carácter plausible)."""
+    definido = np.ones(256, dtype=bool)
+    plausible = np.zeros(256, dtype=bool)
+    plausible[:0x80] = True
+    for b in range(0x80, 0x100):
+        try:
+            c = bytes([b]).decode(encoding)
+        except UnicodeDecodeError:
+            definido[b] = False
+            continue
+        plausible[b] = c in PLAUSIBLES
+    return definido, plausible
+
+
+_TABLAS = {enc: _tabla(enc) for enc in CANDIDATOS}
+
+
+def _histograma(block: bytes) -> np.ndarray:
+    return np.bincount(np.frombuffer(block, dtype=np.uint8), minlength=256)
+
+
+def detectar_encoding(path: str, min_evidencia: int = MIN_EVIDENCIA, block_size: int = BLOCK_SIZE) -> Codificacion:
+    """Elige la codificación del archivo.
+
+    Los puntajes de las páginas se calculan con los primeros `min_evidencia`
+    bytes no ASCII, pero el histograma sigue hasta el final del archivo: una
+    página se descarta si cualquier byte del archivo no está definido en ella
+    (p. ej. 0x81 en cp1252), así la lectura estricta no puede fallar a mitad.
+    """
+    hist = np.zeros(256, dtype=np.int64)
+    muestra = None
+    utf8 = codecs.getincrementaldecoder("utf-8")("strict")
+    utf8_ok = True
+    bom = False
+    leidos = 0
+    with open(path, "rb") as fh:
+        first = True
+        for block in iter(lambda: fh.read(block_size), b""):
+            if first:
+                bom = block.startswith(codecs.BOM_UTF8)
+                if bom:
+                    block = block[len(codecs.BOM_UTF8):]
+                first = False
+            leidos += len(block)
+            hist += _histograma(block)
+            if utf8_ok:
+                try:
+                    utf8.decode(block)
+                except UnicodeDecodeError:
+                    utf8_ok = False
+            if muestra is None and not utf8_ok and hist[0x80:].sum() >= min_evidencia:
+                muestra = hist.copy()
+        if utf8_ok:
+            try:
+                utf8.decode(b"", final=True)  # secuencia truncada al final
+            except UnicodeDecodeError:
+                utf8_ok = False
+
+    info = Codificacion(path=path, encoding="utf-8", bom=bom, bytes_leidos=leidos, no_ascii=int(hist[0x80:].sum()))
+    if bom or utf8_ok:
+        info.encoding = "utf-8-sig" if bom else "utf-8"
+        return info
+
+    if muestra is None:
+        muestra = hist
+    for enc in CANDIDATOS:
+        definido, plausible = _TABLAS[enc]
+        if hist[~definido].any():
+            continue
+        info.puntajes[enc] = int(muestra[0x80:][plausible[0x80:]].sum())
+    info.encoding = max(info.puntajes, key=info.puntajes.get)  # empate: primero en CANDIDATOS
+    _, plausible = _TABLAS[info.encoding]
+    info.ambiguos = int(hist[0x80:][~plausible[0x80:]].sum())
+    return info
+
+
+class _Contador(io.RawIOBase):
+    """Flujo de bytes que acumula el histograma de lo leído (para el reporte)."""
+
+    def __init__(self, fh):
+        self._fh = fh
+        self.hist = np.zeros(256, dtype=np.int64)
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, b) -> int:
+        n = self._fh.readinto(b)
+        if n:
+            self.hist += _histograma(memoryview(b)[:n])
+        return n
+
+    def close(self):
+        self._fh.close()
+        super().close()
+
+
+class LectorUTF8:
+    """Contexto que abre `path` como texto decodificado con la codificación detectada.
+
+    Al cerrar actualiza `info` con los conteos del archivo completo.
+    """
+
+    def __init__(self, path: str, info: Optional[Codificacion] = None):
+        self.info = info or detectar_encoding(path)
+        self._raw = _Contador(open(path, "rb"))
+        self.stream = io.TextIOWrapper(io.BufferedReader(self._raw, BLOCK_SIZE), encoding=self.info.encoding, newline="")
+
+    def __enter__(self) -> io.TextIOWrapper:
+        return self.stream
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        hist = self._raw.hist
+        self.stream.close()
+        info = self.info
+        info.bytes_leidos = int(hist.sum())
+        info.no_ascii = int(hist[0x80:].sum())
+        if info.encoding in _TABLAS:
+            _, plausible = _TABLAS[info.encoding]
+            info.ambiguos = int(hist[0x80:][~plausible[0x80:]].sum())
+        else:
+            info.ambiguos = 0  # UTF-8 estricto: todo byte alto pertenece a una secuencia válida
+
+
+def abrir_utf8(path: str, info: Optional[Codificacion] = None) -> LectorUTF8:
+    return LectorUTF8(path, info)
+
+
+
+# Marcas de UTF-8 decodificado como Latin-1/CP1252 (p. ej. "MÃ¡rtires")
+MARCAS_MOJIBAKE = ("Ã", "Â")
+
+
+def _reparar(u: str) -> str:
+    for enc in ("cp1252", "latin1"):
+        try:
+            return u.encode(enc).decode("utf-8")
+        except UnicodeError:
+            continue
+    return u
+
+
+def reparar_mojibake_series(s: pd.Series):
+    """Repara mojibake UTF-8 en celdas de texto ya decodificadas (p. ej. hojas Excel).
+
+    Solo se intenta la reparación en los valores distintos que contienen una
+    marca de mojibake; el resto pasa sin tocar. Devuelve (serie, n_celdas_reparadas).
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    fixed = np.array(
+        [_reparar(u) if isinstance(u, str) and any(m in u for m in MARCAS_MOJIBAKE) else u for u in uniques],
+        dtype=object,
+    )
+    changed = np.flatnonzero(fixed != np.asarray(uniques, dtype=object))
+    if changed.size == 0:
+        return s, 0
+    out = pd.Series(fixed[codes], index=s.index, name=s.name).where(codes >= 0)
+    return out, int(np.isin(codes, changed).sum())
+
+
+def reparar_mojibake(df: pd.DataFrame) -> Dict[str, int]:
+    """Aplica `reparar_mojibake_series` a las columnas de texto; devuelve celdas reparadas por columna."""
+    reparadas = {}
+    for col in df.select_dtypes(include=["object", "string"]).columns:
+        df[col], n = reparar_mojibake_series(df[col])
+        if n:
+            reparadas[col] = n
+    return reparadas
@@ -0,0 +1,119 @@
+"""Tasas ajustadas por edad y sexo (método directo) y razones estandarizadas (método indirecto).
+
+Todo opera sobre arreglos con los ejes del tensor de población
+(localidad, año, sexo, grupo de edad) al final, precedidos de cualquier número
+de ejes extra (p. ej. uno por medida): una sola llamada a `estandarizar`
+resuelve todas las medidas, localidades, años y estratos por broadcasting.
+
+- Directo: suma de tasas por estrato ponderadas por la población estándar
+  (Bogotá en `anio_estandar`), con el IC gamma de Fay–Feuer (utils_ci).
+- Indirecto: casos esperados = población por estrato × tasas de Bogotá del
+  mismo año; RME = observados / esperados con IC de Byar.
+
+Los grupos de edad de casos y población rara vez coinciden (curso de vida en
+VESPA, grupos SIVIM, quinquenios de proyecciones); `cortes_comunes` da la
+partición más fina que es agregación exacta de todas ellas.
+"""
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+from utils_ci import gamma_dsr_ci, rate_ci
+from utils_poblacion import TOTAL, etiqueta_edad
+
+
+def limite_edad(etiqueta: str) -> int:
+    """Edad inicial de un grupo canónico ('15-19' -> 15, '80+' -> 80, 'total' -> 0)."""
+    if etiqueta == TOTAL:
+        return 0
+    return int(etiqueta.split("-")[0].rstrip("+"))
+
+
+def cortes_comunes(*particiones: Sequence[str]) -> List[int]:
+    """Edades de corte presentes en todas las particiones (siempre incluye 0).
+
+    Cada partición es una lista de grupos (etiquetas de `etiqueta_edad` o
+    'total'); los grupos que resultan son uniones exactas de grupos de cada una.
+    """
+    comunes = None
+    for etiquetas in particiones:
+        limites = {limite_edad(e) for e in etiquetas if e is not None}
+        comunes = limites if comunes is None else comunes & limites
+    return sorted((comunes or set()) | {0})
+
+
+def etiquetas_grupos(cortes: Sequence[int]) -> List[str]:
+    if len(cortes) == 1:
+        return [TOTAL]
+    return [f"{a}-{b - 1}" for a, b in zip(cortes[:-1], cortes[1:])] + [f"{cortes[-1]}+"]
+
+
+def grupo_de(etiquetas: Sequence, cortes: Sequence[int]) -> np.ndarray:
+    """Grupo común de cada etiqueta de edad (texto crudo o canónico); -1 si no se reconoce.
+
+    Con un único grupo (solo 'total') toda etiqueta, incluso faltante, cae en él.
+    """
+    if len(cortes) == 1:
+        return np.zeros(len(etiquetas), dtype=np.int64)
+    canon = [e if e == TOTAL else etiqueta_edad(e) for e in etiquetas]
+    lim = np.array([limite_edad(e) if e is not None and e != TOTAL else -1 for e in canon])
+    return np.where(lim >= 0, np.searchsorted(cortes, lim, side="right") - 1, -1)
+
+
+def colapsar_edades(x: np.ndarray, grupos: np.ndarray) -> np.ndarray:
+    """Suma el último eje de `x` por grupo; `grupos` debe ser no decreciente (edades ordenadas)."""
+    inicios = np.flatnonzero(np.r_[True, np.diff(grupos) != 0])
+    return np.add.reduceat(x, inicios, axis=-1)
+
+
+def repartir_sin_estrato(conocidos: np.ndarray, sin_estrato: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Reparte los casos sin sexo/edad de cada localidad–año según la distribución de los conocidos.
+
+    `conocidos` tiene los ejes de estrato (sexo, edad) al final y `sin_estrato`
+    el resto. Devuelve (casos repartidos, casos que no se pudieron repartir
+    porque la celda no tiene ningún caso con estrato conocido).
+    """
+    total = conocidos.sum(axis=(-2, -1))
+    ok = total > 0
+    with np.errstate(divide="ignore", invalid="ignore"):
+        factor = np.where(ok, 1 + sin_estrato / total, 1.0)
+    return conocidos * factor[..., None, None], np.where(ok, 0.0, sin_estrato)
+
+
+def estandarizar(casos: np.ndarray, poblacion: np.ndarray, anio_estandar: int,
+                 conf: float = 0.95, per: float = 100000) -> Dict[str, np.ndarray]:
+    """Tasas cruda y ajustada (directa, IC gamma) y RME (indirecta, IC Byar) por localidad–año.
+
+    `casos` (..., L, A, S, E) y `poblacion` (L, A, S, E) con los mismos estratos;
+    `anio_estandar` es la posición en el eje año de la población estándar. Cada
+    salida tiene forma (..., L, A); NaN donde falta población de algún estrato.
+    """
+    k = np.asarray(casos, dtype=float)
+    n = np.broadcast_to(np.asarray(poblacion, dtype=float), k.shape)
+    # Sexo × edad aplanados en un solo eje de estratos: (..., L, A, S·E); localidad queda en -3
+    forma = k.shape[:-2] + (-1,)
+    k_e, n_e = k.reshape(forma), n.reshape(forma)
+
+    con_pob = ~np.isnan(n_e).any(axis=-1)
+    K = k_e.sum(axis=-1)
+    N = np.where(con_pob, n_e.sum(axis=-1), np.nan)
+    cruda, _, _ = rate_ci(K, N, conf, per=per)
+
+    # Directo: estándar = Bogotá (suma de localidades con población) en el año estándar
+    n_ok = np.where(con_pob[..., None], n_e, 0.0)
+    estandar = n_ok.sum(axis=-3)[..., anio_estandar, :]
+    ajustada, lo, hi = gamma_dsr_ci(k_e, n_e, estandar[..., None, None, :], conf, per)
+
+    # Indirecto: tasas por estrato de Bogotá en cada año aplicadas a la población de cada localidad
+    k_ok = np.where(con_pob[..., None], k_e, 0.0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ref = k_ok.sum(axis=-3) / n_ok.sum(axis=-3)
+    ref = np.nan_to_num(ref)
+    esperados = np.where(con_pob, (n_e * ref[..., None, :, :]).sum(axis=-1), np.nan)
+    rme, rme_lo, rme_hi = rate_ci(K, esperados, conf, per=1)
+
+    return {
+        "casos": K, "poblacion": N, "tasa_cruda": cruda,
+        "tasa_ajustada": ajustada, "tasa_ajustada_lo": lo, "tasa_ajustada_hi": hi,
+        "esperados": esperados, "rme": rme, "rme_lo": rme_lo, "rme_hi": rme_hi,
+    }
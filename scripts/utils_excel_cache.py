@@ -0,0 +1,111 @@
+import glob
+import hashlib
+import json
+import os
+import re
+from typing import List, Optional, Union
+
+import pandas as pd
+
+# Caché columnar de hojas Excel, indexada por hash de contenido del libro + hoja
+CACHE_DIR = os.path.join("data", "cache", "excel")
+
+
+def file_sha256(path: str, block_size: int = 1 << 20) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _slug(s: str) -> str:
+    return re.sub(r"[^A-Za-z0-9]+", "_", str(s)).strip("_") or "hoja"
+
+
+def _prefix(path: str, digest: str) -> str:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    return os.path.join(CACHE_DIR, f"{_slug(stem)}-{digest[:16]}")
+
+
+def _prune_stale(path: str, digest: str):
+    """Elimina entradas del mismo libro con otro hash (el raw cambió)."""
+    stem = os.path.splitext(os.path.basename(path))[0]
+    keep = os.path.basename(_prefix(path, digest))
+    for f in glob.glob(os.path.join(CACHE_DIR, f"{_slug(stem)}-*")):
+        if not os.path.basename(f).startswith(keep):
+            os.remove(f)
+
+
+def _write_frame(df: pd.DataFrame, base: str) -> str:
+    """Escribe Parquet; si pyarrow no está o la hoja tiene columnas de tipo mixto, usa pickle."""
+    try:
+        df.to_parquet(base + ".parquet", index=False)
+        return base + ".parquet"
+    except (ImportError, ValueError, TypeError) as e:
+        # pyarrow.ArrowTypeError hereda de TypeError/ValueError
+        if os.path.exists(base + ".parquet"):
+            os.remove(base + ".parquet")
+        print(f"Caché Excel: Parquet no disponible para {os.path.basename(base)} ({type(e).__name__}); usando pickle")
+        df.to_pickle(base + ".pkl")
+        return base + ".pkl"
+
+
+def _read_frame(base: str) -> Optional[pd.DataFrame]:
+    if os.path.exists(base + ".parquet"):
+        return pd.read_parquet(base + ".parquet")
+    if os.path.exists(base + ".pkl"):
+        return pd.read_pickle(base + ".pkl")
+    return None
+
+
+def _build(path: str, digest: str) -> List[str]:
+    """Parsea el libro una sola vez con openpyxl y materializa todas sus hojas."""
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    _prune_stale(path, digest)
+    prefix = _prefix(path, digest)
+    print(f"Caché Excel: convirtiendo {path} (openpyxl)")
+    xls = pd.ExcelFile(path, engine="openpyxl")
+    names = list(xls.sheet_names)
+    for i, name in enumerate(names):
+        try:
+            df = pd.read_excel(xls, sheet_name=name)
+        except Exception as e:
+            print(f"Caché Excel: no se pudo leer la hoja {name}: {e}")
+            continue
+        _write_frame(df, f"{prefix}-{i:02d}-{_slug(name)}")
+    with open(prefix + ".json", "w", encoding="utf-8") as fh:
+        json.dump({"source": path, "sha256": digest, "sheet_names": names}, fh, ensure_ascii=False, indent=2)
+    return names
+
+
+def _ensure(path: str):
+    digest = file_sha256(path)
+    manifest = _prefix(path, digest) + ".json"
+    if os.path.exists(manifest):
+        with open(manifest, "r", encoding="utf-8") as fh:
+            names = json.load(fh)["sheet_names"]
+    else:
+        names = _build(path, digest)
+    return digest, names
+
+
+def sheet_names(path: str) -> List[str]:
+    """Nombres de hojas del libro (desde la caché si el contenido no cambió)."""
+    _, names = _ensure(path)
+    return names
+
+
+def read_sheet(path: str, sheet_name: Union[int, str] = 0, nrows: Optional[int] = None) -> pd.DataFrame:
+    """Equivalente a `pd.read_excel(path, sheet_name=...)` servido desde la caché columnar.
+
+    La primera lectura de un libro convierte todas sus hojas; las siguientes no
+    tocan openpyxl mientras el hash del archivo no cambie.
+    """
+    digest, names = _ensure(path)
+    idx = sheet_name if isinstance(sheet_name, int) else names.index(sheet_name)
+    base = f"{_prefix(path, digest)}-{idx:02d}-{_slug(names[idx])}"
+    df = _read_frame(base)
+    if df is None:
+        raise ValueError(f"No se pudo leer la hoja {names[idx]} de {path}")
+    return df.head(nrows) if nrows is not None else df
@@ -0,0 +1,186 @@
+"""Coincidencia aproximada de nombres contra un catálogo con índice de trigramas.
+
+Cada nombre del catálogo se reduce a una clave (minúsculas, sin tildes, solo
+letras y dígitos) y se indexa por sus trigramas de caracteres. Una consulta
+solo visita los nombres que comparten algún trigrama con ella y descarta, sin
+calcular la distancia, los que comparten menos de los que permite el lema de
+q-gramas (`max(|G(a)|, |G(b)|) - 3k` para distancia <= k). A los candidatos que
+quedan se les calcula la distancia de edición acotada por banda.
+
+La confianza es `1 - distancia / longitud de la clave más larga`; una
+coincidencia se acepta solo si queda dentro de la distancia máxima, supera el
+umbral de confianza y no empata con otro destino distinto.
+"""
+import hashlib
+import json
+import os
+import re
+from collections import Counter, defaultdict
+from dataclasses import asdict, dataclass
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from utils_text import clean_whitespace, strip_accents
+
+Q = 3
+MAX_DISTANCIA = 3
+# Fracción máxima de la clave que puede cambiar (p. ej. 3 ediciones en 12 letras)
+MAX_DISTANCIA_RELATIVA = 0.25
+UMBRAL_CONFIANZA = 0.75
+
+
+def clave(s: str) -> str:
+    s = strip_accents(clean_whitespace(str(s))).lower()
+    return re.sub(r"[^a-z0-9]+", " ", s).strip()
+
+
+def trigramas(k: str) -> Counter:
+    padded = "  " + k + "  "
+    return Counter(padded[i:i + Q] for i in range(len(padded) - Q + 1))
+
+
+def distancia_acotada(a: str, b: str, k: int) -> Optional[int]:
+    """Distancia de Levenshtein si es <= k (banda de ancho 2k+1); None si la supera."""
+    if abs(len(a) - len(b)) > k:
+        return None
+    if len(a) > len(b):
+        a, b = b, a
+    inf = k + 1
+    prev = [j if j <= k else inf for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        lo, hi = max(1, i - k), min(len(b), i + k)
+        cur = [inf] * (len(b) + 1)
+        cur[0] = i if i <= k else inf
+        for j in range(lo, hi + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+        if min(cur[lo - 1:hi + 1]) > k:
+            return None
+        prev = cur
+    return prev[len(b)] if prev[len(b)] <= k else None
+
+
+@dataclass
+class Coincidencia:
+    entrada: str
+    candidato: Optional[str]   # nombre del catálogo más cercano
+    destino: Optional[str]     # valor al que resuelve (None si no se acepta)
+    distancia: Optional[int]
+    confianza: float
+    motivo: str                # "aceptada", "sin candidatos", "confianza baja", "ambigua"
+
+
+class IndiceTrigramas:
+    """Índice de trigramas sobre un catálogo {nombre: destino}."""
+
+    def __init__(self, catalogo: Dict[str, str]):
+        self.nombres: List[str] = []
+        self.claves: List[str] = []
+        self.destinos: List[Optional[str]] = []
+        self.n_gramas: List[int] = []
+        self.postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        por_clave: Dict[str, set] = defaultdict(set)
+        primero: Dict[str, str] = {}
+        for nombre, destino in catalogo.items():
+            k = clave(nombre)
+            if k:
+                por_clave[k].add(destino)
+                primero.setdefault(k, nombre)
+        for k, destinos in por_clave.items():
+            i = len(self.claves)
+            self.nombres.append(primero[k])
+            self.claves.append(k)
+            # Una clave con dos destinos queda en el índice pero como ambigua (None)
+            self.destinos.append(next(iter(destinos)) if len(destinos) == 1 else None)
+            g = trigramas(k)
+            self.n_gramas.append(sum(g.values()))
+            for t, c in g.items():
+                self.postings[t].append((i, c))
+
+    def candidatos(self, k: str, max_dist: int) -> List[Tuple[int, int]]:
+        """(id, trigramas compartidos) de los nombres que pasan el filtro de q-gramas."""
+        g = trigramas(k)
+        n = sum(g.values())
+        comp: Dict[int, int] = defaultdict(int)
+        for t, c in g.items():
+            for i, ci in self.postings.get(t, ()):
+                comp[i] += min(c, ci)
+        return sorted(
+            ((i, s) for i, s in comp.items() if s >= max(n, self.n_gramas[i]) - Q * max_dist),
+            key=lambda x: -x[1],
+        )
+
+    def buscar(self, nombre: str, max_dist: int = MAX_DISTANCIA, umbral: float = UMBRAL_CONFIANZA) -> Coincidencia:
+        k = clave(nombre)
+        max_dist = min(max_dist, max(1, int(len(k) * MAX_DISTANCIA_RELATIVA)))
+        mejores: List[Tuple[int, int]] = []  # (distancia, id)
+        cota = max_dist
+        for i, _ in self.candidatos(k, max_dist):
+            d = distancia_acotada(k, self.claves[i], cota)
+            if d is None:
+                continue
+            if not mejores or d < mejores[0][0]:
+                mejores, cota = [(d, i)], d
+            elif d == mejores[0][0]:
+                mejores.append((d, i))
+        if not mejores:
+            return Coincidencia(nombre, None, None, None, 0.0, "sin candidatos")
+        d, i = mejores[0]
+        conf = 1 - d / max(len(k), len(self.claves[i]), 1)
+        destinos = {self.destinos[j] for _, j in mejores}
+        if len(destinos) > 1 or None in destinos:
+            return Coincidencia(nombre, self.nombres[i], None, d, conf, "ambigua")
+        if conf < umbral:
+            return Coincidencia(nombre, self.nombres[i], None, d, conf, "confianza baja")
+        return Coincidencia(nombre, self.nombres[i], self.destinos[i], d, conf, "aceptada")
+
+
+class Memo:
+    """Decisiones de `IndiceTrigramas.buscar` persistidas en JSON.
+
+    La versión combina el catálogo, los parámetros y este módulo: si cambian, el memo se descarta.
+    """
+
+    def __init__(self, path: Optional[str], catalogo: Dict[str, str], params: Iterable = ()):
+        self.path = path
+        h = hashlib.sha256(json.dumps([sorted(catalogo.items()), list(params)], ensure_ascii=False).encode("utf-8"))
+        with open(__file__, "rb") as fh:
+            h.update(fh.read())  # cambios en el algoritmo también invalidan el memo
+        self.version = h.hexdigest()[:16]
+        self.decisiones: Dict[str, Coincidencia] = {}
+        self._cargado = False
+        self._pendiente = False
+
+    def _cargar(self):
+        self._cargado = True
+        if self.path is None or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as fh:
+                payload = json.load(fh)
+        except (OSError, ValueError):
+            return
+        if payload.get("version") == self.version:
+            self.decisiones = {k: Coincidencia(**v) for k, v in payload.get("decisiones", {}).items()}
+
+    def get(self, nombre: str) -> Optional[Coincidencia]:
+        if not self._cargado:
+            self._cargar()
+        return self.decisiones.get(nombre)
+
+    def put(self, c: Coincidencia):
+        if not self._cargado:
+            self._cargar()
+        self.decisiones[c.entrada] = c
+        self._pendiente = True
+
+    def guardar(self):
+        """Escribe el memo si hay decisiones nuevas desde la última carga/escritura."""
+        if self.path is None or not self._pendiente:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump({"version": self.version, "decisiones": {k: asdict(v) for k, v in self.decisiones.items()}},
+                      fh, ensure_ascii=False, indent=0, sort_keys=True)
+        os.replace(tmp, self.path)
+        self._pendiente = False
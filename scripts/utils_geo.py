@@ -0,0 +1,361 @@
+"""Asignación espacial de registros a polígonos de localidad/UPZ.
+
+Los polígonos se leen de GeoJSON (exportados de los shapefiles oficiales) una
+sola vez y se indexan en una grilla regular: cada celda guarda los polígonos
+cuyo rectángulo envolvente la toca y, si ningún borde la cruza, el polígono
+que la contiene entera. Así la mayoría de los puntos se resuelven con una
+búsqueda por celda; solo los de celdas de borde pasan por la prueba
+punto-en-polígono (paridad de cruces, vectorizada por polígono sobre todos
+los puntos candidatos a la vez).
+
+El índice construido se guarda en `data/cache/geo/` con la huella del GeoJSON
+de origen. Para registros sin coordenadas, `localidad_por_upz` usa el catálogo
+`UPZ_POR_LOCALIDAD` como respaldo de nombres.
+"""
+import json
+import os
+import re
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils_excel_cache import file_sha256
+from utils_localidad import LOCALIDADES_OFICIALES, UPZ_POR_LOCALIDAD, normalize_localidad
+from utils_text import clean_whitespace, strip_accents
+
+GEO_DIR = os.path.join("data", "raw", "geo")
+LOCALIDADES_GEOJSON = os.path.join(GEO_DIR, "localidades.geojson")
+UPZ_GEOJSON = os.path.join(GEO_DIR, "upz.geojson")
+INDEX_DIR = os.path.join("data", "cache", "geo")
+
+# Propiedad con el nombre del polígono, en orden de preferencia (IDECA usa LocNombre / UPlNombre)
+CAMPOS_NOMBRE = ["LocNombre", "UPlNombre", "NOMBRE", "nombre", "NOMBREUPZ", "nombre_localidad", "name"]
+# Columnas de coordenadas (WGS84) en los registros limpios
+COL_LON, COL_LAT = "longitud", "latitud"
+COL_UPZ = "nombreupz"
+
+CELDAS = 64  # celdas por lado de la grilla
+MAX_PARES = 1 << 22  # puntos×aristas por bloque en la prueba punto-en-polígono
+
+
+# ----------------------
+# Lectura de GeoJSON
+# ----------------------
+
+def _anillos(geom: dict) -> List[np.ndarray]:
+    if geom is None:
+        return []
+    if geom["type"] == "Polygon":
+        polys = [geom["coordinates"]]
+    elif geom["type"] == "MultiPolygon":
+        polys = geom["coordinates"]
+    else:
+        return []
+    # Exterior y huecos por igual: la regla de paridad descuenta los huecos
+    return [np.asarray(r, dtype=float)[:, :2] for p in polys for r in p if len(r) >= 3]
+
+
+def _campo_nombre(props: dict, campo: Optional[str]) -> str:
+    if campo is not None:
+        return str(props.get(campo, ""))
+    for c in CAMPOS_NOMBRE:
+        if props.get(c) not in (None, ""):
+            return str(props[c])
+    return ""
+
+
+def leer_geojson(path: str, campo: Optional[str] = None) -> Tuple[List[str], List[List[np.ndarray]]]:
+    """Nombres y anillos de cada feature poligonal del archivo."""
+    with open(path, "r", encoding="utf-8") as fh:
+        fc = json.load(fh)
+    nombres, anillos = [], []
+    for feat in fc.get("features", []):
+        rings = _anillos(feat.get("geometry"))
+        if rings:
+            nombres.append(_campo_nombre(feat.get("properties") or {}, campo))
+            anillos.append(rings)
+    return nombres, anillos
+
+
+# ----------------------
+# Índice de grilla
+# ----------------------
+
+def _dentro(px: np.ndarray, py: np.ndarray, x0, y0, x1, y1) -> np.ndarray:
+    """Prueba de paridad de cruces de los puntos contra un conjunto de aristas (un polígono)."""
+    out = np.zeros(len(px), dtype=bool)
+    paso = max(1, MAX_PARES // max(len(x0), 1))
+    for s in range(0, len(px), paso):
+        qx, qy = px[s:s + paso, None], py[s:s + paso, None]
+        cruza = (y0 > qy) != (y1 > qy)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            xc = x0 + (qy - y0) * (x1 - x0) / (y1 - y0)
+        out[s:s + paso] = np.count_nonzero(cruza & (qx < xc), axis=1) % 2 == 1
+    return out
+
+
+def _expandir(i0, i1, j0, j1, nx):
+    """Pares (elemento, celda) para rangos de celdas [i0..i1]×[j0..j1] por elemento."""
+    w, h = i1 - i0 + 1, j1 - j0 + 1
+    n = w * h
+    elem = np.repeat(np.arange(len(n)), n)
+    local = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    ci = i0[elem] + local % w[elem]
+    cj = j0[elem] + local // w[elem]
+    return elem, cj * nx + ci
+
+
+class IndicePoligonos:
+    """Índice de grilla sobre un conjunto de polígonos (se asume que no se solapan)."""
+
+    def __init__(self, nombres, aristas, eptr, bbox, origen, tam, nx, ny, estado, cptr, cpoly):
+        self.nombres = list(nombres)
+        self.aristas = aristas        # (E, 4): x0, y0, x1, y1, ordenadas por polígono
+        self.eptr = eptr              # aristas del polígono p: eptr[p]:eptr[p+1]
+        self.bbox = bbox              # (P, 4): xmin, ymin, xmax, ymax
+        self.origen, self.tam = origen, tam
+        self.nx, self.ny = nx, ny
+        self.estado = estado          # por celda: id del polígono que la contiene, -1 ninguno, -2 borde
+        self.cptr, self.cpoly = cptr, cpoly  # candidatos de la celda c: cpoly[cptr[c]:cptr[c+1]]
+
+    # --- construcción ---
+
+    @classmethod
+    def construir(cls, nombres: List[str], anillos: List[List[np.ndarray]], celdas: int = CELDAS) -> "IndicePoligonos":
+        segs, pid = [], []
+        for p, rings in enumerate(anillos):
+            for r in rings:
+                r = r if np.array_equal(r[0], r[-1]) else np.vstack([r, r[:1]])
+                segs.append(np.hstack([r[:-1], r[1:]]))
+                pid.append(np.full(len(r) - 1, p))
+        aristas = np.vstack(segs)
+        pid = np.concatenate(pid)
+        eptr = np.concatenate([[0], np.cumsum(np.bincount(pid, minlength=len(anillos)))])
+
+        bbox = np.array([[min(r[:, 0].min() for r in rs), min(r[:, 1].min() for r in rs),
+                          max(r[:, 0].max() for r in rs), max(r[:, 1].max() for r in rs)] for rs in anillos])
+        origen = bbox[:, :2].min(axis=0)
+        extension = bbox[:, 2:].max(axis=0) - origen
+        nx = ny = int(celdas)
+        tam = np.where(extension > 0, extension / [nx, ny], 1.0)
+        idx = cls(nombres, aristas, eptr, bbox, origen, tam, nx, ny, None, None, None)
+
+        # Celdas tocadas por alguna arista (rectángulo envolvente de la arista)
+        i0, j0 = idx._celda_xy(np.minimum(aristas[:, 0], aristas[:, 2]), np.minimum(aristas[:, 1], aristas[:, 3]))
+        i1, j1 = idx._celda_xy(np.maximum(aristas[:, 0], aristas[:, 2]), np.maximum(aristas[:, 1], aristas[:, 3]))
+        _, celdas_borde = _expandir(i0, i1, j0, j1, nx)
+        borde = np.zeros(nx * ny, dtype=bool)
+        borde[celdas_borde] = True
+
+        # Candidatos por celda: polígonos cuyo envolvente toca la celda
+        i0, j0 = idx._celda_xy(bbox[:, 0], bbox[:, 1])
+        i1, j1 = idx._celda_xy(bbox[:, 2], bbox[:, 3])
+        poly, celda = _expandir(i0, i1, j0, j1, nx)
+        orden = np.lexsort((poly, celda))
+        poly, celda = poly[orden], celda[orden]
+        idx.cptr = np.concatenate([[0], np.cumsum(np.bincount(celda, minlength=nx * ny))])
+        idx.cpoly = poly.astype(np.int32)
+
+        # Celdas sin bordes: todo su interior cae en el mismo polígono que su centro
+        estado = np.where(borde, -2, -1).astype(np.int32)
+        interior = ~borde[celda]
+        c = celda[interior]
+        cx = origen[0] + (c % nx + 0.5) * tam[0]
+        cy = origen[1] + (c // nx + 0.5) * tam[1]
+        hit = idx._probar(cx, cy, poly[interior])
+        estado[c[hit]] = poly[interior][hit]
+        idx.estado = estado
+        return idx
+
+    # --- consulta ---
+
+    def _celda_xy(self, x, y):
+        i = np.clip(np.floor((np.asarray(x) - self.origen[0]) / self.tam[0]), 0, self.nx - 1).astype(np.int64)
+        j = np.clip(np.floor((np.asarray(y) - self.origen[1]) / self.tam[1]), 0, self.ny - 1).astype(np.int64)
+        return i, j
+
+    def _probar(self, px, py, poly) -> np.ndarray:
+        """Punto-en-polígono para pares (punto, polígono), en lotes por polígono."""
+        out = np.zeros(len(px), dtype=bool)
+        for p in np.unique(poly):
+            sel = np.flatnonzero(poly == p)
+            e = self.aristas[self.eptr[p]:self.eptr[p + 1]]
+            out[sel] = _dentro(px[sel], py[sel], e[:, 0], e[:, 1], e[:, 2], e[:, 3])
+        return out
+
+    def asignar(self, x, y) -> np.ndarray:
+        """Id del polígono que contiene cada punto (-1 si ninguno o sin coordenadas)."""
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        out = np.full(len(x), -1, dtype=np.int32)
+        fin = self.origen + self.tam * [self.nx, self.ny]
+        ok = np.isfinite(x) & np.isfinite(y) & (x >= self.origen[0]) & (y >= self.origen[1]) & (x <= fin[0]) & (y <= fin[1])
+        pts = np.flatnonzero(ok)
+        i, j = self._celda_xy(x[pts], y[pts])
+        celda = j * self.nx + i
+        est = self.estado[celda]
+        out[pts] = np.where(est >= 0, est, -1)
+
+        # Celdas de borde: expandir cada punto a los candidatos de su celda
+        b = est == -2
+        pts, celda = pts[b], celda[b]
+        n = self.cptr[celda + 1] - self.cptr[celda]
+        pt = np.repeat(pts, n)
+        cand = self.cpoly[np.repeat(self.cptr[celda], n) + np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)]
+        hit = self._probar(x[pt], y[pt], cand)
+        # Con polígonos que se tocan, un punto en el borde común puede dar dos aciertos: gana el menor id
+        primero = np.full(len(x), np.iinfo(np.int32).max, dtype=np.int64)
+        np.minimum.at(primero, pt[hit], cand[hit])
+        found = primero < np.iinfo(np.int32).max
+        out[found] = primero[found]
+        return out
+
+    def resumen(self) -> Dict[str, float]:
+        return {
+            "poligonos": len(self.nombres),
+            "aristas": len(self.aristas),
+            "celdas": self.nx * self.ny,
+            "celdas_interiores": int((self.estado >= 0).sum()),
+            "celdas_borde": int((self.estado == -2).sum()),
+        }
+
+    # --- persistencia ---
+
+    def guardar(self, path: str, huella: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp, nombres=np.asarray(self.nombres, dtype=str), aristas=self.aristas, eptr=self.eptr, bbox=self.bbox,
+            origen=self.origen, tam=self.tam, forma=np.array([self.nx, self.ny]), estado=self.estado,
+            cptr=self.cptr, cpoly=self.cpoly, huella=np.array(huella),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def cargar(cls, path: str, huella: Optional[str] = None) -> Optional["IndicePoligonos"]:
+        """Índice guardado, o None si no existe o se construyó desde otra versión del GeoJSON."""
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as z:
+            if huella is not None and str(z["huella"]) != huella:
+                return None
+            nx, ny = (int(v) for v in z["forma"])
+            return cls(z["nombres"].tolist(), z["aristas"], z["eptr"], z["bbox"], z["origen"], z["tam"],
+                       nx, ny, z["estado"], z["cptr"], z["cpoly"])
+
+
+def index_path(geojson: str) -> str:
+    return os.path.join(INDEX_DIR, os.path.splitext(os.path.basename(geojson))[0] + "_indice.npz")
+
+
+_INDICES: Dict[str, IndicePoligonos] = {}
+
+
+def cargar_indice(geojson: str, campo: Optional[str] = None) -> Optional[IndicePoligonos]:
+    """Índice del GeoJSON (memoria → disco → construcción); None si el archivo no existe."""
+    if geojson in _INDICES:
+        return _INDICES[geojson]
+    if not os.path.exists(geojson):
+        return None
+    huella = file_sha256(geojson)
+    idx = IndicePoligonos.cargar(index_path(geojson), huella)
+    if idx is None:
+        idx = IndicePoligonos.construir(*leer_geojson(geojson, campo))
+        idx.guardar(index_path(geojson), huella)
+    _INDICES[geojson] = idx
+    return idx
+
+
+# ----------------------
+# Nombres de UPZ → localidad
+# ----------------------
+
+def clave_upz(s: str) -> str:
+    s = strip_accents(clean_whitespace(str(s))).lower()
+    return re.sub(r"[^a-z0-9]+", " ", s).strip()
+
+
+def _catalogo_upz() -> Dict[str, Optional[str]]:
+    """Clave de nombre de UPZ → localidad; los nombres repetidos en dos localidades quedan ambiguos (None)."""
+    cat: Dict[str, Optional[str]] = {}
+    for loc, upzs in UPZ_POR_LOCALIDAD.items():
+        for u in upzs:
+            k = clave_upz(u)
+            cat[k] = loc if cat.get(k, loc) == loc else None
+    return cat
+
+
+UPZ_A_LOCALIDAD = _catalogo_upz()
+UPZ_CANONICO = {clave_upz(u): u for upzs in UPZ_POR_LOCALIDAD.values() for u in upzs}
+
+
+def nombre_upz_series(s: pd.Series) -> pd.Series:
+    """Nombre de UPZ con la grafía del catálogo; los que no están en él se conservan limpios."""
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    mapped = np.array([UPZ_CANONICO.get(clave_upz(u), clean_whitespace(str(u))) for u in uniques] + [None], dtype=object)
+    return pd.Series(mapped[codes], index=s.index, name=s.name)
+
+
+def localidad_por_upz(s: pd.Series) -> pd.Series:
+    """Localidad oficial a partir del nombre de UPZ (una búsqueda por valor distinto)."""
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    mapped = np.array([UPZ_A_LOCALIDAD.get(clave_upz(u)) for u in uniques] + [None], dtype=object)
+    return pd.Series(mapped[codes], index=s.index, name=s.name)
+
+
+OFICIALES_POR_CLAVE = {clave_upz(loc): loc for loc in LOCALIDADES_OFICIALES}
+
+
+def localidad_de_poligono(nombre: str) -> Optional[str]:
+    """Localidad oficial de un polígono según su nombre (de localidad o de UPZ)."""
+    if clave_upz(nombre) in OFICIALES_POR_CLAVE:
+        return OFICIALES_POR_CLAVE[clave_upz(nombre)]
+    loc = normalize_localidad(nombre)
+    if loc in LOCALIDADES_OFICIALES:
+        return loc
+    return UPZ_A_LOCALIDAD.get(clave_upz(nombre))
+
+
+def indice_localidades() -> Tuple[Optional[IndicePoligonos], np.ndarray]:
+    """Índice de polígonos de localidad (o, si no hay, de UPZ) y localidad de cada polígono."""
+    for path in (LOCALIDADES_GEOJSON, UPZ_GEOJSON):
+        idx = cargar_indice(path)
+        if idx is not None:
+            return idx, np.array([localidad_de_poligono(n) for n in idx.nombres] + [None], dtype=object)
+    return None, np.array([None], dtype=object)
+
+
+def completar_localidad(df: pd.DataFrame, col: str = "nombre_localidad") -> Dict[str, int]:
+    """Completa `col` donde quedó NA tras normalizar el nombre.
+
+    Primero por coordenadas (si el registro las trae y hay polígonos en
+    `data/raw/geo/`), luego por el nombre de UPZ. Devuelve registros asignados
+    por método.
+    """
+    asignados = {"coordenadas": 0, "upz": 0}
+    if col not in df.columns:
+        return asignados
+
+    if {COL_LON, COL_LAT}.issubset(df.columns):
+        falta = df[col].isna().to_numpy()
+        if falta.any():
+            idx, loc_de = indice_localidades()
+            if idx is not None:
+                pos = np.flatnonzero(falta)
+                lon = pd.to_numeric(df[COL_LON].iloc[pos], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+                lat = pd.to_numeric(df[COL_LAT].iloc[pos], errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+                loc = loc_de[idx.asignar(lon, lat)]  # -1 indexa el None final
+                ok = loc != None  # noqa: E711 (comparación elemento a elemento)
+                df.loc[df.index[pos[ok]], col] = loc[ok]
+                asignados["coordenadas"] = int(ok.sum())
+
+    if COL_UPZ in df.columns:
+        falta = df[col].isna().to_numpy()
+        if falta.any():
+            pos = np.flatnonzero(falta)
+            loc = localidad_por_upz(df[COL_UPZ].iloc[pos]).to_numpy()
+            ok = pd.notna(loc)
+            df.loc[df.index[pos[ok]], col] = loc[ok]
+            asignados["upz"] = int(ok.sum())
+    return asignados
@@ -0,0 +1,88 @@
+"""Jerarquía geográfica UPZ → localidad → Bogotá sobre matrices de pertenencia dispersas.
+
+Los conteos se calculan una sola vez al grano más fino (hojas UPZ–año). Cada
+nivel superior se obtiene multiplicando por una matriz 0/1 padres×hijos
+(CSR): localidad–año = M_loc · hojas, Bogotá–año = M_bog · localidad–año. Las
+sumas siguen la semántica `min_count=1` de `build_cube`: un total es NA solo si
+todos sus hijos lo son.
+
+Todos los niveles se guardan juntos en formato largo (columna `nivel`) y los
+consumidores leen su nivel con `leer_nivel`.
+"""
+import os
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from schema import read_csv
+
+NIVELES_EXPORT = os.path.join("data", "working", "niveles_upz_localidad_bogota.csv")
+
+NIVELES = ["upz", "localidad", "bogota"]
+# Hoja de cada localidad para lo que no tiene detalle por UPZ (VIF, población, consumo sin UPZ)
+SIN_UPZ = "(sin UPZ)"
+BOGOTA = "bogotá"
+
+
+def matriz_pertenencia(codigos: np.ndarray, n_padres: int) -> sparse.csr_matrix:
+    """Matriz 0/1 (n_padres × n_hijos) con un 1 en (padre del hijo j, j)."""
+    n = len(codigos)
+    return sparse.csr_matrix((np.ones(n), (codigos, np.arange(n))), shape=(n_padres, n))
+
+
+def sumar(m: sparse.csr_matrix, x: np.ndarray) -> np.ndarray:
+    """Suma por padre de las columnas de `x`; NA donde todos los hijos son NA."""
+    valido = ~np.isnan(x)
+    total = m @ np.where(valido, x, 0.0)
+    n = m @ valido.astype(float)
+    return np.where(n > 0, total, np.nan)
+
+
+def _padres(df: pd.DataFrame, claves: List[str]) -> Tuple[np.ndarray, pd.DataFrame]:
+    codes, uniques = pd.MultiIndex.from_frame(df[claves]).factorize(sort=True)
+    return codes, uniques.to_frame(index=False, name=claves)
+
+
+def rollup_niveles(hojas: pd.DataFrame, medidas: Sequence[str]) -> pd.DataFrame:
+    """Todos los niveles a partir de las hojas (nombre_localidad, nombre_upz, anio, medidas...).
+
+    Devuelve una tabla larga con `nivel`, `nombre_localidad`, `nombre_upz`,
+    `anio` y las medidas; en el nivel Bogotá `nombre_localidad` es "bogotá".
+    """
+    medidas = list(medidas)
+    x = hojas[medidas].apply(pd.to_numeric, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+
+    cod_loc, loc = _padres(hojas, ["nombre_localidad", "anio"])
+    x_loc = sumar(matriz_pertenencia(cod_loc, len(loc)), x)
+
+    cod_bog, bog = _padres(loc, ["anio"])
+    x_bog = sumar(matriz_pertenencia(cod_bog, len(bog)), x_loc)
+
+    partes = [
+        hojas[["nombre_localidad", "nombre_upz", "anio"]].assign(nivel="upz"),
+        loc.assign(nivel="localidad", nombre_upz=None),
+        bog.assign(nivel="bogota", nombre_localidad=BOGOTA, nombre_upz=None),
+    ]
+    valores = [x, x_loc, x_bog]
+    out = pd.concat(
+        [p.reset_index(drop=True).join(pd.DataFrame(v, columns=medidas)) for p, v in zip(partes, valores)],
+        ignore_index=True,
+    )
+    return out[["nivel", "nombre_localidad", "nombre_upz", "anio"] + medidas]
+
+
+def leer_nivel(nivel: str, path: str = NIVELES_EXPORT) -> pd.DataFrame:
+    """Filas de un nivel de la tabla de niveles (sin la columna `nivel`)."""
+    if nivel not in NIVELES:
+        raise ValueError(f"Nivel desconocido: {nivel} (opciones: {NIVELES})")
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No existe {path}. Corre aggregate_niveles.py")
+    df = read_csv(path, "agregado")
+    df = df[df["nivel"] == nivel].drop(columns="nivel").reset_index(drop=True)
+    if nivel != "upz":
+        df = df.drop(columns="nombre_upz")
+    if nivel == "bogota":
+        df = df.drop(columns="nombre_localidad")
+    return df
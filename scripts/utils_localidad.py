@@ -1,10 +1,28 @@
-from typing import Optional
+from typing import Dict, Optional
+import hashlib
+import json
+import os
 import re
+
+import numpy as np
+import pandas as pd
+
+from utils_fuzzy import Coincidencia, IndiceTrigramas, Memo
 from utils_text import strip_accents, clean_whitespace
 
+# Caché persistente (entre etapas) de valores crudos ya normalizados
+CACHE_PATH = os.path.join("data", "working", "localidad_cache.json")
+# Decisiones de coincidencia aproximada (con distancia y confianza)
+FUZZY_MEMO_PATH = os.path.join("data", "working", "localidad_fuzzy.json")
+
 
 def fix_mojibake(s: str) -> str:
-    """Intenta reparar mojibake típico (UTF-8 leído como Latin-1)."""
+    """Intenta reparar mojibake típico (UTF-8 leído como Latin-1).
+
+    Ya no se aplica por valor en `normalize_localidad`: los crudos CSV se
+    transcodifican una vez al leerlos (utils_encoding). Se conserva para
+    reparar textos sueltos.
+    """
     if not isinstance(s, str):
         return s
     try:
@@ -13,7 +31,7 @@ def fix_mojibake(s: str) -> str:
         return s
 
 
-# Correcciones específicas (mojibake y variantes comunes)
+# Correcciones específicas (mojibake heredado y variantes comunes); búsqueda directa en dict
 CORRECCIONES_ESPECIFICAS = {
     # Mojibake típicos CP1252/UTF-8
     "mÃ¡rtires": "mártires",
@@ -29,7 +47,7 @@ CORRECCIONES_ESPECIFICAS = {
     # Variantes sin artículos
     "candelaria": "la candelaria",
     # Nombres oficiales
-    "los mártires": "mártires",
+    "mártires": "los mártires",
 }
 
 # Listado de localidades oficiales de Bogotá (minúsculas, con tildes correctas)
@@ -40,6 +58,37 @@ LOCALIDADES_OFICIALES = {
     "rafael uribe uribe", "ciudad bolívar", "sumapaz",
 }
 
+# Catálogo de UPZ (y UPR rurales) por localidad, como aparecen en NOMBREUPZ de VESPA
+UPZ_POR_LOCALIDAD = {
+    "usaquén": ["Paseo de los Libertadores", "Verbenal", "La Uribe", "San Cristóbal Norte", "Toberín",
+                "Los Cedros", "Usaquén", "Country Club", "Santa Bárbara"],
+    "chapinero": ["El Refugio", "San Isidro Patios", "Pardo Rubio", "Chicó Lago", "Chapinero"],
+    "santa fe": ["Sagrado Corazón", "La Macarena", "Las Nieves", "Las Cruces", "Lourdes"],
+    "san cristóbal": ["San Blas", "Sosiego", "20 de Julio", "La Gloria", "Los Libertadores"],
+    "usme": ["La Flora", "Danubio", "Gran Yomasa", "Comuneros", "Alfonso López", "Parque Entrenubes", "Ciudad Usme"],
+    "tunjuelito": ["Venecia", "Tunjuelito"],
+    "bosa": ["Apogeo", "Bosa Occidental", "Bosa Central", "El Porvenir", "Tintal Sur"],
+    "kennedy": ["Américas", "Carvajal", "Castilla", "Kennedy Central", "Timiza", "Tintal Norte", "Calandaima",
+                "Corabastos", "Gran Britalia", "Patio Bonito", "Las Margaritas", "Bavaria"],
+    "fontibón": ["Fontibón", "Fontibón San Pablo", "Zona Franca", "Ciudad Salitre Occidental", "Granjas de Techo",
+                 "Modelia", "Capellanía", "Aeropuerto El Dorado"],
+    "engativá": ["Las Ferias", "Minuto de Dios", "Boyacá Real", "Santa Cecilia", "Bolivia", "Garcés Navas",
+                 "Engativá", "Jardín Botánico", "Álamos"],
+    "suba": ["La Academia", "Guaymaral", "San José de Bavaria", "Britalia", "El Prado", "La Alhambra",
+             "Casa Blanca Suba", "Niza", "La Floresta", "Suba", "El Rincón", "Tibabuyes"],
+    "barrios unidos": ["Los Andes", "Doce de Octubre", "Los Alcázares", "Parque Salitre"],
+    "teusaquillo": ["Galerías", "Teusaquillo", "Parque Simón Bolívar - CAN", "La Esmeralda", "Quinta Paredes",
+                    "Ciudad Salitre Oriental"],
+    "los mártires": ["Santa Isabel", "La Sabana"],
+    "antonio nariño": ["Restrepo", "Ciudad Jardín"],
+    "puente aranda": ["Ciudad Montes", "Muzú", "San Rafael", "Zona Industrial", "Puente Aranda"],
+    "la candelaria": ["La Candelaria"],
+    "rafael uribe uribe": ["Quiroga", "Marco Fidel Suárez", "Marruecos", "Diana Turbay", "San José"],
+    "ciudad bolívar": ["El Mochuelo", "Monteblanco", "Arborizadora", "San Francisco", "Lucero", "El Tesoro",
+                       "Ismael Perdomo", "Jerusalem"],
+    "sumapaz": ["Nazareth", "San Juan"],
+}
+
 
 def _sanitize_letters(s: str) -> str:
     """Conserva solo letras, espacios y caracteres acentuados básicos; colapsa espacios."""
@@ -52,9 +101,8 @@ def normalize_localidad(nombre: Optional[str]) -> Optional[str]:
     if not nombre or str(nombre).strip() == "":
         return None
 
-    # Reparar mojibake, limpieza básica, a minúsculas
-    s = fix_mojibake(str(nombre))
-    s = clean_whitespace(s).lower()
+    # Limpieza básica, a minúsculas (el texto ya llega en UTF-8 desde la ingesta)
+    s = clean_whitespace(str(nombre)).lower()
 
     # Correcciones específicas y sanitización de caracteres raros
     s = CORRECCIONES_ESPECIFICAS.get(s, s)
@@ -65,10 +113,10 @@ def normalize_localidad(nombre: Optional[str]) -> Optional[str]:
     variantes = {
         "candelaria": "la candelaria",
         "la candelaria": "la candelaria",
-        "martires": "mártires",
-        "los martires": "mártires",
-        "los m rtires": "mártires",
-        "mártires": "mártires",
+        "martires": "los mártires",
+        "los martires": "los mártires",
+        "los m rtires": "los mártires",
+        "m rtires": "los mártires",
         "ciudad bolivar": "ciudad bolívar",
         "san cristobal": "san cristóbal",
         "usaquen": "usaquén",
@@ -86,3 +134,126 @@ def normalize_localidad(nombre: Optional[str]) -> Optional[str]:
     if s not in LOCALIDADES_OFICIALES:
         return None
     return s
+
+
+# Orden fijo de categorías para la columna categórica de salida
+LOCALIDADES_CATEGORIAS = sorted(LOCALIDADES_OFICIALES)
+
+# Catálogo para la coincidencia aproximada: localidades oficiales y UPZ (→ su localidad)
+CATALOGO_APROXIMADO = {
+    **{upz: loc for loc, upzs in UPZ_POR_LOCALIDAD.items() for upz in upzs},
+    **{loc: loc for loc in LOCALIDADES_OFICIALES},
+}
+_INDICE: Optional[IndiceTrigramas] = None
+_MEMO = Memo(FUZZY_MEMO_PATH, CATALOGO_APROXIMADO)
+
+
+def resolver_aproximado(nombre: str) -> Coincidencia:
+    """Coincidencia aproximada de una grafía contra localidades y UPZ (memoizada)."""
+    global _INDICE
+    c = _MEMO.get(nombre)
+    if c is None:
+        if _INDICE is None:
+            _INDICE = IndiceTrigramas(CATALOGO_APROXIMADO)
+        c = _INDICE.buscar(fix_mojibake(nombre))
+        c.entrada = nombre
+        _MEMO.put(c)
+    return c
+
+_CACHE: Dict[str, Optional[str]] = {}
+_CACHE_LOADED_FROM: Optional[str] = None
+
+
+def _rules_version() -> str:
+    """Huella de este módulo y del de coincidencia aproximada; si cambian, la caché en disco se descarta."""
+    h = hashlib.sha256()
+    for path in (__file__, os.path.join(os.path.dirname(os.path.abspath(__file__)), "utils_fuzzy.py")):
+        with open(path, "rb") as fh:
+            h.update(fh.read())
+    return h.hexdigest()[:16]
+
+
+def _load_cache(path: Optional[str]):
+    global _CACHE_LOADED_FROM
+    if path is None or _CACHE_LOADED_FROM == path:
+        return
+    _CACHE_LOADED_FROM = path
+    if not os.path.exists(path):
+        return
+    try:
+        with open(path, "r", encoding="utf-8") as fh:
+            payload = json.load(fh)
+    except (OSError, ValueError):
+        return
+    if payload.get("version") == _rules_version():
+        _CACHE.update(payload.get("mapping", {}))
+
+
+def _save_cache(path: Optional[str]):
+    if path is None:
+        return
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump({"version": _rules_version(), "mapping": _CACHE}, fh, ensure_ascii=False, indent=0, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def _map_uniques(s: pd.Series, cache_path: Optional[str]):
+    """Factoriza la serie y normaliza cada valor distinto una sola vez."""
+    _load_cache(cache_path)
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    keys = [str(u) for u in uniques]
+    nuevos = False
+    for k in keys:
+        if k not in _CACHE:
+            loc = normalize_localidad(k)
+            if loc is None and k.strip() != "":
+                # Grafía nueva sin regla: reparar mojibake y, si aún no mapea, coincidencia
+                # aproximada contra localidades y UPZ
+                loc = normalize_localidad(fix_mojibake(k)) or resolver_aproximado(k).destino
+            _CACHE[k] = loc
+            nuevos = True
+    if nuevos:
+        _save_cache(cache_path)
+        if cache_path is not None:
+            _MEMO.guardar()
+    mapped = [_CACHE[k] for k in keys]
+    return codes, uniques, mapped
+
+
+def normalize_localidad_series(s: pd.Series, cache_path: Optional[str] = CACHE_PATH) -> pd.Series:
+    """Versión vectorizada de `normalize_localidad` para una columna completa.
+
+    Normaliza cada valor distinto una sola vez (con caché persistente en
+    `cache_path`; None desactiva el disco) y devuelve una serie categórica con
+    las localidades oficiales como categorías. Los valores no mapeables quedan NA.
+    """
+    codes, _, mapped = _map_uniques(s, cache_path)
+    pos = {loc: i for i, loc in enumerate(LOCALIDADES_CATEGORIAS)}
+    lut = np.array([pos.get(m, -1) if m is not None else -1 for m in mapped] + [-1], dtype=np.int16)
+    # codes == -1 (NA) indexa el último elemento de lut, que también es -1
+    out = pd.Categorical.from_codes(lut[codes], categories=LOCALIDADES_CATEGORIAS)
+    return pd.Series(out, index=s.index, name=s.name)
+
+
+def unmapped_localidades(s: pd.Series, cache_path: Optional[str] = CACHE_PATH) -> pd.Series:
+    """Conteo de grafías crudas (no vacías) que no se pudieron mapear a una localidad oficial."""
+    codes, uniques, mapped = _map_uniques(s, cache_path)
+    sin_mapa = np.array([m is None and str(u).strip() != "" for u, m in zip(uniques, mapped)] + [False])
+    mask = sin_mapa[codes]
+    return s[mask].astype(str).value_counts()
+
+
+def resoluciones_aproximadas(s: pd.Series, cache_path: Optional[str] = CACHE_PATH) -> pd.DataFrame:
+    """Grafías crudas de la serie resueltas por coincidencia aproximada, con candidato, distancia,
+    confianza y número de registros."""
+    codes, uniques, mapped = _map_uniques(s, cache_path)
+    conteo = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    cols = ["grafia", "candidato", "localidad", "distancia", "confianza", "registros"]
+    rows = []
+    for i, (u, m) in enumerate(zip(uniques, mapped)):
+        c = _MEMO.get(str(u))
+        if m is not None and c is not None and c.destino == m and normalize_localidad(str(u)) is None:
+            rows.append([str(u), c.candidato, m, c.distancia, round(c.confianza, 3), int(conteo[i])])
+    return pd.DataFrame(rows, columns=cols).sort_values("registros", ascending=False, kind="stable").reset_index(drop=True)
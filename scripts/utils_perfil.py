@@ -0,0 +1,273 @@
+"""Instrumentación liviana de etapas y sub-pasos del pipeline.
+
+`@etapa("nombre")` envuelve el `main()` de un script: mide tiempo de pared,
+CPU, pico de memoria (RSS), bytes leídos/escritos y filas de entrada/salida, y
+al terminar escribe `docs/<nombre>_manifest.json`. Dentro de la etapa,
+`with paso("nombre"):` mide sub-pasos; las llamadas repetidas (p. ej. un paso
+por bloque en modo streaming) se acumulan bajo el mismo nombre. Fuera de una
+etapa (procesos hijo, importación desde otro script) `paso` no mide nada.
+
+El pico de memoria es el de cada medición: en Linux se reinicia la marca de
+agua de RSS del proceso al empezar cada etapa o paso (`/proc/self/clear_refs`)
+y se lee `VmHWM`; así las etapas que run_pipeline corre en el mismo proceso no
+heredan el pico de las anteriores. Como la memoria que dejan residente las
+etapas previas (módulos importados, arenas del asignador) sigue contando en el
+RSS, también se registran el RSS al empezar (`rss_inicio_mb`) y el aumento
+sobre él (`rss_incremento_mb`), que es la memoria propia de la medición.
+Donde la marca no se puede reiniciar se usa `ru_maxrss` (pico del proceso
+desde su inicio) y el manifiesto lo indica en `peak_rss_alcance`. Memoria y bytes usan `/proc` y `resource`; donde no
+existan quedan en null.
+"""
+import functools
+import json
+import os
+import platform
+import sys
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+MANIFEST_DIR = "docs"
+
+# Pila de mediciones activas (etapa en la base, pasos encima)
+_PILA: List["Medicion"] = []
+# Manifiesto de la última etapa terminada (lo usa run_pipeline)
+ULTIMO: Optional[dict] = None
+
+
+def _peak_rss_mb() -> Optional[float]:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # KiB en Linux, bytes en macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def _status_mb(campo: str) -> Optional[float]:
+    """Campo de memoria de /proc/self/status (VmHWM, VmRSS) en MB (Linux)."""
+    try:
+        with open("/proc/self/status", "r") as fh:
+            for line in fh:
+                if line.startswith(campo + ":"):
+                    return int(line.split()[1]) / 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _hwm_mb() -> Optional[float]:
+    """Marca de agua de RSS desde el último reinicio."""
+    return _status_mb("VmHWM")
+
+
+def _reiniciar_hwm() -> bool:
+    """Lleva VmHWM al RSS actual (Linux >= 4.0); False si no se puede."""
+    try:
+        with open("/proc/self/clear_refs", "w") as fh:
+            fh.write("5")
+    except OSError:
+        return False
+    return _hwm_mb() is not None
+
+
+# None: aún no se probó si se puede reiniciar la marca de agua
+_HWM_REINICIABLE: Optional[bool] = None
+
+
+def _inicio_pico() -> Optional[float]:
+    """Cierra el tramo en curso y reinicia la marca de agua.
+
+    Devuelve el pico del tramo anterior (para las mediciones que lo contienen)
+    o None si la marca no se puede reiniciar.
+    """
+    global _HWM_REINICIABLE
+    if _HWM_REINICIABLE is False:
+        return None
+    previo = _hwm_mb()
+    _HWM_REINICIABLE = _reiniciar_hwm()
+    return previo if _HWM_REINICIABLE else None
+
+
+def _max(a: Optional[float], b: Optional[float]) -> Optional[float]:
+    return a if b is None else b if a is None else max(a, b)
+
+
+def _io_bytes():
+    """(bytes leídos, bytes escritos) del proceso según /proc/self/io (Linux)."""
+    try:
+        with open("/proc/self/io", "r") as fh:
+            vals = dict(line.split(":") for line in fh.read().splitlines())
+        return int(vals["rchar"]), int(vals["wchar"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def _delta(a, b):
+    return None if a is None or b is None else b - a
+
+
+class Medicion:
+    """Métricas acumuladas de una etapa o de un sub-paso con nombre."""
+
+    def __init__(self, nombre: str):
+        self.nombre = nombre
+        self.llamadas = 0
+        self.wall_s = 0.0
+        self.cpu_s: Optional[float] = 0.0
+        self.bytes_leidos: Optional[int] = 0
+        self.bytes_escritos: Optional[int] = 0
+        self.filas_entrada: Optional[int] = None
+        self.filas_salida: Optional[int] = None
+        self.peak_rss_mb: Optional[float] = None
+        self.peak_rss_alcance: Optional[str] = None
+        self.rss_inicio_mb: Optional[float] = None
+        self.rss_incremento_mb: Optional[float] = None
+        self._pico_llamada: Optional[float] = None
+        self.pasos: Dict[str, "Medicion"] = {}
+
+    def filas(self, entrada: Optional[int] = None, salida: Optional[int] = None):
+        if entrada is not None:
+            self.filas_entrada = (self.filas_entrada or 0) + int(entrada)
+        if salida is not None:
+            self.filas_salida = (self.filas_salida or 0) + int(salida)
+
+    def _ver_pico(self, mb: Optional[float]):
+        self.peak_rss_mb = _max(self.peak_rss_mb, mb)
+        self._pico_llamada = _max(self._pico_llamada, mb)
+
+    @contextmanager
+    def medir(self) -> Iterator["Medicion"]:
+        t0, c0 = time.perf_counter(), time.process_time()
+        r0, w0 = _io_bytes()
+        # El pico hasta aquí pertenece a las mediciones abiertas; desde aquí empieza el de esta
+        previo = _inicio_pico()
+        for m in _PILA:
+            m._ver_pico(previo)
+        rss0 = _status_mb("VmRSS") if _HWM_REINICIABLE else None
+        if self.rss_inicio_mb is None:
+            self.rss_inicio_mb = rss0
+        self._pico_llamada = None
+        _PILA.append(self)
+        try:
+            yield self
+        finally:
+            _PILA.pop()
+            r1, w1 = _io_bytes()
+            self.llamadas += 1
+            self.wall_s += time.perf_counter() - t0
+            self.cpu_s = None if self.cpu_s is None else self.cpu_s + time.process_time() - c0
+            dr, dw = _delta(r0, r1), _delta(w0, w1)
+            self.bytes_leidos = None if dr is None or self.bytes_leidos is None else self.bytes_leidos + dr
+            self.bytes_escritos = None if dw is None or self.bytes_escritos is None else self.bytes_escritos + dw
+            if _HWM_REINICIABLE:
+                # Pico desde el último reinicio: cuenta para esta medición y las que la contienen
+                pico = _hwm_mb()
+                for m in _PILA + [self]:
+                    m._ver_pico(pico)
+                self.peak_rss_alcance = "medicion"
+                if rss0 is not None and self._pico_llamada is not None:
+                    self.rss_incremento_mb = _max(self.rss_incremento_mb, max(0.0, self._pico_llamada - rss0))
+            else:
+                # Sin reinicio: marca de agua del proceso desde su inicio (incluye etapas anteriores)
+                self.peak_rss_mb = _peak_rss_mb()
+                self.peak_rss_alcance = "proceso"
+
+    def as_dict(self) -> dict:
+        d = {
+            "nombre": self.nombre,
+            "llamadas": self.llamadas,
+            "wall_s": round(self.wall_s, 4),
+            "cpu_s": None if self.cpu_s is None else round(self.cpu_s, 4),
+            "peak_rss_mb": None if self.peak_rss_mb is None else round(self.peak_rss_mb, 1),
+            "peak_rss_alcance": self.peak_rss_alcance,
+            "rss_inicio_mb": None if self.rss_inicio_mb is None else round(self.rss_inicio_mb, 1),
+            "rss_incremento_mb": None if self.rss_incremento_mb is None else round(self.rss_incremento_mb, 1),
+            "bytes_leidos": self.bytes_leidos,
+            "bytes_escritos": self.bytes_escritos,
+            "filas_entrada": self.filas_entrada,
+            "filas_salida": self.filas_salida,
+        }
+        if self.pasos:
+            d["pasos"] = [p.as_dict() for p in self.pasos.values()]
+        return d
+
+
+def actual() -> Optional[Medicion]:
+    """Medición más interna activa (paso o etapa), o None fuera de una etapa."""
+    return _PILA[-1] if _PILA else None
+
+
+def filas(entrada: Optional[int] = None, salida: Optional[int] = None):
+    """Suma filas de entrada/salida a la medición activa (no hace nada fuera de una etapa)."""
+    m = actual()
+    if m is not None:
+        m.filas(entrada, salida)
+
+
+@contextmanager
+def paso(nombre: str) -> Iterator[Optional[Medicion]]:
+    """Mide un sub-paso con nombre dentro de la medición activa."""
+    padre = actual()
+    if padre is None:
+        yield None
+        return
+    m = padre.pasos.setdefault(nombre, Medicion(nombre))
+    with m.medir():
+        yield m
+
+
+def registrar_paso(nombre: str, wall_s: float):
+    """Agrega un sub-paso medido en otro proceso (solo tiempo de pared; p. ej. figuras en paralelo)."""
+    padre = actual()
+    if padre is None:
+        return
+    m = padre.pasos.setdefault(nombre, Medicion(nombre))
+    m.llamadas += 1
+    m.wall_s += wall_s
+    m.cpu_s = m.bytes_leidos = m.bytes_escritos = None
+
+
+def manifest_path(nombre: str) -> str:
+    return os.path.join(MANIFEST_DIR, f"{nombre}_manifest.json")
+
+
+def escribir_manifest(payload: dict, path: str):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as fh:
+        json.dump(payload, fh, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+
+
+def etapa(nombre: str) -> Callable:
+    """Decorador para el `main()` de un script: mide la etapa y escribe su manifiesto JSON."""
+    def deco(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            global ULTIMO
+            m = Medicion(nombre)
+            inicio = time.strftime("%Y-%m-%dT%H:%M:%S")
+            estado = "error"
+            try:
+                with m.medir():
+                    result = fn(*args, **kwargs)
+                estado = "ok"
+                return result
+            finally:
+                ULTIMO = {
+                    "etapa": nombre,
+                    "inicio": inicio,
+                    "estado": estado,
+                    "argumentos": {k: repr(v) for k, v in kwargs.items()},
+                    "python": platform.python_version(),
+                    "plataforma": platform.platform(),
+                    **{k: v for k, v in m.as_dict().items() if k != "nombre"},
+                }
+                escribir_manifest(ULTIMO, manifest_path(nombre))
+        return wrapper
+    return deco
@@ -0,0 +1,329 @@
+"""Población estratificada como tensor denso localidad × año × sexo × grupo de edad.
+
+Los ejes se indexan con códigos enteros (posición en la lista de etiquetas de
+cada eje; el año es `anio - primer año`, con años consecutivos), así que un
+denominador es un acceso directo al arreglo y un vector de estratos se resuelve
+con indexación avanzada, sin merges. Las marginales (p. ej. localidad × año, o
+localidad × año × sexo) se suman una vez y quedan en memoria.
+
+Los años sin dato se completan a lo largo del eje año, en bloque para todas las
+celdas: interpolación lineal entre años observados y, fuera del rango
+observado, crecimiento geométrico con la tasa media de los `VENTANA` años más
+cercanos (o valor constante con `metodo="constante"`).
+
+prep_poblacion construye el tensor y lo guarda en `TENSOR_PATH`; las etapas que
+necesiten denominadores por estrato lo cargan con `cargar_tensor`.
+"""
+import os
+import re
+from typing import Dict, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils_localidad import normalize_localidad_series
+from utils_text import clean_whitespace, strip_accents
+
+TENSOR_PATH = os.path.join("data", "working", "poblacion_tensor.npz")
+
+EJES = ("localidad", "anio", "sexo", "edad")
+# Columna de la tabla larga para cada eje
+COLUMNAS = {"localidad": "nombre_localidad", "anio": "anio", "sexo": "sexo", "edad": "grupo_edad"}
+# Etiqueta de un eje sin desagregar (p. ej. sexo cuando solo hay total)
+TOTAL = "total"
+SEXOS = ["hombres", "mujeres"]
+
+# Origen de cada celda del tensor
+SIN_DATO, OBSERVADO, INTERPOLADO, EXTRAPOLADO = -1, 0, 1, 2
+FUENTES = {OBSERVADO: "observado", INTERPOLADO: "interpolado", EXTRAPOLADO: "extrapolado", SIN_DATO: "sin dato"}
+METODOS = ("geometrico", "constante")
+# Años observados usados para estimar la tasa de crecimiento en la extrapolación
+VENTANA = 3
+# Momentos del curso de vida (MinSalud) como grupos de edad, p. ej. `curso_de_vida` de VESPA
+CURSO_DE_VIDA = {
+    "primera infancia": "0-5", "infancia": "6-11", "adolescencia": "12-17",
+    "juventud": "18-28", "adultez": "29-59", "vejez": "60+",
+}
+
+
+def normalizar_sexo(s) -> Optional[str]:
+    """'Hombre', 'HOMBRES', 'Total Hombres', 'masculino' -> 'hombres' (ídem mujeres); None si no es sexo."""
+    if s is None or (isinstance(s, float) and np.isnan(s)):
+        return None
+    s = strip_accents(clean_whitespace(str(s))).lower()
+    if re.search(r"\b(hombres?|masculino)\b", s):
+        return "hombres"
+    if re.search(r"\b(mujer|mujeres|femenino)\b", s):
+        return "mujeres"
+    if s == TOTAL:
+        return TOTAL
+    return None
+
+
+def etiqueta_edad(s) -> Optional[str]:
+    """Grupo de edad canónico 'a-b' (años cumplidos, inclusivo) o 'a+'.
+
+    'Menor de 1 año' -> '0-0', 'De 1 - 5 años' -> '1-5', '60 y más años' -> '60+',
+    '80 o más' -> '80+', 'De 0 a 4' -> '0-4', 'Juventud' -> '18-28' (CURSO_DE_VIDA);
+    None si el texto no describe edades.
+    """
+    if s is None or (isinstance(s, float) and np.isnan(s)):
+        return None
+    s = strip_accents(clean_whitespace(str(s))).lower()
+    if s in CURSO_DE_VIDA:
+        return CURSO_DE_VIDA[s]
+    m = re.search(r"menor(?:es)? de (\d+)", s)
+    if m:
+        return f"0-{int(m.group(1)) - 1}"
+    m = re.search(r"(\d+)\s*(?:\+|(?:anos?\s*)?(?:y|o)\s*mas)", s)
+    if m:
+        return f"{int(m.group(1))}+"
+    m = re.search(r"(\d+)\s*(?:-|–|a|al)\s*(\d+)", s)
+    if m:
+        return f"{int(m.group(1))}-{int(m.group(2))}"
+    return None
+
+
+def limite_inferior(edad: str) -> float:
+    """Edad inicial del grupo (para ordenar el eje); el total va primero."""
+    m = re.match(r"(\d+)", edad)
+    return float(m.group(1)) if m else -1.0
+
+
+def completar_anios(x: np.ndarray, anios: np.ndarray, metodo: str = "geometrico",
+                    ventana: int = VENTANA) -> Tuple[np.ndarray, np.ndarray]:
+    """Completa los NaN de cada fila de `x` (celdas × años) a lo largo de los años.
+
+    Devuelve (valores completos, origen por celda: OBSERVADO/INTERPOLADO/EXTRAPOLADO).
+    Las filas sin ningún año observado quedan en NaN (origen SIN_DATO).
+    """
+    if metodo not in METODOS:
+        raise ValueError(f"Método de extrapolación desconocido: {metodo} (opciones: {METODOS})")
+    n, m = x.shape
+    t = anios.astype(float)
+    valido = ~np.isnan(x)
+    pos = np.arange(m)
+    filas = np.arange(n)[:, None]
+    # Último año observado a la izquierda y primero a la derecha de cada posición (-1 / m si no hay)
+    prev = np.maximum.accumulate(np.where(valido, pos, -1), axis=1)
+    sig = np.minimum.accumulate(np.where(valido, pos, m)[:, ::-1], axis=1)[:, ::-1]
+    tiene_prev, tiene_sig = prev >= 0, sig < m
+    p, q = np.clip(prev, 0, m - 1), np.clip(sig, 0, m - 1)
+    xp, xq = x[filas, p], x[filas, q]
+
+    out = x.copy()
+    origen = np.full(x.shape, OBSERVADO, dtype=np.int8)
+
+    interior = ~valido & tiene_prev & tiene_sig
+    with np.errstate(invalid="ignore", divide="ignore"):
+        w = (t[None, :] - t[p]) / (t[q] - t[p])
+        out[interior] = (xp + w * (xq - xp))[interior]
+    origen[interior] = INTERPOLADO
+
+    # Extremos: ancla en el año observado más cercano; tasa con el año observado a `ventana` años de él
+    primero, ultimo = sig[:, 0], prev[:, -1]
+    con_dato = primero < m
+    primero, ultimo = np.clip(primero, 0, m - 1), np.clip(ultimo, 0, m - 1)
+    ref_izq = prev[np.arange(n), np.minimum(primero + ventana, m - 1)]
+    ref_der = sig[np.arange(n), np.maximum(ultimo - ventana, 0)]
+    tasa_izq = _tasa(x, t, primero, np.clip(ref_izq, 0, m - 1)) if metodo == "geometrico" else np.zeros(n)
+    tasa_der = _tasa(x, t, np.clip(ref_der, 0, m - 1), ultimo) if metodo == "geometrico" else np.zeros(n)
+
+    izq = ~tiene_prev & con_dato[:, None]
+    der = ~tiene_sig & con_dato[:, None]
+    x0, x1 = x[np.arange(n), primero], x[np.arange(n), ultimo]
+    out[izq] = (x0[:, None] * np.exp(tasa_izq[:, None] * (t[None, :] - t[primero][:, None])))[izq]
+    out[der] = (x1[:, None] * np.exp(tasa_der[:, None] * (t[None, :] - t[ultimo][:, None])))[der]
+    origen[izq | der] = EXTRAPOLADO
+
+    completado = ~valido & ~np.isnan(out)
+    out[completado] = np.round(out[completado])
+    origen[np.isnan(out)] = SIN_DATO
+    return out, origen
+
+
+def _tasa(x: np.ndarray, t: np.ndarray, a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Tasa de crecimiento exponencial anual entre las columnas a y b de cada fila (0 si no se puede estimar)."""
+    filas = np.arange(len(a))
+    xa, xb = x[filas, a], x[filas, b]
+    ok = (b != a) & (xa > 0) & (xb > 0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        r = np.log(xb / xa) / (t[b] - t[a])
+    return np.where(ok, r, 0.0)
+
+
+class TensorPoblacion:
+    """Población en un arreglo (localidad, año, sexo, edad) con su origen por celda."""
+
+    def __init__(self, localidades: Sequence[str], anios: Sequence[int], sexos: Sequence[str],
+                 edades: Sequence[str], valores: np.ndarray, origen: np.ndarray, metodo: str):
+        self.localidades = list(localidades)
+        self.anios = np.asarray(anios, dtype=np.int64)
+        if len(self.anios) and not np.array_equal(self.anios, np.arange(self.anios[0], self.anios[0] + len(self.anios))):
+            raise ValueError("El eje de años debe ser consecutivo")
+        self.sexos = list(sexos)
+        self.edades = list(edades)
+        self.valores = valores
+        self.origen = origen
+        self.metodo = metodo
+        self._etiquetas = {"localidad": pd.Index(self.localidades), "sexo": pd.Index(self.sexos),
+                           "edad": pd.Index(self.edades)}
+        self._pos = {eje: {v: i for i, v in enumerate(idx)} for eje, idx in self._etiquetas.items()}
+        self._marginales: Dict[Tuple[str, ...], np.ndarray] = {}
+
+    @classmethod
+    def construir(cls, largo: pd.DataFrame, anios: Sequence[int], metodo: str = "geometrico") -> "TensorPoblacion":
+        """Tensor desde una tabla larga (nombre_localidad, anio, sexo, grupo_edad, poblacion).
+
+        Filas repetidas de un mismo estrato se suman. El eje año cubre `anios` y
+        cualquier año observado fuera de ese rango.
+        """
+        df = largo.assign(
+            nombre_localidad=normalize_localidad_series(largo["nombre_localidad"]),
+            anio=pd.to_numeric(largo["anio"], errors="coerce"),
+            poblacion=pd.to_numeric(largo["poblacion"], errors="coerce"),
+        ).dropna(subset=["nombre_localidad", "anio"])
+        obs = df["anio"].astype(int)
+        a0 = min(min(anios), obs.min()) if len(obs) else min(anios)
+        a1 = max(max(anios), obs.max()) if len(obs) else max(anios)
+        ejes_anio = np.arange(a0, a1 + 1)
+
+        localidades = sorted(df["nombre_localidad"].astype(str).unique())
+        sexos = [s for s in SEXOS + [TOTAL] if s in set(df["sexo"])]
+        edades = sorted(set(df["grupo_edad"]), key=lambda e: (limite_inferior(e), e))
+        forma = (len(localidades), len(ejes_anio), len(sexos), len(edades))
+
+        codigos = [
+            pd.Index(localidades).get_indexer(df["nombre_localidad"].astype(str)),
+            obs.to_numpy() - a0,
+            pd.Index(sexos).get_indexer(df["sexo"]),
+            pd.Index(edades).get_indexer(df["grupo_edad"]),
+        ]
+        plano = np.ravel_multi_index(codigos, forma)
+        pob = df["poblacion"].to_numpy(dtype=float)
+        ok = ~np.isnan(pob)
+        total = np.bincount(plano[ok], weights=pob[ok], minlength=int(np.prod(forma)))
+        n = np.bincount(plano[ok], minlength=int(np.prod(forma)))
+        valores = np.where(n > 0, total, np.nan).reshape(forma)
+
+        # Completar años: el eje año al final y una fila por estrato
+        por_estrato = np.moveaxis(valores, 1, -1).reshape(-1, len(ejes_anio))
+        completos, origen = completar_anios(por_estrato, ejes_anio, metodo)
+        forma_mov = (forma[0], forma[2], forma[3], forma[1])
+        valores = np.moveaxis(completos.reshape(forma_mov), -1, 1)
+        origen = np.moveaxis(origen.reshape(forma_mov), -1, 1)
+        return cls(localidades, ejes_anio, sexos, edades, np.ascontiguousarray(valores),
+                   np.ascontiguousarray(origen), metodo)
+
+    def codigos(self, eje: str, valores) -> np.ndarray:
+        """Códigos enteros de un vector de etiquetas en el eje (-1 si no está)."""
+        if eje == "anio":
+            a = pd.to_numeric(pd.Series(valores), errors="coerce").to_numpy(dtype=float) - self.anios[0]
+            ok = ~np.isnan(a) & (a >= 0) & (a < len(self.anios))
+            return np.where(ok, np.nan_to_num(a), -1).astype(np.int64)
+        if eje not in self._etiquetas:
+            raise ValueError(f"Eje desconocido: {eje} (opciones: {EJES})")
+        # Cada etiqueta distinta se canoniza una sola vez
+        cod, uniq = pd.factorize(pd.Series(valores, dtype=object).astype(str))
+        uniq = pd.Series(uniq, dtype=object)
+        if eje == "sexo":
+            uniq = uniq.map(normalizar_sexo)
+        elif eje == "edad":
+            uniq = uniq.map(lambda v: TOTAL if strip_accents(v).lower().strip() == TOTAL else etiqueta_edad(v))
+        lut = np.append(self._etiquetas[eje].get_indexer(uniq), -1)
+        return lut[cod]
+
+    def marginal(self, ejes: Sequence[str] = ("localidad", "anio")) -> np.ndarray:
+        """Suma sobre los ejes no pedidos (en el orden de EJES); NA donde todos los estratos son NA."""
+        clave = tuple(e for e in EJES if e in ejes)
+        if clave not in self._marginales:
+            otros = tuple(i for i, e in enumerate(EJES) if e not in clave)
+            valido = ~np.isnan(self.valores)
+            suma = np.where(valido, self.valores, 0.0).sum(axis=otros)
+            self._marginales[clave] = np.where(valido.any(axis=otros), suma, np.nan)
+        return self._marginales[clave]
+
+    def denominador(self, localidad: str, anio: int, sexo: Optional[str] = None, edad: Optional[str] = None) -> float:
+        """Población de un estrato; los ejes en None se suman. NaN si la etiqueta no existe."""
+        pedidos = {"localidad": localidad, "anio": anio, "sexo": sexo, "edad": edad}
+        ejes = [e for e in EJES if pedidos[e] is not None]
+        idx = []
+        for e in ejes:
+            i = int(anio) - int(self.anios[0]) if e == "anio" else self._pos[e].get(pedidos[e], -1)
+            if i < 0 or (e == "anio" and i >= len(self.anios)):
+                return float("nan")
+            idx.append(i)
+        return float(self.marginal(ejes)[tuple(idx)])
+
+    def lookup(self, **estratos) -> np.ndarray:
+        """Denominadores para vectores de etiquetas por eje (p. ej. localidad=..., anio=..., sexo=...).
+
+        Los ejes omitidos se suman; las etiquetas desconocidas dan NaN.
+        """
+        ejes = [e for e in EJES if e in estratos]
+        if len(ejes) != len(estratos):
+            raise ValueError(f"Ejes desconocidos: {sorted(set(estratos) - set(EJES))}")
+        cods = [self.codigos(e, estratos[e]) for e in ejes]
+        fuera = np.zeros(len(cods[0]), dtype=bool) if cods else np.zeros(0, dtype=bool)
+        for c in cods:
+            fuera |= c < 0
+        m = self.marginal(ejes)
+        out = m[tuple(np.where(fuera, 0, c) for c in cods)] if cods else np.array([])
+        return np.where(fuera, np.nan, out)
+
+    def to_frame(self, ejes: Sequence[str] = ("localidad", "anio"), anios: Optional[Sequence[int]] = None) -> pd.DataFrame:
+        """Marginal en formato largo con columnas de COLUMNAS y `poblacion`; `anios` filtra el eje año."""
+        ejes = [e for e in EJES if e in ejes]
+        etiquetas = {"localidad": self.localidades, "anio": self.anios.tolist(), "sexo": self.sexos, "edad": self.edades}
+        idx = pd.MultiIndex.from_product([etiquetas[e] for e in ejes], names=[COLUMNAS[e] for e in ejes])
+        out = idx.to_frame(index=False).assign(poblacion=self.marginal(ejes).ravel())
+        if anios is not None and "anio" in ejes:
+            out = out[out["anio"].isin(list(anios))].reset_index(drop=True)
+        return out
+
+    def origen_por_anio(self) -> pd.DataFrame:
+        """Celdas (localidad × sexo × edad) observadas, interpoladas y extrapoladas por año."""
+        tabla = {FUENTES[k]: (self.origen == k).sum(axis=(0, 2, 3)) for k in FUENTES}
+        return pd.DataFrame(tabla, index=pd.Index(self.anios, name="anio"))
+
+    def resumen(self) -> Dict[str, object]:
+        return {
+            "forma": "×".join(str(n) for n in self.valores.shape),
+            "localidades": len(self.localidades),
+            "anios": f"{self.anios[0]}–{self.anios[-1]}" if len(self.anios) else "",
+            "sexos": ", ".join(self.sexos),
+            "grupos_edad": ", ".join(self.edades),
+            "extrapolacion": self.metodo,
+            "megabytes": round(self.valores.nbytes / 1e6, 3),
+        }
+
+    def guardar(self, path: str = TENSOR_PATH):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = path + ".tmp.npz"
+        np.savez(
+            tmp, localidades=np.asarray(self.localidades, dtype=str), anios=self.anios,
+            sexos=np.asarray(self.sexos, dtype=str), edades=np.asarray(self.edades, dtype=str),
+            valores=self.valores, origen=self.origen, metodo=np.array(self.metodo),
+        )
+        os.replace(tmp, path)
+
+    @classmethod
+    def cargar(cls, path: str = TENSOR_PATH) -> Optional["TensorPoblacion"]:
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as z:
+            return cls(z["localidades"].tolist(), z["anios"], z["sexos"].tolist(), z["edades"].tolist(),
+                       z["valores"], z["origen"], str(z["metodo"]))
+
+
+_TENSORES: Dict[str, Tuple[float, TensorPoblacion]] = {}
+
+
+def cargar_tensor(path: str = TENSOR_PATH) -> TensorPoblacion:
+    """Tensor guardado por prep_poblacion (en memoria mientras el archivo no cambie)."""
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"No existe {path}. Corre prep_poblacion.py")
+    mtime = os.path.getmtime(path)
+    if path not in _TENSORES or _TENSORES[path][0] != mtime:
+        _TENSORES[path] = (mtime, TensorPoblacion.cargar(path))
+    return _TENSORES[path][1]
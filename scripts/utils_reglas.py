@@ -0,0 +1,160 @@
+"""Reglas de coherencia lógica (data_preparation.txt, paso 7) evaluadas de forma vectorizada.
+
+Cada regla es una expresión booleana sobre el DataFrame limpio; el resultado
+de todas las reglas se empaqueta en `flag_inconsistencia` (bit i = regla i).
+"""
+from dataclasses import dataclass
+from typing import Callable, Iterable, List, Sequence
+
+import numpy as np
+import pandas as pd
+
+from utils_poblacion import etiqueta_edad
+from utils_text import strip_accents
+
+FLAG_COL = "flag_inconsistencia"
+FLAG_DTYPE = np.uint32
+
+
+def norm_text(s: pd.Series) -> pd.Series:
+    """Texto sin tildes y en minúsculas, calculado una vez por valor distinto."""
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    normed = np.array([strip_accents(str(u)).lower().strip() for u in uniques] + [""], dtype=object)
+    return pd.Series(normed[codes], index=s.index)
+
+
+def text_in(s: pd.Series, values: Iterable[str]) -> np.ndarray:
+    return norm_text(s).isin(set(values)).to_numpy()
+
+
+def text_contains(s: pd.Series, parts: Sequence[str]) -> np.ndarray:
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    hit = [any(p in strip_accents(str(u)).lower() for p in parts) for u in uniques] + [False]
+    return np.asarray(hit, dtype=bool)[codes]
+
+
+def num(s: pd.Series) -> pd.Series:
+    return pd.to_numeric(s, errors="coerce")
+
+
+def first_col(df: pd.DataFrame, names: Sequence[str]) -> str:
+    return next(c for c in names if c in df.columns)
+
+
+EDAD_MAX = 120
+
+
+def rango_edad(s: pd.Series):
+    """(edad inicial, edad final, reconocido) por fila a partir de un grupo de edad o curso de vida.
+
+    Se interpreta una vez por valor distinto con `etiqueta_edad`; 'a+' llega
+    hasta EDAD_MAX. Los faltantes y textos no interpretables quedan en NaN
+    (reconocido = False).
+    """
+    codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    lo, hi = [], []
+    for u in uniques:
+        e = etiqueta_edad(u)
+        a, _, b = (e or "").partition("-")
+        lo.append(float(a.rstrip("+")) if e else np.nan)
+        hi.append(float(b) if b else (float(EDAD_MAX) if e else np.nan))
+    lo = np.asarray(lo + [np.nan])[codes]
+    hi = np.asarray(hi + [np.nan])[codes]
+    return lo, hi, ~np.isnan(lo)
+
+
+def presente(s: pd.Series) -> np.ndarray:
+    return s.notna().to_numpy() & (norm_text(s) != "").to_numpy()
+
+
+def edad_fuera_rango(d: pd.DataFrame) -> np.ndarray:
+    if "edad" in d.columns:
+        return ((num(d["edad"]) < 0) | (num(d["edad"]) > EDAD_MAX)).fillna(False).to_numpy(dtype=bool)
+    lo, hi, ok = rango_edad(d["grupo_edad"])
+    with np.errstate(invalid="ignore"):
+        fuera = ok & ((lo > hi) | (hi > EDAD_MAX))
+    return (presente(d["grupo_edad"]) & ~ok) | fuera
+
+
+def edad_vs_curso_vida(d: pd.DataFrame) -> np.ndarray:
+    lo, hi, ok = rango_edad(d["grupo_edad"])
+    clo, chi, cok = rango_edad(d[first_col(d, CURSO_VIDA)])
+    # Incoherente si los dos rangos no se solapan
+    with np.errstate(invalid="ignore"):
+        return ok & cok & ((hi < clo) | (lo > chi))
+
+
+@dataclass
+class Regla:
+    nombre: str
+    descripcion: str
+    requiere: List[List[str]]  # por posición: alguna de las columnas alternativas
+    expr: Callable[[pd.DataFrame], np.ndarray]
+
+    def aplica(self, df: pd.DataFrame) -> bool:
+        return all(any(c in df.columns for c in alts) for alts in self.requiere)
+
+
+CURSO_VIDA = ["ciclo_vital", "curso_de_vida"]
+NIVEL_EDU = ["nivel_educativo"]
+SEXO_HOMBRE = {"hombres", "hombre", "masculino"}
+
+EDU_NO_INFANCIA = ["secundaria", "media", "bachiller", "tecnic", "tecnolog", "universi",
+                   "profesional", "posgrado", "especializ", "maestr", "doctor"]
+EDU_NO_NINEZ = ["tecnic", "tecnolog", "universi", "profesional", "posgrado", "especializ",
+                "maestr", "doctor", "secundaria completa", "media completa", "bachillerato completo"]
+
+REGLAS: List[Regla] = [
+    Regla(
+        "edad_fuera_rango", "Edad fuera de 0–120 años o grupo de edad no interpretable como rango de edades",
+        [["edad", "grupo_edad"]], edad_fuera_rango,
+    ),
+    Regla(
+        "anio_fuera_rango", "Año fuera de la cobertura 2013–2025", [["anio"]],
+        lambda d: ((num(d["anio"]) < 2013) | (num(d["anio"]) > 2025)).fillna(False).to_numpy(dtype=bool),
+    ),
+    Regla(
+        "gestante_hombre", "gestante = 1 con sexo = Hombres (inconsistencia_gestacion)", [["gestante"], ["sexo"]],
+        lambda d: (num(d["gestante"]) == 1).fillna(False).to_numpy(dtype=bool) & text_in(d["sexo"], SEXO_HOMBRE),
+    ),
+    Regla(
+        "gestante_infancia", "gestante = 1 en primera infancia o infancia", [["gestante"], CURSO_VIDA],
+        lambda d: (num(d["gestante"]) == 1).fillna(False).to_numpy(dtype=bool)
+        & text_in(d[first_col(d, CURSO_VIDA)], {"primera infancia", "infancia"}),
+    ),
+    Regla(
+        "educacion_primera_infancia", "Primera infancia con nivel educativo de secundaria o superior", [CURSO_VIDA, NIVEL_EDU],
+        lambda d: text_in(d[first_col(d, CURSO_VIDA)], {"primera infancia"})
+        & text_contains(d["nivel_educativo"], EDU_NO_INFANCIA),
+    ),
+    Regla(
+        "educacion_infancia", "Infancia con educación media completa o superior", [CURSO_VIDA, NIVEL_EDU],
+        lambda d: text_in(d[first_col(d, CURSO_VIDA)], {"infancia"})
+        & text_contains(d["nivel_educativo"], EDU_NO_NINEZ),
+    ),
+    # Al final para no mover los bits de las reglas anteriores en archivos ya escritos
+    Regla(
+        "edad_curso_vida", "Grupo de edad que no se solapa con el ciclo vital / curso de vida", [["grupo_edad"], CURSO_VIDA],
+        edad_vs_curso_vida,
+    ),
+]
+assert len(REGLAS) <= np.iinfo(FLAG_DTYPE).bits
+
+
+def columnas_requeridas(reglas: Sequence[Regla] = REGLAS) -> List[str]:
+    return sorted({c for r in reglas for alts in r.requiere for c in alts})
+
+
+def evaluar(df: pd.DataFrame, reglas: Sequence[Regla] = REGLAS) -> np.ndarray:
+    """Evalúa todas las reglas aplicables y devuelve el flag empaquetado (uint32 por fila)."""
+    flags = np.zeros(len(df), dtype=FLAG_DTYPE)
+    for i, regla in enumerate(reglas):
+        if regla.aplica(df):
+            flags |= regla.expr(df).astype(FLAG_DTYPE) << FLAG_DTYPE(i)
+    return flags
+
+
+def desempaquetar(flags: np.ndarray, reglas: Sequence[Regla] = REGLAS) -> pd.DataFrame:
+    """Una columna booleana por regla a partir del flag empaquetado."""
+    flags = np.asarray(flags, dtype=FLAG_DTYPE)
+    return pd.DataFrame({r.nombre: (flags >> FLAG_DTYPE(i)) & 1 == 1 for i, r in enumerate(reglas)})
@@ -0,0 +1,70 @@
+import importlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import pandas as pd
+
+from utils_perfil import paso, registrar_paso
+
+# Tarea de render: (módulo, función plot_*, clave del DataFrame en `frames`)
+RenderTask = Tuple[str, str, str]
+
+_FRAMES: Dict[str, pd.DataFrame] = {}
+
+
+def _use_agg():
+    os.environ["MPLBACKEND"] = "Agg"
+    import matplotlib
+    matplotlib.use("Agg")
+
+
+def _init_worker(frames: Dict[str, pd.DataFrame]):
+    """Cada proceso recibe los DataFrames una sola vez y usa el backend sin pantalla."""
+    _use_agg()
+    _FRAMES.clear()
+    _FRAMES.update(frames)
+
+
+def _run_task(task: RenderTask):
+    module, func, key = task
+    fn = getattr(importlib.import_module(module), func)
+    t0 = time.perf_counter()
+    # En el proceso principal (workers=1) cada figura queda como sub-paso de la etapa
+    with paso(func):
+        result = fn(_FRAMES[key])
+    return func, time.perf_counter() - t0, result
+
+
+def default_workers() -> int:
+    return max(1, (os.cpu_count() or 1) - 1)
+
+
+def render_figures(
+    tasks: List[RenderTask],
+    frames: Dict[str, pd.DataFrame],
+    workers: Optional[int] = None,
+) -> Tuple[Dict[str, Any], pd.DataFrame]:
+    """Ejecuta funciones plot_* independientes, en paralelo si workers > 1.
+
+    Devuelve (resultados por función, tabla de tiempos por figura). Con
+    workers=1 se ejecuta en el proceso actual, en el orden dado.
+    """
+    workers = default_workers() if workers is None else workers
+    workers = min(workers, len(tasks)) or 1
+    t0 = time.perf_counter()
+    if workers == 1:
+        _init_worker(frames)
+        outs = [_run_task(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(frames,)) as ex:
+            outs = list(ex.map(_run_task, tasks))
+        for func, sec, _ in outs:
+            registrar_paso(func, sec)
+    wall = time.perf_counter() - t0
+
+    results = {func: res for func, _, res in outs}
+    timings = pd.DataFrame([{"figura": func, "segundos": round(sec, 3)} for func, sec, _ in outs])
+    print(f"Render: {len(tasks)} tareas en {wall:.2f}s con {workers} proceso(s)")
+    return results, timings
@@ -1,5 +1,16 @@
 import re
 import unicodedata
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Vocabulario de no respuesta (comparado tras colapsar espacios y pasar a minúsculas)
+TOKENS_NO_RESPUESTA = frozenset({
+    "sin dato", "sindato", "sin_dato", "sin dato.",
+    "99. sin dato", "99.sin dato", "99 sin dato", "99 - sin dato",
+    "n.a.", "n.a", "na",
+})
 
 
 def strip_accents(s: str) -> str:
@@ -25,11 +36,72 @@ def clean_whitespace(s: str) -> str:
     return re.sub(r"\s+", " ", str(s)).strip()
 
 
+def _token_key(s) -> str:
+    return clean_whitespace(str(s)).lower()
+
+
+def is_na_token(s, tokens: Iterable[str] = TOKENS_NO_RESPUESTA, blank_is_na: bool = True) -> bool:
+    """True si el valor es un token de no respuesta (o vacío si blank_is_na)."""
+    if s is None:
+        return True
+    key = _token_key(s)
+    return key in tokens or (blank_is_na and key == "")
+
+
 def normalize_token(s: str) -> str:
     """Normaliza 'Sin dato' y variantes a una forma estándar."""
     if s is None:
         return None
-    val = clean_whitespace(str(s)).lower()
-    if val in {"sin dato", "sindato", "sin  dato", "n.a.", "na", "n.a", "n.a"}:
+    if is_na_token(s, blank_is_na=False):
         return None
     return s
+
+
+def na_token_mask(
+    s: pd.Series,
+    tokens: Iterable[str] = TOKENS_NO_RESPUESTA,
+    blank_is_na: bool = True,
+) -> np.ndarray:
+    """Máscara booleana de tokens de no respuesta, evaluada una vez por valor distinto.
+
+    Las columnas categóricas se evalúan sobre sus categorías; las demás se
+    factorizan. Los NA existentes devuelven False (ya son faltantes).
+    """
+    tokens = frozenset(tokens)
+    if isinstance(s.dtype, pd.CategoricalDtype):
+        codes = s.cat.codes.to_numpy()
+        uniques = s.cat.categories
+    else:
+        codes, uniques = pd.factorize(s, use_na_sentinel=True)
+    bad = np.fromiter(
+        (is_na_token(u, tokens, blank_is_na) for u in uniques), dtype=bool, count=len(uniques)
+    )
+    # Sentinela -1 (NA) indexa el último elemento añadido: False
+    bad = np.append(bad, False)
+    return bad[codes]
+
+
+def normalize_na_tokens(
+    df: pd.DataFrame,
+    cols: Optional[List[str]] = None,
+    tokens: Iterable[str] = TOKENS_NO_RESPUESTA,
+    blank_is_na: bool = True,
+) -> pd.DataFrame:
+    """Reemplaza por NA los tokens de no respuesta en las columnas de texto/categóricas.
+
+    Motor compartido por prep_vif.py y clean_psicoactivas.py para que ambas
+    fuentes coincidan en qué cuenta como faltante.
+    """
+    if cols is None:
+        cols = df.select_dtypes(include=["object", "string", "category"]).columns.tolist()
+    for col in cols:
+        s = df[col]
+        if isinstance(s.dtype, pd.CategoricalDtype):
+            drop = [c for c in s.cat.categories if is_na_token(c, tokens, blank_is_na)]
+            if drop:
+                df[col] = s.cat.remove_categories(drop)
+            continue
+        mask = na_token_mask(s, tokens, blank_is_na)
+        if mask.any():
+            df.loc[mask, col] = np.nan
+    return df